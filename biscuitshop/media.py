@@ -0,0 +1,198 @@
+"""
+WSGI middleware serving uploaded media files before Django is reached.
+
+Wraps the Django application the way WhiteNoise wraps it for static files:
+GET/HEAD requests under MEDIA_URL are answered from MEDIA_ROOT with ETag and
+Last-Modified validators, single byte-range support, precompressed .br/.gz
+siblings and long-lived immutable caching for content-hashed names. The file
+transfer itself can be handed to the front web server with X-Accel-Redirect
+(nginx) or X-Sendfile (Apache, lighttpd).
+"""
+
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+import mimetypes
+import re
+
+# 'a1b2c3d4e5f6a7b8c9d0.webp' or 'photo.a1b2c3d4e5f6.jpg': the name changes with the content
+HASHED_NAME_RE = re.compile(r'(^|\.)[0-9a-f]{12,}\.[A-Za-z0-9]+$')
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+CHUNK_SIZE = 64 * 1024
+
+
+class MediaFiles:
+
+    def __init__(self, application, root, prefix, max_age=3600, offload=None, offload_prefix='/protected-media/'):
+        """
+        Args:
+            application: the wrapped WSGI application
+            root (str | Path): directory of the media files (MEDIA_ROOT)
+            prefix (str): URL prefix of the media files (MEDIA_URL)
+            max_age (int, optional): cache lifetime of the names that are not content-hashed
+            offload (str, optional): None, 'x-accel-redirect' or 'x-sendfile'
+            offload_prefix (str, optional): internal nginx location mapped on root, for X-Accel-Redirect
+        """
+        self.application = application
+        self.root = Path(root).resolve()
+        self.prefix = '/' + prefix.strip('/') + '/'
+        self.max_age = max_age
+        self.offload = offload
+        self.offload_prefix = '/' + offload_prefix.strip('/') + '/'
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if not path.startswith(self.prefix):
+            return self.application(environ, start_response)
+        if environ['REQUEST_METHOD'] not in ('GET', 'HEAD'):
+            return self._respond(start_response, '405 Method Not Allowed', [('Allow', 'GET, HEAD')])
+
+        file_path = self._resolve(path[len(self.prefix):])
+        if file_path is None:
+            return self._respond(start_response, '404 Not Found', [('Content-Type', 'text/plain')], b'Not Found')
+        return self._serve(environ, start_response, file_path)
+
+    def _resolve(self, relative_path):
+        """Return the file under root, None for a missing file or a path escaping root"""
+        try:
+            file_path = (self.root / relative_path).resolve()
+        except (OSError, ValueError):
+            return None
+        if self.root not in file_path.parents or not file_path.is_file():
+            return None
+        return file_path
+
+    def _serve(self, environ, start_response, file_path):
+        content_type = mimetypes.guess_type(file_path.name)[0] or 'application/octet-stream'
+        file_path, encoding = self._pick_encoding(environ, file_path)
+        stat = file_path.stat()
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+        headers = [
+            ('Content-Type', content_type),
+            ('ETag', etag),
+            ('Last-Modified', formatdate(stat.st_mtime, usegmt=True)),
+            ('Cache-Control', self._cache_control(file_path.name if encoding is None else file_path.stem)),
+            ('Accept-Ranges', 'bytes'),
+            ('Vary', 'Accept-Encoding'),
+        ]
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+
+        if self._not_modified(environ, etag, stat.st_mtime):
+            return self._respond(start_response, '304 Not Modified', headers)
+
+        if self.offload:
+            # the front server reads the file and handles the ranges itself
+            return self._offload(start_response, headers, file_path)
+
+        start, end = 0, stat.st_size - 1
+        status = '200 OK'
+        byte_range = self._parse_range(environ, stat.st_size, etag, stat.st_mtime)
+        if byte_range == 'invalid':
+            return self._respond(start_response, '416 Range Not Satisfiable', [('Content-Range', f'bytes */{stat.st_size}')])
+        if byte_range is not None:
+            start, end = byte_range
+            status = '206 Partial Content'
+            headers.append(('Content-Range', f'bytes {start}-{end}/{stat.st_size}'))
+        length = end - start + 1
+
+        headers.append(('Content-Length', str(length)))
+        start_response(status, headers)
+        if environ['REQUEST_METHOD'] == 'HEAD':
+            return [b'']
+        return self._read(environ, file_path, start, length, whole=length == stat.st_size)
+
+    def _pick_encoding(self, environ, file_path):
+        accepted = environ.get('HTTP_ACCEPT_ENCODING', '')
+        if environ.get('HTTP_RANGE'):
+            return file_path, None
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted:
+                compressed = file_path.with_name(file_path.name + suffix)
+                if compressed.is_file():
+                    return compressed, encoding
+        return file_path, None
+
+    def _cache_control(self, name):
+        if HASHED_NAME_RE.search(name):
+            return f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+        return f'public, max-age={self.max_age}'
+
+    def _not_modified(self, environ, etag, mtime):
+        if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+        if if_none_match is not None:
+            return etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*'
+        return self._unchanged_since(environ.get('HTTP_IF_MODIFIED_SINCE'), mtime)
+
+    def _parse_range(self, environ, size, etag, mtime):
+        """Return (start, end) of a single satisfiable range, None to send the whole file, 'invalid' otherwise"""
+        header = environ.get('HTTP_RANGE')
+        if not header or size == 0:
+            return None
+        if_range = environ.get('HTTP_IF_RANGE')
+        if if_range and if_range != etag and not self._unchanged_since(if_range, mtime):
+            return None
+        match = RANGE_RE.match(header.strip())
+        if match is None:
+            # multiple ranges are not supported, the whole file is sent
+            return None
+        first, last = match.groups()
+        if not first and not last:
+            return None
+        if not first:
+            start, end = max(size - int(last), 0), size - 1
+        else:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        if start >= size or start > end:
+            return 'invalid'
+        return start, end
+
+    def _unchanged_since(self, value, mtime):
+        if not value:
+            return False
+        try:
+            return int(mtime) <= parsedate_to_datetime(value).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    def _offload(self, start_response, headers, file_path):
+        relative = file_path.relative_to(self.root).as_posix()
+        if self.offload == 'x-accel-redirect':
+            headers.append(('X-Accel-Redirect', self.offload_prefix + relative))
+        else:
+            headers.append(('X-Sendfile', str(file_path)))
+        start_response('200 OK', headers)
+        return [b'']
+
+    def _read(self, environ, file_path, start, length, whole):
+        handle = open(file_path, 'rb')
+        handle.seek(start)
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and whole:
+            return file_wrapper(handle, CHUNK_SIZE)
+        return _FileRange(handle, length)
+
+    def _respond(self, start_response, status, headers, body=b''):
+        start_response(status, headers + [('Content-Length', str(len(body)))])
+        return [body]
+
+
+class _FileRange:
+    """Iterates over length bytes of an open file, then closes it"""
+
+    def __init__(self, handle, length):
+        self.handle = handle
+        self.remaining = length
+
+    def __iter__(self):
+        while self.remaining > 0:
+            chunk = self.handle.read(min(CHUNK_SIZE, self.remaining))
+            if not chunk:
+                break
+            self.remaining -= len(chunk)
+            yield chunk
+
+    def close(self):
+        self.handle.close()
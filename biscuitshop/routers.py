@@ -0,0 +1,89 @@
+"""
+Primary / replica database routing.
+
+Reads of the catalog models listed in settings.DATABASE_REPLICA['MODELS'] go
+to the replica alias when one is configured; every other read and every write
+go to the primary ('default'). Once the current request (or command) has
+written anything, it is pinned to the primary so that it reads its own
+writes; ReplicaPinningMiddleware carries the pin over to the next requests of
+the same client for STICKY_SECONDS with a cookie, which covers the replication
+lag.
+"""
+
+from django.conf import settings
+from contextvars import ContextVar
+
+PRIMARY = 'default'
+
+_pinned = ContextVar('pinned_to_primary', default=False)
+_wrote = ContextVar('wrote_to_primary', default=False)
+
+
+def get_replica_config():
+    config = getattr(settings, 'DATABASE_REPLICA', {})
+    return {
+        'ALIAS': config.get('ALIAS'),
+        'MODELS': config.get('MODELS', []),
+        'STICKY_SECONDS': config.get('STICKY_SECONDS', 5),
+        'COOKIE_NAME': config.get('COOKIE_NAME', 'db_pin'),
+    }
+
+
+def pin_to_primary():
+    """Send the reads of the current context to the primary"""
+    _pinned.set(True)
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+def record_write():
+    _wrote.set(True)
+    _pinned.set(True)
+
+
+def has_written():
+    return _wrote.get()
+
+
+def start_context(pinned=False):
+    """Start a new context (request), pinned or not and with no write yet
+
+    Returns:
+        tuple: tokens to give back to end_context()
+    """
+    return _pinned.set(pinned), _wrote.set(False)
+
+
+def end_context(tokens):
+    pinned_token, wrote_token = tokens
+    _pinned.reset(pinned_token)
+    _wrote.reset(wrote_token)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        config = get_replica_config()
+        if config['ALIAS'] is None or is_pinned():
+            return PRIMARY
+        if model._meta.label_lower in config['MODELS']:
+            return config['ALIAS']
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        if get_replica_config()['ALIAS'] is not None:
+            record_write()
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replica holds the same rows as the primary
+        aliases = {PRIMARY, get_replica_config()['ALIAS']}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica receives the schema through the replication
+        return db != get_replica_config()['ALIAS']
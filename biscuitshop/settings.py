@@ -1,12 +1,14 @@
-# import sys
+import sys
+from django.core.exceptions import ImproperlyConfigured
 from pathlib import Path
 import environ
 import cloudinary
-# import dj_database_url
+import dj_database_url
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
+TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
 env = environ.Env()
 environ.Env.read_env(env_file=Path.joinpath(BASE_DIR, '.env'))
 
@@ -26,8 +28,9 @@ ALLOWED_HOSTS = env.list('ALLOWED_HOSTS', default=['127.0.0.1', 'localhost']) #t
 # Application definition
 
 INSTALLED_APPS = [
-    'cloudinary_storage',
+    # before cloudinary_storage: its collectstatic skips the unhashed files the manifest storage post-processes
     'django.contrib.staticfiles',
+    'cloudinary_storage',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -42,6 +45,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
+    'shop.middleware.ReplicaPinningMiddleware',
+    'shop.middleware.CatalogInvalidationMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -104,11 +109,12 @@ LOGGING = {
 }
 
 
-#cloudinary config
+#cloudinary config, optional: without CLOUDINARY_NAME the product images are
+#served from the local derivatives (offline, local demo)
 CLOUDINARY_STORAGE = {
-    'CLOUD_NAME': env('CLOUDINARY_NAME'),
-    'API_KEY': env('CLOUDINARY_API_KEY'),
-    'API_SECRET': env('CLOUDINARY_API_SECRET'),
+    'CLOUD_NAME': env('CLOUDINARY_NAME', default=''), #type: ignore
+    'API_KEY': env('CLOUDINARY_API_KEY', default=''), #type: ignore
+    'API_SECRET': env('CLOUDINARY_API_SECRET', default=''), #type: ignore
     'STATICFILES_STORAGE': None,
 }
 
@@ -118,10 +124,23 @@ cloudinary.config(
     api_secret=CLOUDINARY_STORAGE['API_SECRET'],
 )
 
+# Only read by the collectstatic command of cloudinary_storage, STORAGES below is the one Django uses
 STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
-# STATICFILES_STORAGE = "django.contrib.staticfiles.storage.StaticFilesStorage"
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Square widths offered in the srcset of the product images
+RESPONSIVE_IMAGE_WIDTHS = [240, 360, 480, 720, 960, 1200]
+# Ask Cloudinary to build those variants when a product image is saved
+CLOUDINARY_EAGER_TRANSFORMATIONS = env.bool('CLOUDINARY_EAGER_TRANSFORMATIONS', default=False) #type: ignore
+
+# Local resized copies of the product images, built with Pillow on upload and
+# served from MEDIA_ROOT/derivatives when Cloudinary is not available
+IMAGE_DERIVATIVES = {
+    'VARIANTS': {'thumbnail': 300, 'medium': 600, 'large': 1200},
+    'WORKERS': env.int('IMAGE_DERIVATIVE_WORKERS', default=2), #type: ignore  # 0 resizes in the request process
+    'QUALITY': 80,
+}
+
 
 WSGI_APPLICATION = 'biscuitshop.wsgi.application'
 
@@ -130,27 +149,140 @@ WSGI_APPLICATION = 'biscuitshop.wsgi.application'
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
 
-# DATABASES = {
-#     'default': dj_database_url.config(
-#         default=env('DATABASE_URL'),
-#         conn_max_age=600,
-#         ssl_require=True
-#     )
-# }
+# DATABASE_URL (postgres://... on Render), SQLite in the project directory otherwise.
+# Connections are kept open CONN_MAX_AGE seconds and checked before being reused.
+DATABASE_CONN_MAX_AGE = env.int('DATABASE_CONN_MAX_AGE', default=600) #type: ignore
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+    'default': dj_database_url.config(
+        default=f"sqlite:///{BASE_DIR / 'db.sqlite3'}",
+        conn_max_age=DATABASE_CONN_MAX_AGE,
+        conn_health_checks=True,
+        ssl_require=env.bool('DATABASE_SSL_REQUIRE', default=False), #type: ignore
+    ),
+}
+
+# The test suite never runs on DATABASE_URL: it is validated on SQLite, and on
+# PostgreSQL in CI through TEST_DATABASE_URL, which points at a disposable server.
+if TESTING:
+    DATABASES = {
+        'default': dj_database_url.parse(
+            env('TEST_DATABASE_URL', default='') or f"sqlite:///{BASE_DIR / 'db.sqlite3'}", #type: ignore
+        ),
+    }
+
+# Production SQLite mode, for the small deployments running on db.sqlite3 with
+# several gunicorn workers: WAL lets the readers run beside the writer, the
+# busy timeout makes a writer wait for the lock instead of failing, and
+# IMMEDIATE transactions take the write lock upfront so two transactions never
+# deadlock upgrading their read locks.
+SQLITE_PRODUCTION = env.bool('SQLITE_PRODUCTION', default=False) #type: ignore
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',        # durable at each checkpoint, safe with WAL
+    'busy_timeout': 5000,           # milliseconds a writer waits for the lock
+    'mmap_size': 128 * 1024 * 1024,
+    'cache_size': -20000,           # negative: KiB, so about 20 MB per connection
+    'temp_store': 'MEMORY',
+}
+
+if SQLITE_PRODUCTION and DATABASES['default']['ENGINE'] == 'django.db.backends.sqlite3':
+    DATABASES['default']['OPTIONS'] = {
+        'init_command': ''.join(f'PRAGMA {name}={value};' for name, value in SQLITE_PRAGMAS.items()),
+        'transaction_mode': 'IMMEDIATE',
+    }
+
+# Optional read replica of the primary: catalog reads (MODELS) go to it, every
+# write and the reads following it within STICKY_SECONDS stay on the primary
+DATABASE_REPLICA_URL = env('DATABASE_REPLICA_URL', default='') #type: ignore
+
+if DATABASE_REPLICA_URL:
+    DATABASES['replica'] = dj_database_url.parse(
+        DATABASE_REPLICA_URL,
+        conn_max_age=DATABASE_CONN_MAX_AGE,
+        conn_health_checks=True,
+        ssl_require=env.bool('DATABASE_SSL_REQUIRE', default=False), #type: ignore
+        # the test run reads the replica through the test primary
+        test_options={'MIRROR': 'default'},
+    )
+
+DATABASE_REPLICA = {
+    'ALIAS': 'replica' if DATABASE_REPLICA_URL else None,
+    'MODELS': ['shop.product', 'shop.category'],
+    'STICKY_SECONDS': 5,            # seconds a client reads from the primary after a write
+    'COOKIE_NAME': 'db_pin',
+}
+
+DATABASE_ROUTERS = ['biscuitshop.routers.PrimaryReplicaRouter']
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+REDIS_URL = env('REDIS_URL', default='') #type: ignore
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'catalog': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'biscuitshop',
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'sessions',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'catalog': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'catalog',
+        },
+        'sessions': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'sessions',
+        },
     }
+
+# Two-tier catalog cache: in-process LRU in front of the shared 'catalog' cache
+CATALOG_CACHE = {
+    'ALIAS': 'catalog',
+    'LOCAL_MAX_ENTRIES': env.int('CATALOG_CACHE_LOCAL_MAX_ENTRIES', default=1000), #type: ignore
+    'LOCAL_TIMEOUT': 30,            # seconds an entry stays in the worker memory
+    'TIMEOUT': 300,                 # seconds an entry stays in the shared cache
+    'VERSION_CHECK_INTERVAL': 5,    # seconds between two reads of a namespace version
+    # stale-while-revalidate reads of the catalog views
+    'SOFT_TIMEOUT': 60,             # seconds an entry is fresh
+    'HARD_TIMEOUT': 3600,           # seconds a stale entry can still be served
+    'LOCK_TIMEOUT': 30,             # seconds a recompute lock is held at most
+    'WAIT_TIMEOUT': 2,              # seconds a cold miss waits for the request recomputing it
+}
+
+# Cross-node invalidation of the in-process catalog caches and indexes:
+# Redis pub/sub when available, else the polled CatalogChange table
+CATALOG_INVALIDATION = {
+    'BACKEND': 'redis' if REDIS_URL else 'polled',
+    'POLL_INTERVAL': 1.0,           # seconds, upper bound of the delay before a node converges
 }
 
 
-# if 'test' in sys.argv:
-#     DATABASES['default'] = {
-#         'ENGINE': 'django.db.backends.sqlite3',
-#         'NAME': BASE_DIR / 'db.sqlite3',
-#     }
+# Admin CSV export: streamed in the response, or written to DIR in the
+# background above BACKGROUND_THRESHOLD rows
+CSV_EXPORT = {
+    'CHUNK_SIZE': 2000,             # rows fetched per database round trip
+    'BACKGROUND_THRESHOLD': env.int('CSV_EXPORT_BACKGROUND_THRESHOLD', default=50000), #type: ignore
+    'DIR': BASE_DIR / 'exports',
+    'MAX_AGE': 24 * 3600,           # seconds a finished export is kept on disk
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -193,17 +325,36 @@ STATICFILES_DIRS = [BASE_DIR / 'shop/static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Local media files are served by biscuitshop.media.MediaFiles, wrapped around
+# the WSGI application. OFFLOAD hands the transfer to the front server:
+# 'x-accel-redirect' (nginx, internal location OFFLOAD_PREFIX aliased on
+# MEDIA_ROOT) or 'x-sendfile' (Apache mod_xsendfile, lighttpd)
+MEDIA_SERVING = {
+    'ENABLED': env.bool('MEDIA_SERVING', default=True), #type: ignore
+    'MAX_AGE': 3600,                # seconds, for the names that are not content-hashed
+    'OFFLOAD': env('MEDIA_OFFLOAD', default=None), #type: ignore
+    'OFFLOAD_PREFIX': '/protected-media/',
+}
+
 
 STORAGES = {
     "default": {
         "BACKEND": "cloudinary_storage.storage.MediaCloudinaryStorage",
     },
+    # collectstatic writes content-hashed copies of every asset, with .br (Brotli
+    # package) and .gz siblings; WhiteNoise serves the hashed names as immutable
     "staticfiles": {
-        "BACKEND": "whitenoise.storage.CompressedStaticFilesStorage",
-        # "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+        "BACKEND": "whitenoise.storage.CompressedManifestStaticFilesStorage",
     },
 }
 
+# the test runner does not run collectstatic, so there is no manifest to read
+if TESTING:
+    STORAGES["staticfiles"]["BACKEND"] = "django.contrib.staticfiles.storage.StaticFilesStorage"
+
+# one year for the hashed names is WhiteNoise's default, this is for the others (favicon...)
+WHITENOISE_MAX_AGE = 3600
+
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -218,10 +369,38 @@ INTERNAL_IPS = [
 ]
 
 
-SESSION_ENGINE = "django.contrib.sessions.backends.db"
+# Product search: 'auto' (FTS5 on SQLite, tsvector on PostgreSQL), 'fts5', 'postgres' or 'memory'
+SEARCH_BACKEND = env('SEARCH_BACKEND', default='auto') #type: ignore
+SEARCH_MAX_RESULTS = 1000
+
+# Price bands of the shop facets: (key, label, lower bound included, upper bound excluded)
+CATALOG_PRICE_BANDS = [
+    ('under-1000', 'Under 1 000 Ar', None, 1000),
+    ('1000-5000', '1 000 - 5 000 Ar', 1000, 5000),
+    ('over-5000', '5 000 Ar and more', 5000, None),
+]
+
+
+# 'db', or 'cache' / 'cached_db' on the 'sessions' cache (Redis when REDIS_URL is set).
+# 'cache' keeps the sessions in the cache only: it needs Redis, a per-process
+# LocMem cache would lose them between the workers.
+SESSION_BACKEND = env('SESSION_BACKEND', default='db') #type: ignore
+if SESSION_BACKEND not in ('db', 'cache', 'cached_db'):
+    raise ImproperlyConfigured(f"SESSION_BACKEND must be 'db', 'cache' or 'cached_db', not {SESSION_BACKEND!r}")
+SESSION_ENGINE = f"django.contrib.sessions.backends.{SESSION_BACKEND}"
+SESSION_CACHE_ALIAS = 'sessions'
 SESSION_COOKIE_AGE = 1209600                            # 2 weeks in seconds
 SESSION_EXPIRE_AT_BROWSER_CLOSE = False
 
+# Where the carts live: 'auto' (the default: in the session for anonymous
+# visitors, CartItem rows for the logged-in users, kept across devices),
+# 'session' (always in the session), 'db' (always CartItem rows) or 'redis'
+# (a Redis hash per cart on CART_REDIS_URL)
+CART_STORE = env('CART_STORE', default='auto') #type: ignore
+CART_REDIS_URL = env('CART_REDIS_URL', default=REDIS_URL) #type: ignore
+# quantity of a product in both the anonymous and the saved cart at login: 'sum' or 'max'
+CART_MERGE_POLICY = 'sum'
+
 ENV_MODE = env('ENV_MODE')
 
 # Mvola API constant
@@ -14,3 +14,17 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'biscuitshop.settings')
 
 application = get_wsgi_application()
+
+# /media/ is answered here, before the Django middleware stack
+from django.conf import settings
+from biscuitshop.media import MediaFiles
+
+if settings.MEDIA_SERVING['ENABLED']:
+    application = MediaFiles(
+        application,
+        root=settings.MEDIA_ROOT,
+        prefix=settings.MEDIA_URL,
+        max_age=settings.MEDIA_SERVING['MAX_AGE'],
+        offload=settings.MEDIA_SERVING['OFFLOAD'],
+        offload_prefix=settings.MEDIA_SERVING['OFFLOAD_PREFIX'],
+    )
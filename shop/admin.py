@@ -2,9 +2,25 @@ from django.contrib import admin
 from django.contrib.auth.models import User, Group
 from django.contrib.auth.admin import UserAdmin, GroupAdmin
 from .models import Category, Product, CustomerProfile, Order, OrderItem, CartItem, WishlistItem
-from django.http import HttpResponse
-from django.db.models import Sum
-import csv
+from .catalog.cache import catalog_cache
+from .sales.summary import get_header_stats
+from .exports import csv_export
+from .catalog import bulk
+from .images import derivatives, responsive
+from django.core.files.uploadedfile import UploadedFile
+from django.contrib.admin.helpers import ActionForm
+from django import forms
+from django.http import FileResponse, Http404
+from django.shortcuts import redirect
+from django.contrib import messages
+from django.utils.html import format_html
+from django.urls import path, reverse
+from django.db.models import Sum, F, OuterRef, Subquery, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Coalesce
+from decimal import Decimal
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class BiscuitAdminSite(admin.AdminSite):
@@ -13,11 +29,11 @@ class BiscuitAdminSite(admin.AdminSite):
     def each_context(self, request):
         context = super().each_context(request)
         
-        total_sales = Order.objects.filter(status='Paid').aggregate(Sum('total_price'))['total_price__sum'] or 0
-        order_count = Order.objects.count()
+        sales = get_header_stats()
 
-        context['stats_total_sales'] = total_sales
-        context['stats_order_count'] = order_count
+        context['stats_total_sales'] = sales['total_sales']
+        context['stats_order_count'] = sales['order_count']
+        context['stats_catalog_cache'] = catalog_cache.stats()
         
         return context
     
@@ -37,6 +53,25 @@ class BiscuitAdminSite(admin.AdminSite):
 
         return app_list
 
+    def get_urls(self):
+        urls = [
+            path('exports/<str:token>/', self.admin_view(self.csv_export_download), name='csv_export_download'),
+        ]
+        return urls + super().get_urls()
+
+    def csv_export_download(self, request, token):
+        """Serve a background CSV export once it is written"""
+        export_path = csv_export.export_path(token)
+        if export_path is None:
+            raise Http404("Unknown export")
+        if export_path.exists():
+            return FileResponse(open(export_path, 'rb'), as_attachment=True, filename="export_biscuit_shop.csv")
+        if export_path.with_suffix('.part').exists():
+            messages.info(request, "L'export n'est pas encore terminé, réessayez dans quelques instants.")
+        else:
+            messages.error(request, "Cet export a échoué ou a expiré.")
+        return redirect(request.META.get('HTTP_REFERER') or reverse(f'{self.name}:index'))
+
 admin_site = BiscuitAdminSite(name='myadmin')
 
 class ProductInline(admin.TabularInline):
@@ -65,22 +100,53 @@ class PriceRangeFilter(admin.SimpleListFilter):
         if self.value() == 'high':
             return queryset.filter(price__gt=5)
 
+@admin.action(description='Export selected to CSV')
 def export_as_csv(modeladmin, request, queryset):
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="export_biscuit_shop.csv"'
-    
-    writer = csv.writer(response)
-    
-    fields = [field.name for field in modeladmin.model._meta.fields]
-    writer.writerow(fields)
-    
-    # 2. Écrire les données pour chaque objet sélectionné
-    for obj in queryset:
-        row = [getattr(obj, field) for field in fields]
-        writer.writerow(row)
-        
-    return response
+    """Stream the selection as CSV, or write it in the background when it is very large"""
+    filename = f"export_biscuit_shop_{modeladmin.model._meta.model_name}.csv"
+    if queryset.count() < csv_export.get_export_config()['BACKGROUND_THRESHOLD']:
+        return csv_export.stream_csv(queryset, filename)
+
+    token = csv_export.start_background_export(queryset)
+    download_url = reverse(f'{admin_site.name}:csv_export_download', args=[token])
+    messages.info(request, format_html(
+        "L'export est en cours de génération. <a href=\"{}\">Télécharger le fichier</a> quand il sera prêt.",
+        download_url,
+    ))
+    return None
+
+class ProductBulkActionForm(ActionForm):
+    """Action bar fields of the bulk price and stock actions"""
+    percent = forms.DecimalField(label='Variation (%)', required=False, max_digits=6, decimal_places=2)
+    stock = forms.IntegerField(label='Stock', required=False, min_value=0)
+
+@admin.action(description='Ajuster les prix des produits sélectionnés (%%)')
+def adjust_prices_action(modeladmin, request, queryset):
+    percent = _action_value(ProductBulkActionForm.base_fields['percent'], request.POST.get('percent'))
+    if percent is None:
+        messages.error(request, "Indiquez la variation de prix en %.")
+        return
+    try:
+        updated = bulk.adjust_prices(queryset, percent=percent)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return
+    messages.success(request, f"{updated} prix ajustés de {percent}%.")
+
+@admin.action(description='Fixer le stock des produits sélectionnés')
+def set_stock_action(modeladmin, request, queryset):
+    stock = _action_value(ProductBulkActionForm.base_fields['stock'], request.POST.get('stock'))
+    if stock is None:
+        messages.error(request, "Indiquez le stock à appliquer.")
+        return
+    updated = bulk.set_stock(queryset, stock)
+    messages.success(request, f"Stock de {updated} produits fixé à {stock}.")
+
+def _action_value(field, raw):
+    try:
+        return field.clean(raw)
+    except forms.ValidationError:
+        return None
 
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'description')
@@ -90,31 +156,63 @@ class CategoryAdmin(admin.ModelAdmin):
 
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'price', 'stock', 'category')
+    list_select_related = ('category',)
     list_editable = ('price', 'stock')
     list_filter = ('category',)
-    search_fields = ('name', 'description')
+    search_fields = ('name', 'sku', 'description')
     autocomplete_fields = ('category',)
-    actions = [export_as_csv]
+    actions = [export_as_csv, adjust_prices_action, set_stock_action]
+    action_form = ProductBulkActionForm
     list_filter = (PriceRangeFilter, 'category',  'stock')
 
+    def save_model(self, request, obj, form, change):
+        """Save the product then build the local derivatives of a newly uploaded image"""
+        upload = form.cleaned_data.get('image') if 'image' in form.changed_data else None
+        source = None
+        if isinstance(upload, UploadedFile):
+            source = upload.read()
+            upload.seek(0)
+            if not responsive.cloudinary_configured():
+                # offline: keep the previous Cloudinary image, the derivatives are served locally
+                obj.image = form.initial.get('image')
+        super().save_model(request, obj, form, change)
+        if source is None:
+            return
+        try:
+            derivatives.generate_for_product(obj, source)
+        except Exception as e:
+            logger.error('[Images] Error building derivatives for product %s: %s', obj.pk, e)
+            messages.warning(request, "Les variantes locales de l'image n'ont pas pu être générées.")
+
 class CustomerProfileAdmin(admin.ModelAdmin):
     list_display = ('user', 'phone_number', 'address')
+    list_select_related = ('user',)
     search_fields = ('user__username', 'phone_number')
     autocomplete_fields = ('user',)
 
 class WishlistItemAdmin(admin.ModelAdmin):
     list_display = ('user', 'product', 'added_at')
+    list_select_related = ('user', 'product')
     search_fields = ('user__username', 'product__name')
     autocomplete_fields = ('user', 'product')
 
 class CartItemAdmin(admin.ModelAdmin):
     list_display = ('user', 'product', 'quantity')
+    list_select_related = ('user', 'product')
     search_fields = ('user__username', 'product__name')
     autocomplete_fields = ('user', 'product')
     
+class OrderFilter(admin.RelatedFieldListFilter):
+    """Order filter loading the users of the orders in the same query, for Order.__str__"""
+
+    def field_choices(self, field, request, model_admin):
+        orders = Order.objects.select_related('user').order_by('-pk')
+        return [(order.pk, str(order)) for order in orders]
+
 class OrderItemAdmin(admin.ModelAdmin):
     list_display = ('order', 'product', 'quantity', 'price')
-    list_filter = ('order',)
+    list_select_related = ('order__user', 'product')
+    list_filter = (('order', OrderFilter),)
     search_fields = ('order__id', 'product__name')
     autocomplete_fields = ('order', 'product')
     
@@ -123,21 +221,54 @@ class OrderItemInline(admin.TabularInline):
     extra = 1
     fields = ('product', 'quantity', 'price')
 
+def order_items_total():
+    """Subquery summing price * quantity of the lines of each order, computed by the database"""
+    line_total = ExpressionWrapper(F('price') * F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=2))
+    totals = (
+        OrderItem.objects.filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total=Sum(line_total))
+        .values('total')
+    )
+    return Coalesce(Subquery(totals), Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2))
+
+class OrderTotalRangeFilter(admin.SimpleListFilter):
+    title = 'Montant de la commande'
+    parameter_name = 'total_range'
+
+    def lookups(self, request, model_admin):
+        return (
+            ('low', 'Moins de 10 000Ar'),
+            ('mid', 'Entre 10 000Ar et 50 000Ar'),
+            ('high', 'Plus de 50 000Ar'),
+        )
+
+    # filtre sur l'annotation items_total ajoutée par OrderAdmin.get_queryset
+    def queryset(self, request, queryset):
+        if self.value() == 'low':
+            return queryset.filter(items_total__lt=10000)
+        if self.value() == 'mid':
+            return queryset.filter(items_total__gte=10000, items_total__lte=50000)
+        if self.value() == 'high':
+            return queryset.filter(items_total__gt=50000)
+
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'status', 'created_at', 'get_total')
+    list_select_related = ('user',)
     list_editable = ('status',)
-    list_filter = ('status', 'created_at')
+    list_filter = ('status', OrderTotalRangeFilter, 'created_at')
     search_fields = ('user__username', 'id')
     inlines = [OrderItemInline]
     actions = [export_as_csv]
     
-    @admin.display(description='Total (Ar)')
+    @admin.display(description='Total (Ar)', ordering='items_total')
     def get_total(self, obj):
-        return sum(item.price * item.quantity for item in obj.items.all())
+        return obj.items_total
     
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        return queryset.prefetch_related('items')
+        return queryset.annotate(items_total=order_items_total())
     
 
 #model registration with the personnalized admin site
@@ -1,10 +1,60 @@
-from shop.models import Product, CartItem
+from django.conf import settings
+from shop.models import Product
+from decimal import Decimal
+
+TOTALS_KEY = 'cart_totals'
+
+
+def get_cart_store(request):
+    """Return the cart store of the request selected by settings.CART_STORE
+
+    'session' keeps the cart in the session, 'db' in the CartItem table and
+    'redis' in a Redis hash per cart. 'auto' keeps the cart of an anonymous
+    visitor in the session and the cart of a logged-in user in the CartItem
+    table, where it is found again from any browser.
+    """
+    name = getattr(settings, 'CART_STORE', 'auto')
+    if name == 'auto':
+        name = 'db' if request.user.is_authenticated else 'session'
+    if name == 'session':
+        from shop.cart.session_store import SessionCartStore
+        return SessionCartStore(request)
+    if name == 'db':
+        from shop.cart.db_store import DatabaseCartStore
+        return DatabaseCartStore(request)
+    if name == 'redis':
+        from shop.cart.redis_store import RedisCartStore
+        return RedisCartStore(request)
+    raise ValueError(f"Unknown cart store: {name}")
+
+
+def compute_totals(lines):
+    """Item count and Decimal subtotal of cart lines, walking all of them
+
+    Args:
+        lines (iterable): cart lines {'product_id', 'quantity', 'price'}
+
+    Returns:
+        tuple: (count, subtotal)
+    """
+    count, subtotal = 0, Decimal('0')
+    for line in lines:
+        count += line["quantity"]
+        subtotal += Decimal(line["price"]) * line["quantity"]
+    return count, subtotal
+
 
 class Cart:
     """A shopping cart class to manage cart operations within a user's session.
+
+    The item count and the Decimal subtotal are kept up to date by every
+    change and stored in the session under TOTALS_KEY, so len() and
+    get_total_price() never walk the lines. A cart that can change without
+    this session (the db cart, priced live, or the redis cart of a user) has
+    them recomputed once per request from the lines already read.
     """
     def __init__(self, request):
-        """init a cart object in the session
+        """init a cart object on the cart store of the request
 
         Args:
             request (Request): request
@@ -12,11 +62,10 @@ class Cart:
         self.session = request.session
         self.is_authenticated: bool = request.user.is_authenticated
         self.request = request
-        cart = self.session.get("cart")
-        if not cart:
-            cart = self.session["cart"] = {}
-        self.cart = cart
-        self._sync_cart_session_and_db()
+        self.store = get_cart_store(request)
+        # lines read once per request, kept up to date by the changes below
+        self.cart = self.store.items()
+        self.count, self.subtotal = self._load_totals()
     
     def add_item(self, product, quantity=1):
         """Add a product to the cart or update its quantity.
@@ -26,34 +75,10 @@ class Cart:
             quantity (int, optional): Quantity of the product to add. Defaults to 1.
         """
         product_id = str(product.id)
-        
-        if product_id not in self.cart:
-            self.cart[product_id] = {
-                "product_id": product_id,
-                "quantity": 0,
-                "price": str(product.price)
-            }
-            
-        if self.is_authenticated:
-            try:
-                product = Product.objects.get(id=product_id)
-                cart_item, created = CartItem.objects.get_or_create(
-                    user=self.request.user,
-                    product=product,
-                    quantity=quantity,
-                    session_key=self.request.session.session_key
-                )
-                if not created:
-                    cart_item.quantity += quantity
-                    cart_item.save()
-                    
-            except Product.DoesNotExist:
-                print('Product not found')
-            except Exception as e:
-                print('Error adding to cart:', e)
-            
-        self.cart[product_id]["quantity"] += quantity
-        self.save()
+        self.store.add(product_id, quantity, product.price)
+        line = self.cart.setdefault(product_id, {"product_id": product_id, "quantity": 0, "price": str(product.price)})
+        line["quantity"] += quantity
+        self._adjust_totals(quantity, Decimal(line["price"]))
     
     def substract_number_of_item(self, product_or_id, quantity=1):
         """Substract quantity of a product in the cart.
@@ -61,33 +86,35 @@ class Cart:
             product_or_id (Product or int/str): Product object or product ID
             quantity (int, optional): Quantity of the product to subtract. Defaults to 1.
         """
-        # Handle both Product object and product_id
-        if hasattr(product_or_id, 'id'):
-            product_id = str(product_or_id.id)
-        else:
-            product_id = str(product_or_id)
-            
+        product_id = self._product_id(product_or_id)
         if product_id in self.cart:
-            self.cart[product_id]["quantity"] -= quantity
-            if self.cart[product_id]["quantity"] <= 0:
+            self.store.add(product_id, -quantity)
+            line = self.cart[product_id]
+            removed = min(quantity, line["quantity"])
+            line["quantity"] -= removed
+            if line["quantity"] <= 0:
                 del self.cart[product_id]
-                
-        if self.is_authenticated:
-            try:
-                product = Product.objects.get(id=product_id)
-                cart_item = CartItem.objects.get(user=self.request.user, product=product)
-                cart_item.quantity -= quantity
-                if cart_item.quantity <= 0:
-                    cart_item.delete()
-                else:
-                    cart_item.save()
-                    
-            except Product.DoesNotExist:
-                pass
-            except CartItem.DoesNotExist:
-                pass
-
-        self.save()
+            self._adjust_totals(-removed, Decimal(line["price"]))
+    
+    def set_quantities(self, quantities, versions=None):
+        """Set the quantity of several products at once, in one store write.
+
+        Args:
+            quantities (dict): Product -> new quantity, 0 removes the product
+            versions (dict, optional): product id -> version of the line the
+                new quantity was chosen from; a line changed since is left as is
+
+        Returns:
+            list: product ids of the lines left as is
+        """
+        conflicts = self.store.set_many(
+            {str(product.id): (quantity, product.price) for product, quantity in quantities.items()},
+            {str(product_id): version for product_id, version in (versions or {}).items()},
+        )
+        # the lines now carry new versions, or someone else's quantities
+        self.cart = self.store.items()
+        self._save_totals(*compute_totals(self.cart.values()))
+        return conflicts
     
     def remove_item(self, product_or_id):
         """Remove a product from the cart.
@@ -95,32 +122,11 @@ class Cart:
         Args:
             product_or_id (Product or int/str): Product object or product ID
         """
-        # Handle both Product object and product_id
-        if hasattr(product_or_id, 'id'):
-            product_id = str(product_or_id.id)
-        else:
-            product_id = str(product_or_id)
-            
+        product_id = self._product_id(product_or_id)
         if product_id in self.cart:
-            del self.cart[product_id]
-            
-        if self.is_authenticated:
-            try:
-                product = Product.objects.get(id=product_id)
-                cart_item = CartItem.objects.get(user=self.request.user, product=product)
-                cart_item.delete()
-            except Product.DoesNotExist:
-                pass
-            except CartItem.DoesNotExist:
-                pass
-
-        self.save()
-    
-    def save(self):
-        """save the change and reload the session
-        """
-        self._sync_cart_session_and_db()
-        self.session.modified = True
+            self.store.remove(product_id)
+            line = self.cart.pop(product_id)
+            self._adjust_totals(-line["quantity"], Decimal(line["price"]))
     
     def __len__(self):
         """Return the total number of items in the cart.
@@ -128,7 +134,7 @@ class Cart:
         Returns:
             int: total number of items
         """
-        return sum(item["quantity"] for item in self.cart.values())
+        return self.count
     
     def __iter__(self):
         """Allow iteration over cart items"""
@@ -136,21 +142,16 @@ class Cart:
     
     def clear(self):
         self.cart = {}
-        if self.is_authenticated:
-            try:
-                cart_items = CartItem.objects.filter(user=self.request.user)
-                for cart_item in cart_items:
-                    cart_item.delete()
-            except Exception as e:
-                print('Error clearing the cart: ', e)
+        self.store.clear()
+        self._save_totals(0, Decimal('0'))
         
     def get_total_price(self):
         """Return the total price of items in the cart.
 
         Returns:
-            float: total price
+            Decimal: total price
         """
-        return sum(float(item["price"]) * item["quantity"] for item in self.cart.values())
+        return self.subtotal
     
     def get_items(self) -> list:
         if len(self.cart) == 0: return []
@@ -160,61 +161,32 @@ class Cart:
             items.append({
                 'product': product,
                 'quantity': item["quantity"],
-                'subtotal': float(item["price"]) * item["quantity"]
+                'subtotal': Decimal(item["price"]) * item["quantity"]
             })
         return items
-        
-    def _sync_cart_session_and_db(self):
-        if not self.is_authenticated:
-            return
-
-        db_cart = CartItem.objects.filter(user=self.request.user)
-        db_cart_products = set(db_cart.values_list('product_id', flat=True))
-
-        session_cart_products = set(int(pid) for pid in self.cart.keys())
-
-        # Compute differences
-        item_to_delete = db_cart_products - session_cart_products
-        item_to_add = session_cart_products - db_cart_products
-        item_to_update = session_cart_products.intersection(db_cart_products)
-
-        # Delete items not in session
-        if item_to_delete:
-            CartItem.objects.filter(user=self.request.user, product_id__in=item_to_delete).delete()
-
-        # Add new items from session
-        for product_id in item_to_add:
-            product = Product.objects.get(id=product_id)
-            CartItem.objects.create(
-                user=self.request.user,
-                product=product,
-                quantity=self.cart[str(product_id)]["quantity"],
-                session_key=self.request.session.session_key
-            )
-
-        # Update existing items if quantity/price differ
-        for product_id in item_to_update:
-            session_item = self.cart[str(product_id)]
-            try:
-                db_item = CartItem.objects.get(user=self.request.user, product_id=product_id)
-                updated = False
-
-                # check quantity
-                if db_item.quantity != session_item["quantity"]:
-                    db_item.quantity = session_item["quantity"]
-                    updated = True
-
-                # check price
-                if hasattr(db_item, "price") and db_item.product.price != session_item["price"]:
-                    db_item.product.price = session_item["price"]
-                    updated = True
-
-                if updated:
-                    db_item.save()
-
-            except CartItem.DoesNotExist:
-                pass
-
-        self.session.modified = True
-        
-    
+
+    def _load_totals(self):
+        stored = self.session.get(TOTALS_KEY)
+        if stored and stored["store"] == self.store.name and not self.store.volatile:
+            return stored["count"], Decimal(stored["subtotal"])
+        count, subtotal = compute_totals(self.cart.values())
+        # an empty cart without stored totals does not need a session
+        if stored != self._totals_value(count, subtotal) and (stored or self.cart):
+            self._save_totals(count, subtotal)
+        return count, subtotal
+
+    def _adjust_totals(self, quantity, price):
+        self._save_totals(self.count + quantity, self.subtotal + price * quantity)
+
+    def _save_totals(self, count, subtotal):
+        self.count, self.subtotal = count, subtotal
+        self.session[TOTALS_KEY] = self._totals_value(count, subtotal)
+
+    def _totals_value(self, count, subtotal):
+        return {"store": self.store.name, "count": count, "subtotal": str(subtotal)}
+
+    def _product_id(self, product_or_id):
+        # Handle both Product object and product_id
+        if hasattr(product_or_id, 'id'):
+            return str(product_or_id.id)
+        return str(product_or_id)
@@ -0,0 +1,145 @@
+from shop.models import Product
+
+# session entry holding the key the anonymous cart is filed under
+ANONYMOUS_CART_KEY = 'cart_key'
+MERGE_POLICIES = ('sum', 'max')
+
+
+def make_line(product_id, quantity, price, version=None):
+    """One cart line, as the Cart and the views read it
+
+    version is only set by the stores that keep one per line.
+    """
+    line = {"product_id": str(product_id), "quantity": quantity, "price": str(price)}
+    if version is not None:
+        line["version"] = version
+    return line
+
+
+class CartStore:
+    """Base class of the cart storage backends
+
+    A store holds the lines of the cart of one visitor: the logged-in user,
+    or the session of an anonymous visitor. Lines are read as
+    product id (str) -> {'product_id', 'quantity', 'price'}; quantity changes
+    are relative (add) or absolute (set), and a line whose quantity reaches 0
+    is removed.
+    """
+
+    # CART_STORE value selecting the store
+    name = None
+
+    def __init__(self, request):
+        self.request = request
+
+    def items(self):
+        """Return the lines of the cart, in the order they were added"""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def add(self, product_id, quantity, price=None):
+        """Change the quantity of a line by quantity, negative to substract
+
+        The line is created at price when it does not exist yet.
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def set(self, product_id, quantity, price, version=None):
+        """Set the quantity of a line, 0 removes it
+
+        With a version, the change is a compare-and-set: it is only applied
+        if the line is still at the version the caller read. Stores without
+        line versions apply it unconditionally.
+
+        Returns:
+            bool: False when the line changed since version was read
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def set_many(self, lines, versions=None):
+        """Set the quantity of several lines at once, 0 removes a line
+
+        Args:
+            lines (dict): product id -> (quantity, price)
+            versions (dict, optional): product id -> version read by the caller
+
+        Returns:
+            list: product ids of the lines left unchanged because they changed meanwhile
+        """
+        versions = versions or {}
+        return [
+            product_id for product_id, (quantity, price) in lines.items()
+            if not self.set(product_id, quantity, price, version=versions.get(product_id))
+        ]
+
+    def remove(self, product_id):
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def clear(self):
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def merge_anonymous(self, policy='sum'):
+        """Fold the cart filled before logging in into the cart of the user
+
+        Called once the request user is authenticated. A product in both
+        carts gets the sum or the max of the two quantities, and every line
+        is repriced at the current product price.
+        """
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    @property
+    def user(self):
+        user = self.request.user
+        return user if user.is_authenticated else None
+
+    @property
+    def volatile(self):
+        """Whether the lines can change without this session writing them:
+        edits from another session of the user, prices read live
+        """
+        return False
+
+    def session_key(self):
+        """Key of the visitor session, created when the session is new"""
+        session = self.request.session
+        if session.session_key is None:
+            session.save()
+        return session.session_key
+
+    def anonymous_key(self, create=False):
+        """Key the anonymous cart is filed under
+
+        It is the session key of the first change, kept in the session data:
+        login gives the session a new key but keeps its data, so the cart can
+        still be found to be merged. None until the cart is first changed,
+        so browsing never creates a session.
+        """
+        session = self.request.session
+        key = session.get(ANONYMOUS_CART_KEY)
+        if key is None and create:
+            key = session[ANONYMOUS_CART_KEY] = self.session_key()
+        return key
+
+
+def merge_quantities(saved, anonymous, policy):
+    """Quantities of the merged cart
+
+    Args:
+        saved (dict): product id -> quantity in the cart of the user
+        anonymous (dict): product id -> quantity in the anonymous cart
+        policy (str): 'sum' or 'max' of the quantities of a product in both carts
+
+    Returns:
+        dict: product id -> quantity, only for the products of the anonymous cart
+    """
+    if policy not in MERGE_POLICIES:
+        raise ValueError(f"Unknown cart merge policy: {policy}")
+    combine = (lambda a, b: a + b) if policy == 'sum' else max
+    return {
+        product_id: combine(saved[product_id], quantity) if product_id in saved else quantity
+        for product_id, quantity in anonymous.items()
+    }
+
+
+def current_prices(product_ids):
+    """product id (str) -> current price, one query"""
+    return {str(pk): price for pk, price in Product.objects.filter(pk__in=list(product_ids)).values_list('pk', 'price')}
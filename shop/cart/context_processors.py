@@ -1,7 +1,10 @@
 from .cart import Cart
 
 def cart(request):
-    cart_instance = Cart(request)
+    # the CartMiddleware instance already holds the lines read for this request
+    cart_instance = getattr(request, 'cart', None)
+    if cart_instance is None:
+        cart_instance = Cart(request)
     return {
         'cart': cart_instance,
         'cart_count': len(cart_instance),
@@ -0,0 +1,140 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from shop.cart.cart_store import CartStore, ANONYMOUS_CART_KEY, make_line, merge_quantities, current_prices
+from shop.cart.session_store import decode_cart
+from shop.models import CartItem
+
+
+class DatabaseCartStore(CartStore):
+    """The CartItem table is the cart: one row per line, keyed on the user or,
+    for an anonymous visitor, on the session key
+
+    Every change is a single conditional UPDATE computed by the database, and
+    an INSERT only when the line does not exist yet, so concurrent requests
+    never lose an update and never wait on a row lock. Each change bumps the
+    version of the line: an absolute quantity set with the version it was
+    read at is a compare-and-set. Lines are read at the current product price.
+    """
+
+    name = 'db'
+
+    @property
+    def volatile(self):
+        # lines are priced at the current product price
+        return True
+
+    def items(self):
+        rows = self._lines().order_by('pk').values_list('product_id', 'quantity', 'product__price', 'version')
+        return {
+            str(product_id): make_line(product_id, quantity, price, version)
+            for product_id, quantity, price, version in rows
+        }
+
+    def add(self, product_id, quantity, price=None):
+        lines = self._lines(create=quantity > 0).filter(product_id=product_id)
+        if quantity >= 0:
+            if not lines.update(quantity=F('quantity') + quantity, version=F('version') + 1) and quantity:
+                self._create(product_id, quantity, increment=True)
+        else:
+            self._substract(lines, -quantity)
+
+    def _substract(self, lines, quantity):
+        # each statement only applies to the quantity it was decided on: a
+        # line changed by another request in between makes both miss, retry
+        while True:
+            if lines.filter(quantity__gt=quantity).update(quantity=F('quantity') - quantity, version=F('version') + 1):
+                return
+            if lines.filter(quantity__lte=quantity).delete()[0] or not lines.exists():
+                return
+
+    def set(self, product_id, quantity, price, version=None):
+        lines = self._lines(create=quantity > 0).filter(product_id=product_id)
+        if version is not None:
+            # compare-and-set: a line changed or removed since then is left alone
+            if quantity <= 0:
+                return bool(lines.filter(version=version).delete()[0]) or not lines.exists()
+            return bool(lines.filter(version=version).update(quantity=quantity, version=F('version') + 1))
+        if quantity <= 0:
+            lines.delete()
+        elif not lines.update(quantity=quantity, version=F('version') + 1):
+            self._create(product_id, quantity, increment=False)
+        return True
+
+    def set_many(self, lines, versions=None):
+        with transaction.atomic():
+            return super().set_many(lines, versions)
+
+    def remove(self, product_id):
+        self._lines().filter(product_id=product_id).delete()
+
+    def clear(self):
+        self._lines().delete()
+
+    def merge_anonymous(self, policy='sum'):
+        """One read of both carts, one upsert of the merged lines and one
+        delete of the anonymous lines, whatever the size of the carts
+
+        With CART_STORE 'auto', the anonymous cart is the session cart: its
+        lines are merged the same way, those of deleted products dropped.
+        Prices are always read live from the products, nothing to refresh.
+        """
+        anonymous_key = self.request.session.pop(ANONYMOUS_CART_KEY, None)
+        session_lines = decode_cart(self.request.session.pop("cart", None))
+        if anonymous_key is None and not session_lines:
+            return
+        lines = Q(user=self.user)
+        if anonymous_key is not None:
+            lines |= Q(user__isnull=True, session_key=anonymous_key)
+        rows = CartItem.objects.filter(lines).values_list('user_id', 'product_id', 'quantity', 'version')
+        saved, anonymous, versions = {}, {}, {}
+        for user_id, product_id, quantity, version in rows:
+            if user_id is None:
+                anonymous[product_id] = quantity
+            else:
+                saved[product_id] = quantity
+                versions[product_id] = version
+        if session_lines:
+            for product_id in current_prices(session_lines):
+                product_id, quantity = int(product_id), session_lines[product_id]["quantity"]
+                anonymous[product_id] = anonymous.get(product_id, 0) + quantity
+        if not anonymous:
+            return
+
+        merged = merge_quantities(saved, anonymous, policy)
+        with transaction.atomic():
+            CartItem.objects.bulk_create(
+                [
+                    CartItem(
+                        user=self.user, session_key=self.session_key(), product_id=product_id,
+                        quantity=quantity, version=versions.get(product_id, -1) + 1,
+                    )
+                    for product_id, quantity in merged.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['user', 'product'],
+                update_fields=['quantity', 'session_key', 'version'],
+            )
+            if anonymous_key is not None:
+                CartItem.objects.filter(user__isnull=True, session_key=anonymous_key).delete()
+
+    def _lines(self, create=False):
+        if self.user is not None:
+            return CartItem.objects.filter(user=self.user)
+        key = self.anonymous_key(create=create)
+        if key is None:
+            return CartItem.objects.none()
+        return CartItem.objects.filter(user__isnull=True, session_key=key)
+
+    def _create(self, product_id, quantity, increment):
+        try:
+            with transaction.atomic():
+                CartItem.objects.create(
+                    user=self.user,
+                    session_key=self.session_key() if self.user else self.anonymous_key(),
+                    product_id=product_id,
+                    quantity=quantity,
+                )
+        except IntegrityError:
+            # another request created the line in the meantime
+            lines = self._lines().filter(product_id=product_id)
+            lines.update(quantity=F('quantity') + quantity if increment else quantity, version=F('version') + 1)
@@ -0,0 +1,133 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.utils import timezone
+from shop.models import CartItem, WishlistItem
+from importlib import import_module
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+DB_SESSION_ENGINES = ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db')
+
+
+class Purger:
+    """Delete expired sessions and abandoned cart and wishlist rows in small chunks
+
+    Every chunk is one short DELETE in its own transaction, bounded by a
+    primary key range (a session key range for the sessions), followed by a
+    pause: the locks are held a few milliseconds at a time and a replica
+    never has to apply one huge transaction, so the purge can run while the
+    shop is busy.
+    """
+
+    def __init__(self, chunk_size=1000, pause=0.1, dry_run=False, stdout=None):
+        self.chunk_size = chunk_size
+        self.pause = pause
+        self.dry_run = dry_run
+        self.stdout = stdout
+
+    def purge_sessions(self):
+        """Delete the expired sessions
+
+        Returns:
+            int: number of deleted (or, in dry run, expired) sessions
+        """
+        now = timezone.now()
+        deleted = 0
+        last_key = ''
+        while True:
+            keys = list(
+                Session.objects.filter(session_key__gt=last_key, expire_date__lt=now)
+                .order_by('session_key')
+                .values_list('session_key', flat=True)[:self.chunk_size]
+            )
+            if not keys:
+                break
+            last_key = keys[-1]
+            deleted += self._delete(Session.objects.filter(session_key__in=keys), len(keys))
+            self._progress(f"Sessions: {deleted} expired sessions purged")
+        return deleted
+
+    def purge_cart_items(self):
+        """Delete the anonymous cart rows whose session is gone or expired
+
+        The rows of a logged-in user are their saved cart and are kept.
+
+        Returns:
+            int: number of deleted cart rows
+        """
+        def orphans(queryset):
+            rows = list(queryset.filter(user__isnull=True).values_list('pk', 'session_key'))
+            live = self._live_session_keys({key for _, key in rows if key})
+            return [pk for pk, key in rows if key not in live]
+
+        return self._purge_by_pk_range(CartItem, 'Cart items', orphans)
+
+    def purge_inactive_wishlists(self):
+        """Delete the wishlist rows of the deactivated accounts
+
+        A wishlist row always has a user (the foreign key cascades), so these
+        are the only abandoned ones.
+
+        Returns:
+            int: number of deleted wishlist rows
+        """
+        def abandoned(queryset):
+            return list(queryset.filter(user__is_active=False).values_list('pk', flat=True))
+
+        return self._purge_by_pk_range(WishlistItem, 'Wishlist items', abandoned)
+
+    def _purge_by_pk_range(self, model, label, select):
+        deleted = 0
+        last_pk = 0
+        max_pk = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        while last_pk < max_pk:
+            chunk = model.objects.filter(pk__gt=last_pk, pk__lte=last_pk + self.chunk_size)
+            pks = select(chunk)
+            if pks:
+                deleted += self._delete(model.objects.filter(pk__in=pks), len(pks))
+            last_pk += self.chunk_size
+            self._progress(f"{label}: up to #{min(last_pk, max_pk)} of {max_pk}, {deleted} purged")
+        return deleted
+
+    def _live_session_keys(self, keys):
+        if not keys:
+            return set()
+        if settings.SESSION_ENGINE in DB_SESSION_ENGINES:
+            return set(
+                Session.objects.filter(session_key__in=keys, expire_date__gte=timezone.now())
+                .values_list('session_key', flat=True)
+            )
+        store = import_module(settings.SESSION_ENGINE).SessionStore
+        return {key for key in keys if store().exists(key)}
+
+    def _delete(self, queryset, count):
+        if not self.dry_run:
+            count = queryset.delete()[0]
+            # let the other transactions and the replication catch up
+            time.sleep(self.pause)
+        return count
+
+    def _progress(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+
+def purge(chunk_size=1000, pause=0.1, dry_run=False, inactive_wishlists=False, stdout=None):
+    """Run every purge
+
+    Returns:
+        dict: number of purged rows per kind
+    """
+    purger = Purger(chunk_size=chunk_size, pause=pause, dry_run=dry_run, stdout=stdout)
+    counts = {
+        'sessions': purger.purge_sessions(),
+        'cart_items': purger.purge_cart_items(),
+        'wishlist_items': purger.purge_inactive_wishlists() if inactive_wishlists else 0,
+    }
+    logger.info(
+        '[Purge] %s sessions, %s cart items, %s wishlist items%s',
+        counts['sessions'], counts['cart_items'], counts['wishlist_items'], ' (dry run)' if dry_run else '',
+    )
+    return counts
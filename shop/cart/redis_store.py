@@ -0,0 +1,162 @@
+from django.conf import settings
+from shop.cart.cart_store import CartStore, ANONYMOUS_CART_KEY, make_line, merge_quantities, current_prices
+import threading
+
+PRICE_PREFIX = 'price:'
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide redis-py client of settings.CART_REDIS_URL (REDIS_URL by default)"""
+    global _client
+    with _client_lock:
+        if _client is None:
+            import redis
+            url = getattr(settings, 'CART_REDIS_URL', None) or settings.REDIS_URL
+            _client = redis.Redis.from_url(url, decode_responses=True)
+        return _client
+
+
+class RedisCartStore(CartStore):
+    """One Redis hash per cart: product id -> quantity, plus 'price:<product id>'
+
+    Quantities go up with HINCRBY, so concurrent requests never lose an
+    update. Going down reads the line under WATCH and decrements or removes
+    it in MULTI, retried when another request changed the cart meanwhile.
+    The hash expires SESSION_COOKIE_AGE after its last change.
+    """
+
+    name = 'redis'
+
+    def __init__(self, request, client=None):
+        super().__init__(request)
+        self.client = client or get_client()
+
+    @property
+    def volatile(self):
+        # the cart of a user follows them from device to device
+        return self.user is not None
+
+    def items(self):
+        key = self.key()
+        if key is None:
+            return {}
+        return self._read(key)
+
+    def add(self, product_id, quantity, price=None):
+        product_id = str(product_id)
+        key = self.key(create=quantity > 0)
+        if key is None:
+            return
+        if quantity < 0:
+            self._substract(key, product_id, -quantity)
+            return
+        pipeline = self.client.pipeline()
+        if price is not None:
+            pipeline.hset(key, PRICE_PREFIX + product_id, str(price))
+        pipeline.hincrby(key, product_id, quantity)
+        pipeline.expire(key, settings.SESSION_COOKIE_AGE)
+        pipeline.execute()
+
+    def _substract(self, key, product_id, quantity):
+        from redis.exceptions import WatchError
+        with self.client.pipeline() as pipeline:
+            while True:
+                try:
+                    pipeline.watch(key)
+                    current = pipeline.hget(key, product_id)
+                    if current is None:
+                        pipeline.unwatch()
+                        return
+                    pipeline.multi()
+                    if int(current) <= quantity:
+                        pipeline.hdel(key, product_id, PRICE_PREFIX + product_id)
+                    else:
+                        pipeline.hincrby(key, product_id, -quantity)
+                        pipeline.expire(key, settings.SESSION_COOKIE_AGE)
+                    pipeline.execute()
+                    return
+                except WatchError:
+                    # the cart changed between the read and the write
+                    continue
+
+    def set(self, product_id, quantity, price, version=None):
+        product_id = str(product_id)
+        if quantity <= 0:
+            self.remove(product_id)
+            return True
+        key = self.key(create=True)
+        pipeline = self.client.pipeline()
+        pipeline.hset(key, mapping={product_id: quantity, PRICE_PREFIX + product_id: str(price)})
+        pipeline.expire(key, settings.SESSION_COOKIE_AGE)
+        pipeline.execute()
+        return True
+
+    def set_many(self, lines, versions=None):
+        # one round trip for the whole batch, last write wins like HINCRBY
+        key = self.key(create=True)
+        pipeline = self.client.pipeline()
+        removed = [str(product_id) for product_id, (quantity, _) in lines.items() if quantity <= 0]
+        if removed:
+            pipeline.hdel(key, *removed, *(PRICE_PREFIX + product_id for product_id in removed))
+        fields = {}
+        for product_id, (quantity, price) in lines.items():
+            if quantity > 0:
+                fields[str(product_id)] = quantity
+                fields[PRICE_PREFIX + str(product_id)] = str(price)
+        if fields:
+            pipeline.hset(key, mapping=fields)
+        pipeline.expire(key, settings.SESSION_COOKIE_AGE)
+        pipeline.execute()
+        return []
+
+    def remove(self, product_id):
+        product_id = str(product_id)
+        key = self.key()
+        if key is not None:
+            self.client.hdel(key, product_id, PRICE_PREFIX + product_id)
+
+    def clear(self):
+        key = self.key()
+        if key is not None:
+            self.client.delete(key)
+
+    def merge_anonymous(self, policy='sum'):
+        """Write the merged lines, repriced, and drop the anonymous hash in one pipeline"""
+        anonymous_key = self.request.session.pop(ANONYMOUS_CART_KEY, None)
+        if anonymous_key is None:
+            return
+        source = f"cart:session:{anonymous_key}"
+        anonymous = {product_id: line["quantity"] for product_id, line in self._read(source).items()}
+        if not anonymous:
+            return
+        key = self.key()
+        saved = {product_id: line["quantity"] for product_id, line in self._read(key).items()}
+        merged = merge_quantities(saved, anonymous, policy)
+        prices = current_prices(set(saved) | set(merged))
+
+        # lines of deleted products are dropped
+        fields = {product_id: quantity for product_id, quantity in merged.items() if product_id in prices}
+        fields.update({PRICE_PREFIX + product_id: str(price) for product_id, price in prices.items()})
+        pipeline = self.client.pipeline()
+        if fields:
+            pipeline.hset(key, mapping=fields)
+        pipeline.delete(source)
+        pipeline.expire(key, settings.SESSION_COOKIE_AGE)
+        pipeline.execute()
+
+    def key(self, create=False):
+        if self.user is not None:
+            return f"cart:user:{self.user.pk}"
+        anonymous_key = self.anonymous_key(create=create)
+        return None if anonymous_key is None else f"cart:session:{anonymous_key}"
+
+    def _read(self, key):
+        fields = self.client.hgetall(key)
+        return {
+            product_id: make_line(product_id, int(quantity), fields.get(PRICE_PREFIX + product_id, '0'))
+            for product_id, quantity in fields.items()
+            if not product_id.startswith(PRICE_PREFIX)
+        }
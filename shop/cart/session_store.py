@@ -0,0 +1,112 @@
+from shop.cart.cart_store import CartStore, make_line, current_prices
+from decimal import Decimal
+
+
+def encode_cart(items):
+    """Compact session form of the cart: {product_id: [quantity, price in cents]}
+
+    Args:
+        items (dict): product_id -> {'product_id', 'quantity', 'price'}
+
+    Returns:
+        dict: the JSON-serializable session value
+    """
+    return {
+        product_id: [item["quantity"], int(Decimal(item["price"]) * 100)]
+        for product_id, item in items.items()
+    }
+
+
+def decode_cart(stored):
+    """Read a session cart in the compact form, or in the former
+    {product_id: {'product_id', 'name', 'price', 'quantity'}} form
+
+    Returns:
+        dict: product_id -> {'product_id', 'quantity', 'price'}
+    """
+    items = {}
+    for product_id, value in (stored or {}).items():
+        if isinstance(value, dict):
+            quantity, price = value["quantity"], str(value["price"])
+        else:
+            quantity, cents = value
+            price = str(Decimal(cents).scaleb(-2))
+        items[product_id] = make_line(product_id, quantity, price)
+    return items
+
+
+class SessionCartStore(CartStore):
+    """The cart lives in the session only, in the compact form of encode_cart()"""
+
+    name = 'session'
+
+    def __init__(self, request):
+        super().__init__(request)
+        self._items = None
+
+    def items(self):
+        if self._items is None:
+            self._items = decode_cart(self.request.session.get("cart"))
+        # copies: the Cart changes its lines in place
+        return {product_id: dict(line) for product_id, line in self._items.items()}
+
+    def add(self, product_id, quantity, price=None):
+        product_id = str(product_id)
+        items = self.items()
+        line = items.get(product_id)
+        if line is None:
+            if quantity <= 0:
+                return
+            line = items[product_id] = make_line(product_id, 0, price)
+        line["quantity"] += quantity
+        if line["quantity"] <= 0:
+            del items[product_id]
+        self._write(items)
+
+    def set(self, product_id, quantity, price, version=None):
+        product_id = str(product_id)
+        items = self.items()
+        if quantity <= 0:
+            items.pop(product_id, None)
+        else:
+            items[product_id] = make_line(product_id, quantity, price)
+        self._write(items)
+        return True
+
+    def set_many(self, lines, versions=None):
+        # one session write for the whole batch, the session has no line versions
+        items = self.items()
+        for product_id, (quantity, price) in lines.items():
+            product_id = str(product_id)
+            if quantity <= 0:
+                items.pop(product_id, None)
+            else:
+                items[product_id] = make_line(product_id, quantity, price)
+        self._write(items)
+        return []
+
+    def remove(self, product_id):
+        items = self.items()
+        items.pop(str(product_id), None)
+        self._write(items)
+
+    def clear(self):
+        self._write({})
+
+    def merge_anonymous(self, policy='sum'):
+        """Login keeps the session data, so the anonymous cart already is the
+        cart of the user: it is only repriced
+        """
+        items = self.items()
+        if not items:
+            return
+        prices = current_prices(items)
+        self._write({
+            product_id: make_line(product_id, line["quantity"], prices[product_id])
+            for product_id, line in items.items()
+            if product_id in prices
+        })
+
+    def _write(self, items):
+        self._items = items
+        self.request.session["cart"] = encode_cart(items)
@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models import F, Max, Min, Value, DecimalField, ExpressionWrapper
+from django.db.models.functions import Round
+from biscuitshop.routers import pin_to_primary
+from shop.models import Product
+from shop.catalog.invalidation import invalidation_bus
+from decimal import Decimal, ROUND_HALF_UP
+import logging
+
+logger = logging.getLogger(__name__)
+
+PRICE_FIELD = Product._meta.get_field('price')
+MAX_PRICE = Decimal(10) ** (PRICE_FIELD.max_digits - PRICE_FIELD.decimal_places) - Decimal(1).scaleb(-PRICE_FIELD.decimal_places) #type: ignore
+
+
+def adjust_prices(queryset, percent=0, amount=0):
+    """Reprice every product of the queryset with a single UPDATE
+
+    new price = round(price * (1 + percent / 100) + amount, 2), rounding half
+    up. The whole operation is refused when a new price would be negative or
+    would not fit the price column.
+
+    Args:
+        queryset (QuerySet): products to reprice, e.g. Product.objects.filter(category=category)
+        percent (Decimal, optional): relative change, 10 for +10%, -5 for -5%
+        amount (Decimal, optional): fixed amount added after the percentage
+
+    Returns:
+        int: number of repriced products
+    """
+    factor = (1 + Decimal(str(percent)) / 100).quantize(Decimal('0.000001'), rounding=ROUND_HALF_UP)
+    amount = Decimal(str(amount)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    new_price = Round(
+        ExpressionWrapper(F('price') * Value(factor) + Value(amount), output_field=_price_output()),
+        PRICE_FIELD.decimal_places,
+    )
+
+    # the bounds check and the ids read for the invalidation are the only extra
+    # queries, both read the rows about to be updated on the primary
+    pin_to_primary()
+    with transaction.atomic():
+        bounds = queryset.aggregate(low=Min(new_price), high=Max(new_price))
+        if bounds['low'] is not None and (bounds['low'] < 0 or bounds['high'] > MAX_PRICE):
+            raise ValueError(f"New prices would range from {bounds['low']} to {bounds['high']}, outside 0 - {MAX_PRICE}")
+        product_ids = list(queryset.values_list('pk', flat=True))
+        updated = queryset.update(price=new_price)
+        _publish(product_ids)
+
+    logger.info('[Catalog] %s prices adjusted by %s%% %+.2f', updated, percent, amount)
+    return updated
+
+
+def set_stock(queryset, stock):
+    """Set the stock of every product of the queryset with a single UPDATE
+
+    Returns:
+        int: number of updated products
+    """
+    if stock < 0:
+        raise ValueError("Stock cannot be negative")
+    pin_to_primary()
+    with transaction.atomic():
+        product_ids = list(queryset.values_list('pk', flat=True))
+        updated = queryset.update(stock=stock)
+        _publish(product_ids)
+
+    logger.info('[Catalog] Stock of %s products set to %s', updated, stock)
+    return updated
+
+
+def _price_output():
+    return DecimalField(max_digits=PRICE_FIELD.max_digits + 6, decimal_places=PRICE_FIELD.decimal_places + 6) #type: ignore
+
+
+def _publish(product_ids):
+    # one event for the whole operation, sent once the update is committed
+    if product_ids:
+        transaction.on_commit(lambda: invalidation_bus.publish('product', product_ids))
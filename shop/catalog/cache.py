@@ -0,0 +1,305 @@
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.conf import settings
+from django.db import DatabaseError
+from collections import OrderedDict
+import threading
+import uuid
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+# Deletes the recompute lock only if it still holds the token of the caller
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LocalLRUCache:
+    """Size-bounded, thread-safe in-process LRU cache with per-entry TTL"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()     # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredCache:
+    """Two-tier cache for catalog reads
+
+    Tier one is a LocalLRUCache living in the worker process, tier two is the
+    shared Django cache configured under settings.CATALOG_CACHE['ALIAS']
+    (Redis in production). Keys are namespaced ('products', 'categories',
+    'fragments'...) and carry the namespace version: bumping the version makes
+    every node miss the old entries without having to find and delete them.
+    The version itself is only re-read from the shared tier every
+    VERSION_CHECK_INTERVAL seconds, so a hot key costs no network hop.
+    """
+
+    def __init__(self, alias=None, local_max_entries=None, local_timeout=None,
+                 timeout=None, version_check_interval=None):
+        config = getattr(settings, 'CATALOG_CACHE', {})
+        self.alias = alias or config.get('ALIAS', 'default')
+        self.local_timeout = local_timeout if local_timeout is not None else config.get('LOCAL_TIMEOUT', 30)
+        self.timeout = timeout if timeout is not None else config.get('TIMEOUT', 300)
+        self.version_check_interval = (
+            version_check_interval if version_check_interval is not None
+            else config.get('VERSION_CHECK_INTERVAL', 5)
+        )
+        self.soft_timeout = config.get('SOFT_TIMEOUT', 60)
+        self.hard_timeout = config.get('HARD_TIMEOUT', 3600)
+        self.lock_timeout = config.get('LOCK_TIMEOUT', 30)
+        self.wait_timeout = config.get('WAIT_TIMEOUT', 2)
+        self.local = LocalLRUCache(local_max_entries or config.get('LOCAL_MAX_ENTRIES', 1000))
+        self._versions = {}     # namespace -> (checked_at, version)
+        self._stats_lock = threading.Lock()
+        self.reset_stats()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def get(self, namespace, key, default=None):
+        """Read a value, from the local tier first and then from the shared tier"""
+        full_key = self.make_key(namespace, key)
+
+        value = self.local.get(full_key, _MISSING)
+        if value is not _MISSING:
+            self._count('local_hits')
+            return value
+
+        value = self.shared.get(full_key, _MISSING)
+        if value is not _MISSING:
+            self._count('shared_hits')
+            self.local.set(full_key, value, self.local_timeout)
+            return value
+
+        self._count('misses')
+        return default
+
+    def set(self, namespace, key, value, timeout=None):
+        """Write a value to both tiers"""
+        timeout = self.timeout if timeout is None else timeout
+        full_key = self.make_key(namespace, key)
+        self.shared.set(full_key, value, timeout)
+        self.local.set(full_key, value, min(timeout, self.local_timeout))
+        self._count('sets')
+
+    def get_or_set(self, namespace, key, compute, timeout=None):
+        """Return the cached value or compute, store and return it"""
+        value = self.get(namespace, key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(namespace, key, value, timeout)
+        return value
+
+    def get_or_compute(self, namespace, key, compute, soft_timeout=None, hard_timeout=None):
+        """Stale-while-revalidate read with request coalescing
+
+        The value is fresh for soft_timeout seconds and kept for hard_timeout
+        seconds. Once it is stale, exactly one caller (the one winning the
+        recompute lock in the shared tier) recomputes it while the others keep
+        getting the stale value. If the recompute fails, for instance because
+        the database is down, the stale value is served until the hard
+        timeout. On a cold miss the callers losing the lock wait a little for
+        the winner before computing it themselves.
+
+        Args:
+            namespace (str): key namespace, e.g. 'products'
+            key (str): key inside the namespace
+            compute (callable): builds the value on a miss
+            soft_timeout (int, optional): seconds before the value goes stale
+            hard_timeout (int, optional): seconds before the value is dropped
+
+        Returns:
+            the cached or freshly computed value
+        """
+        soft_timeout = self.soft_timeout if soft_timeout is None else soft_timeout
+        hard_timeout = self.hard_timeout if hard_timeout is None else hard_timeout
+
+        envelope = self.get(namespace, key)
+        if envelope is not None:
+            fresh_until, value = envelope
+            if time.time() < fresh_until:
+                return value
+            token = self._acquire_recompute_lock(namespace, key)
+            if token is None:
+                self._count('stale_hits')
+                return value
+            try:
+                value = compute()
+            except DatabaseError as e:
+                logger.warning('[Cache] Serving stale %s:%s, recompute failed: %s', namespace, key, e)
+                self._count('stale_hits')
+                return value
+            finally:
+                self._release_recompute_lock(namespace, key, token)
+            self._store_envelope(namespace, key, value, soft_timeout, hard_timeout)
+            return value
+
+        token = self._acquire_recompute_lock(namespace, key)
+        if token is None:
+            envelope = self._wait_for_value(namespace, key)
+            if envelope is not None:
+                return envelope[1]
+        try:
+            value = compute()
+        finally:
+            # after a wait that timed out, the lock still belongs to the other worker
+            if token is not None:
+                self._release_recompute_lock(namespace, key, token)
+        self._store_envelope(namespace, key, value, soft_timeout, hard_timeout)
+        return value
+
+    def delete(self, namespace, key):
+        full_key = self.make_key(namespace, key)
+        self.shared.delete(full_key)
+        self.local.delete(full_key)
+
+    def make_key(self, namespace, key):
+        return f"catalog:{namespace}:v{self.get_version(namespace)}:{key}"
+
+    def get_version(self, namespace):
+        """Return the namespace version, re-read from the shared tier at most
+        once every version_check_interval seconds.
+        """
+        now = time.monotonic()
+        cached = self._versions.get(namespace)
+        if cached is not None and now - cached[0] < self.version_check_interval:
+            return cached[1]
+
+        version_key = self._version_key(namespace)
+        version = self.shared.get(version_key)
+        if version is None:
+            self.shared.add(version_key, 1, None)
+            version = self.shared.get(version_key, 1)
+        self._versions[namespace] = (now, version)
+        return version
+
+    def bump_version(self, namespace):
+        """Invalidate every entry of the namespace, on this node and the others"""
+        version_key = self._version_key(namespace)
+        try:
+            version = self.shared.incr(version_key)
+        except ValueError:
+            self.shared.add(version_key, 1, None)
+            version = self.shared.incr(version_key)
+        self.forget_version(namespace)
+        self._versions[namespace] = (time.monotonic(), version)
+        logger.debug('[Cache] %s namespace moved to version %s', namespace, version)
+        return version
+
+    def forget_version(self, namespace):
+        """Drop the locally known version and local entries of the namespace"""
+        self._versions.pop(namespace, None)
+        self.local.delete_prefix(f"catalog:{namespace}:")
+
+    def clear_local(self):
+        self._versions.clear()
+        self.local.clear()
+
+    def stats(self):
+        """Return the hit/miss counters of the cache"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        reads = stats['local_hits'] + stats['shared_hits'] + stats['misses']
+        stats['local_entries'] = len(self.local)
+        stats['hit_ratio'] = (stats['local_hits'] + stats['shared_hits']) / reads if reads else 0.0
+        return stats
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0, 'sets': 0, 'stale_hits': 0, 'coalesced': 0}
+
+    def _count(self, counter):
+        with self._stats_lock:
+            self._stats[counter] += 1
+
+    def _store_envelope(self, namespace, key, value, soft_timeout, hard_timeout):
+        self.set(namespace, key, (time.time() + soft_timeout, value), hard_timeout)
+
+    def _lock_key(self, namespace, key):
+        # not versioned: a compute started before a version bump still holds the
+        # lock of the key, the callers after the bump wait for it too
+        return f"catalog:{namespace}:lock:{key}"
+
+    def _acquire_recompute_lock(self, namespace, key):
+        """Return the token of the lock, None when someone else holds it"""
+        token = uuid.uuid4().hex
+        # add() is atomic in LocMem and maps to SET NX in Redis
+        if self.shared.add(self._lock_key(namespace, key), token, self.lock_timeout):
+            return token
+        return None
+
+    def _release_recompute_lock(self, namespace, key, token):
+        # a lock that expired during a slow compute may belong to another worker by now
+        lock_key = self._lock_key(namespace, key)
+        shared = self.shared
+        if isinstance(shared, RedisCache):
+            # compare and delete in one step on the server
+            redis_key = shared.make_and_validate_key(lock_key)
+            client = shared._cache.get_client(redis_key, write=True)
+            client.eval(RELEASE_LOCK_SCRIPT, 1, redis_key, shared._cache._serializer.dumps(token))
+        elif shared.get(lock_key) == token:
+            # the other backends are local to the process
+            shared.delete(lock_key)
+
+    def _wait_for_value(self, namespace, key):
+        """Wait for the caller holding the recompute lock to store the value"""
+        deadline = time.monotonic() + self.wait_timeout
+        full_key = self.make_key(namespace, key)
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            envelope = self.shared.get(full_key)
+            if envelope is not None:
+                self._count('coalesced')
+                self.local.set(full_key, envelope, self.local_timeout)
+                return envelope
+        return None
+
+    def _version_key(self, namespace):
+        return f"catalog:{namespace}:version"
+
+
+catalog_cache = TieredCache()
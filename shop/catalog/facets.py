@@ -0,0 +1,168 @@
+from django.conf import settings
+from decimal import Decimal
+from shop.models import Product
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+AVAILABILITY_LABELS = {
+    'in_stock': 'In stock',
+    'out_of_stock': 'Out of stock',
+}
+
+
+class FacetSelection:
+    """Result of a facet query: the matching products and the live facet counts"""
+
+    def __init__(self, bits, counts):
+        self.bits = bits
+        self.counts = counts
+
+    def __len__(self):
+        return self.bits.bit_count()
+
+    def ids(self):
+        """Return the matching product ids, newest first (the Product ordering)"""
+        binary = bin(self.bits)[2:]
+        top = len(binary) - 1
+        return [top - position for position, bit in enumerate(binary) if bit == '1']
+
+
+class FacetIndex:
+    """In-memory facet index over the catalog
+
+    Each facet value owns a bitset stored as a Python int where bit n is set
+    when the product with id n has that value. Combined filters and facet
+    counts are then a handful of AND/OR operations and popcounts instead of
+    one COUNT query per facet value. The index is built lazily with a single
+    query and patched product by product from the catalog change events.
+    """
+
+    facets = ('category', 'price', 'availability')
+
+    def __init__(self, price_bands=None):
+        self._price_bands = price_bands
+        self._values = {facet: {} for facet in self.facets}    # facet -> {value: bitset}
+        self._products = {}                                     # product_id -> {facet: value}
+        self._all = 0
+        self._lock = threading.RLock()
+        self._built = False
+
+    @property
+    def price_bands(self):
+        if self._price_bands is None:
+            return getattr(settings, 'CATALOG_PRICE_BANDS', ())
+        return self._price_bands
+
+    def price_band(self, price):
+        """Return the key of the price band containing the price"""
+        price = Decimal(price)
+        for key, _, low, high in self.price_bands:
+            if (low is None or price >= low) and (high is None or price < high):
+                return key
+        return None
+
+    def rebuild(self):
+        with self._lock:
+            self._values = {facet: {} for facet in self.facets}
+            self._products = {}
+            self._all = 0
+            rows = Product.objects.order_by().values_list('id', 'category_id', 'price', 'stock')
+            for product_id, category_id, price, stock in rows.iterator(chunk_size=5000):
+                self._add(product_id, category_id, price, stock)
+            self._built = True
+        logger.info('[Facets] Facet index rebuilt with %s products', len(self._products))
+
+    def refresh_products(self, product_ids):
+        """Reload the facet values of the given products from the database,
+        dropping the ones that no longer exist.
+        """
+        with self._lock:
+            if not self._built:
+                return
+            rows = Product.objects.filter(id__in=product_ids).values_list('id', 'category_id', 'price', 'stock')
+            found = set()
+            for product_id, category_id, price, stock in rows:
+                self._remove(product_id)
+                self._add(product_id, category_id, price, stock)
+                found.add(product_id)
+            for product_id in set(product_ids) - found:
+                self._remove(product_id)
+
+    def invalidate(self):
+        """Drop the index, it will be rebuilt on the next query"""
+        with self._lock:
+            self._built = False
+
+    def query(self, filters=None):
+        """Apply the filters and compute the counts of every facet value
+
+        Values of the same facet are OR-ed, facets are AND-ed together. The
+        counts of a facet ignore the selection made on that same facet, so the
+        customer sees how many products each alternative would give.
+
+        Args:
+            filters (dict, optional): facet name -> iterable of selected values
+
+        Returns:
+            FacetSelection: matching bitset and {facet: {value: count}}
+        """
+        filters = {facet: set(values) for facet, values in (filters or {}).items() if values}
+        with self._lock:
+            if not self._built:
+                self.rebuild()
+
+            masks = {facet: self._mask(facet, values) for facet, values in filters.items()}
+            bits = self._all
+            for mask in masks.values():
+                bits &= mask
+
+            counts = {}
+            for facet in self.facets:
+                others = self._all
+                for other, mask in masks.items():
+                    if other != facet:
+                        others &= mask
+                counts[facet] = {
+                    value: (value_bits & others).bit_count()
+                    for value, value_bits in self._values[facet].items()
+                }
+        return FacetSelection(bits, counts)
+
+    def _mask(self, facet, values):
+        mask = 0
+        for value in values:
+            mask |= self._values[facet].get(value, 0)
+        return mask
+
+    def _add(self, product_id, category_id, price, stock):
+        values = {
+            'category': category_id,
+            'price': self.price_band(price),
+            'availability': 'in_stock' if stock > 0 else 'out_of_stock',
+        }
+        bit = 1 << product_id
+        for facet, value in values.items():
+            if value is not None:
+                self._values[facet][value] = self._values[facet].get(value, 0) | bit
+        self._products[product_id] = values
+        self._all |= bit
+
+    def _remove(self, product_id):
+        values = self._products.pop(product_id, None)
+        if values is None:
+            return
+        bit = 1 << product_id
+        for facet, value in values.items():
+            if value is None:
+                continue
+            remaining = self._values[facet].get(value, 0) & ~bit
+            if remaining:
+                self._values[facet][value] = remaining
+            else:
+                self._values[facet].pop(value, None)
+        self._all &= ~bit
+
+
+facet_index = FacetIndex()
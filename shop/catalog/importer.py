@@ -0,0 +1,206 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from shop.models import Category, Product
+from shop.search import search
+from shop.catalog.invalidation import invalidation_bus
+from itertools import islice
+import json
+import csv
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Columns of an import row, the product sku is the upsert key
+IMPORT_FIELDS = ('sku', 'name', 'description', 'price', 'stock', 'category')
+UPDATE_FIELDS = ['name', 'description', 'price', 'stock', 'category']
+
+
+def read_rows(stream, file_format):
+    """Yield one dict per input row, without reading the whole input in memory
+
+    A JSON line that cannot be decoded is yielded as a ValidationError, so the
+    import reports it with its line number and goes on with the next lines.
+
+    Args:
+        stream (file): text stream of the input
+        file_format (str): 'csv' or 'jsonl'
+    """
+    if file_format == 'csv':
+        yield from csv.DictReader(stream)
+    elif file_format == 'jsonl':
+        for line in stream:
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                yield ValidationError(f"invalid JSON: {e.msg} (column {e.colno}).")
+    else:
+        raise ValueError(f"Unknown import format: {file_format}")
+
+
+class ImportReport:
+    """Counts and messages of one import run"""
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.unchanged = 0
+        self.duplicates = 0         # rows replaced by a later row of the same sku
+        self.errors = []            # (line number, message)
+        self.changes = []           # dry-run diff lines
+        self.new_categories = set()
+        self.product_ids = []
+
+    @property
+    def total(self):
+        return self.created + self.updated + self.unchanged + self.duplicates + len(self.errors)
+
+
+class CatalogImporter:
+    """Upsert products from supplier rows, keyed on the product sku
+
+    Rows are validated against the Product field rules one chunk at a time,
+    their categories are resolved through a name -> id map loaded once, and
+    each chunk is written with a single bulk_create(update_conflicts=True).
+    Rows identical to the stored product are skipped. The catalog caches of
+    every node are invalidated once, after the last chunk, or after the
+    chunks already written when a later one fails.
+    """
+
+    def __init__(self, chunk_size=1000, dry_run=False, create_categories=True):
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.create_categories = create_categories
+        self.report = ImportReport()
+        self._categories = None     # lowercased name -> Category id
+
+    def run(self, rows):
+        """Import every row and return the ImportReport"""
+        self._load_categories()
+        numbered = enumerate(rows, start=1)
+        try:
+            while True:
+                chunk = list(islice(numbered, self.chunk_size))
+                if not chunk:
+                    break
+                self._import_chunk(chunk)
+        finally:
+            # the chunks written before a failure are committed
+            if self.report.product_ids and not self.dry_run:
+                invalidation_bus.publish('product', self.report.product_ids)
+        logger.info(
+            '[Import] %s created, %s updated, %s unchanged, %s duplicates, %s errors%s',
+            self.report.created, self.report.updated, self.report.unchanged,
+            self.report.duplicates, len(self.report.errors), ' (dry run)' if self.dry_run else '',
+        )
+        return self.report
+
+    def _load_categories(self):
+        self._categories = {}
+        for category_id, name in Category.objects.values_list('id', 'name').order_by('-id'):
+            self._categories[name.strip().lower()] = category_id
+
+    def _import_chunk(self, chunk):
+        valid = {}
+        for line, row in chunk:
+            try:
+                values = self._clean(row)
+                category_id = self._resolve_category(values.pop('category'))
+            except ValidationError as e:
+                self.report.errors.append((line, '; '.join(e.messages)))
+                continue
+            # the last occurrence of a sku wins, as it would with one save per row
+            if values['sku'] in valid:
+                self.report.duplicates += 1
+            valid[values['sku']] = (values, category_id)
+
+        existing = Product.objects.filter(sku__in=list(valid)).in_bulk(field_name='sku')
+        to_write = []
+        for sku, (values, category_id) in valid.items():
+            product = existing.get(sku)
+            if product is None:
+                self.report.created += 1
+                self._diff('+', sku, values)
+            else:
+                changed = self._changed_fields(product, values, category_id)
+                if not changed:
+                    self.report.unchanged += 1
+                    continue
+                self.report.updated += 1
+                self._diff('~', sku, changed)
+            to_write.append(Product(category_id=category_id, **values))
+
+        if self.dry_run or not to_write:
+            return
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                to_write,
+                update_conflicts=True,
+                unique_fields=['sku'],
+                update_fields=UPDATE_FIELDS,
+            )
+        written = list(Product.objects.filter(sku__in=[product.sku for product in to_write]))
+        search.index_products(written)
+        self.report.product_ids.extend(product.pk for product in written)
+
+    def _clean(self, row):
+        """Validate one row with the rules of the Product fields"""
+        if isinstance(row, ValidationError):
+            raise row
+        if not isinstance(row, dict):
+            raise ValidationError(f"expected an object, got {type(row).__name__}.")
+        values = {}
+        errors = []
+        for name in IMPORT_FIELDS:
+            raw = row.get(name)
+            if isinstance(raw, str):
+                raw = raw.strip()
+            if name == 'category':
+                if not raw:
+                    errors.append("category: this field cannot be blank.")
+                values[name] = raw
+                continue
+            field = Product._meta.get_field(name)
+            try:
+                values[name] = field.clean(raw, None)
+            except ValidationError as e:
+                errors.extend(f"{name}: {message}" for message in e.messages)
+        if not values.get('sku') and not any(error.startswith('sku') for error in errors):
+            errors.append("sku: this field cannot be blank.")
+        if errors:
+            raise ValidationError(errors)
+        return values
+
+    def _resolve_category(self, name):
+        key = name.lower()
+        category_id = self._categories.get(key)
+        if category_id is not None:
+            return category_id
+        if not self.create_categories:
+            raise ValidationError(f"category: unknown category {name}.")
+        self.report.new_categories.add(name)
+        if self.dry_run:
+            return None
+        category = Category.objects.create(name=name)
+        self._categories[key] = category.pk
+        return category.pk
+
+    def _changed_fields(self, product, values, category_id):
+        changed = {
+            name: (getattr(product, name), value)
+            for name, value in values.items()
+            if name != 'sku' and getattr(product, name) != value
+        }
+        if product.category_id != category_id:     #type: ignore
+            changed['category'] = (product.category_id, category_id)     #type: ignore
+        return changed
+
+    def _diff(self, marker, sku, values):
+        if not self.dry_run:
+            return
+        if marker == '+':
+            self.report.changes.append(f"+ {sku}: {values['name']} ({values['price']})")
+        else:
+            details = ', '.join(f"{name} {old} -> {new}" for name, (old, new) in values.items())
+            self.report.changes.append(f"~ {sku}: {details}")
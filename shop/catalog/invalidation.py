@@ -0,0 +1,169 @@
+from django.conf import settings
+from django.utils import timezone
+from datetime import timedelta
+import threading
+import time
+import uuid
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Identifies this worker process, so that a node skips the events it published itself
+NODE_ID = uuid.uuid4().hex
+
+
+class InvalidationBus:
+    """Broadcasts catalog change events to every app node
+
+    publish() runs the subscribed handlers right away on the publishing node
+    (local=True) and sends the event to the other nodes, which run the same
+    handlers (local=False) the next time they poll(). The handlers decide what
+    to evict or refresh from the event: {'model': ..., 'ids': [...]}.
+    """
+
+    def __init__(self, poll_interval=1.0):
+        self.poll_interval = poll_interval
+        self._handlers = []
+        self._last_poll = 0.0
+        self._poll_lock = threading.Lock()
+
+    def subscribe(self, handler):
+        """Register handler(event, local) to be called for every event"""
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+
+    def publish(self, model, ids=None):
+        """Apply the change on this node then broadcast it to the others
+
+        Args:
+            model (str): 'product', 'category' or '*' for a full reset
+            ids (list, optional): primary keys of the changed objects
+        """
+        event = {'model': model, 'ids': list(ids or []), 'origin': NODE_ID}
+        self._dispatch(event, local=True)
+        try:
+            self._send(event)
+        except Exception as e:
+            logger.error('[Invalidation] Error publishing %s change: %s', model, e)
+
+    def poll(self):
+        """Apply the events published by the other nodes since the last poll"""
+        try:
+            events = self._receive()
+        except Exception as e:
+            # events may have been lost: drop everything that could be stale
+            logger.error('[Invalidation] Error receiving catalog changes: %s', e)
+            events = [{'model': '*', 'ids': [], 'origin': None}]
+        for event in events:
+            if event.get('origin') != NODE_ID:
+                self._dispatch(event, local=False)
+        return len(events)
+
+    def poll_if_due(self):
+        """Poll at most once per poll_interval, which bounds the staleness of a node"""
+        now = time.monotonic()
+        if now - self._last_poll < self.poll_interval:
+            return
+        if not self._poll_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_poll = now
+            self.poll()
+        finally:
+            self._poll_lock.release()
+
+    def _dispatch(self, event, local):
+        for handler in self._handlers:
+            try:
+                handler(event, local)
+            except Exception as e:
+                logger.error('[Invalidation] Handler %s failed: %s', getattr(handler, '__name__', handler), e)
+
+    def _send(self, event):
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def _receive(self):
+        raise NotImplementedError("Subclasses must implement this method.")
+
+
+class RedisInvalidationBus(InvalidationBus):
+    """Invalidation bus over Redis pub/sub"""
+
+    def __init__(self, client, channel='biscuitshop:catalog', **kwargs):
+        super().__init__(**kwargs)
+        self.client = client
+        self.channel = channel
+        self._pubsub = None
+
+    def _send(self, event):
+        self.client.publish(self.channel, json.dumps(event))
+
+    def _receive(self):
+        if self._pubsub is None:
+            self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(self.channel)
+
+        events = []
+        try:
+            while True:
+                message = self._pubsub.get_message(timeout=0)
+                if message is None:
+                    break
+                if message.get('type') == 'message':
+                    events.append(json.loads(message['data']))
+        except Exception:
+            # resubscribe on the next poll
+            self._pubsub = None
+            raise
+        return events
+
+
+class PolledInvalidationBus(InvalidationBus):
+    """Invalidation bus over the CatalogChange table, for deployments without Redis"""
+
+    def __init__(self, retention=timedelta(hours=1), **kwargs):
+        super().__init__(**kwargs)
+        self.retention = retention
+        self._last_seen = None
+
+    def _send(self, event):
+        from shop.models import CatalogChange
+        change = CatalogChange.objects.create(model=event['model'], object_ids=event['ids'], origin=event['origin'])
+        if change.pk % 100 == 0:
+            CatalogChange.objects.filter(created_at__lt=timezone.now() - self.retention).delete()
+
+    def _receive(self):
+        from shop.models import CatalogChange
+        from django.db.models import Max
+
+        if self._last_seen is None:
+            # a new node has nothing cached yet: start from the current position
+            self._last_seen = CatalogChange.objects.aggregate(last=Max('id'))['last'] or 0
+            return []
+
+        changes = list(
+            CatalogChange.objects.filter(id__gt=self._last_seen)
+            .order_by('id')
+            .values_list('id', 'model', 'object_ids', 'origin')
+        )
+        if changes:
+            self._last_seen = changes[-1][0]
+        return [{'model': model, 'ids': ids, 'origin': origin} for _, model, ids, origin in changes]
+
+
+def _create_bus():
+    config = getattr(settings, 'CATALOG_INVALIDATION', {})
+    poll_interval = config.get('POLL_INTERVAL', 1.0)
+    backend = config.get('BACKEND', 'polled')
+
+    if backend == 'redis':
+        import redis
+        client = redis.Redis.from_url(config.get('REDIS_URL') or settings.REDIS_URL)
+        return RedisInvalidationBus(client, poll_interval=poll_interval)
+    if backend == 'polled':
+        return PolledInvalidationBus(poll_interval=poll_interval)
+    raise ValueError(f"Unknown invalidation bus backend: {backend}")
+
+
+invalidation_bus = _create_bus()
@@ -0,0 +1,147 @@
+from django.conf import settings
+from django.db import connection
+from django.http import StreamingHttpResponse
+from pathlib import Path
+import threading
+import time
+import uuid
+import csv
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Echo:
+    """File-like object handing each written CSV line back to the caller"""
+
+    def write(self, value):
+        return value
+
+
+def get_export_config():
+    config = getattr(settings, 'CSV_EXPORT', {})
+    return {
+        'CHUNK_SIZE': config.get('CHUNK_SIZE', 2000),
+        'BACKGROUND_THRESHOLD': config.get('BACKGROUND_THRESHOLD', 50000),
+        'DIR': Path(config.get('DIR', Path(settings.BASE_DIR) / 'exports')),
+        'MAX_AGE': config.get('MAX_AGE', 24 * 3600),
+    }
+
+
+def iter_rows(queryset, chunk_size=None):
+    """Yield the header then one list of values per row of the queryset
+
+    Rows are read as tuples with values_list().iterator(), so no model
+    instance is built, and foreign keys are resolved with one in_bulk()
+    query per related model and per chunk of rows. That query joins the
+    foreign keys of the related model, which its __str__ usually reads.
+
+    Args:
+        queryset (QuerySet): rows to export
+        chunk_size (int, optional): rows fetched from the database at a time
+    """
+    chunk_size = chunk_size or get_export_config()['CHUNK_SIZE']
+    fields = queryset.model._meta.fields
+    yield [field.name for field in fields]
+
+    rows = queryset.prefetch_related(None).values_list(*[field.attname for field in fields]).iterator(chunk_size=chunk_size)
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield from _resolve_chunk(fields, chunk)
+            chunk = []
+    if chunk:
+        yield from _resolve_chunk(fields, chunk)
+
+
+def _resolve_chunk(fields, chunk):
+    related = {}
+    for position, field in enumerate(fields):
+        if field.is_relation and (field.many_to_one or field.one_to_one):
+            ids = {row[position] for row in chunk if row[position] is not None}
+            related[position] = _related_manager(field.related_model).in_bulk(ids) if ids else {}
+
+    for row in chunk:
+        values = list(row)
+        for position, objects in related.items():
+            if values[position] is not None:
+                values[position] = objects.get(values[position], values[position])
+        yield values
+
+
+def _related_manager(model):
+    # Order.__str__ reads its user, OrderItem.__str__ its product and order
+    foreign_keys = [
+        field.name for field in model._meta.fields
+        if field.is_relation and (field.many_to_one or field.one_to_one)
+    ]
+    return model._default_manager.select_related(*foreign_keys)
+
+
+def stream_csv(queryset, filename):
+    """Return a StreamingHttpResponse writing the queryset as CSV"""
+    writer = csv.writer(Echo())
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in iter_rows(queryset)),
+        content_type='text/csv',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_csv(queryset, path):
+    """Write the queryset as CSV to path, through a temporary .part file"""
+    path = Path(path)
+    part_path = path.with_suffix('.part')
+    with open(part_path, 'w', newline='', encoding='utf-8') as output:
+        writer = csv.writer(output)
+        for row in iter_rows(queryset):
+            writer.writerow(row)
+    part_path.replace(path)
+
+
+def export_path(token):
+    """Return the file of a background export, None for a malformed token"""
+    try:
+        token = uuid.UUID(token).hex
+    except ValueError:
+        return None
+    return get_export_config()['DIR'] / f"{token}.csv"
+
+
+def start_background_export(queryset):
+    """Write the queryset to the exports directory in a background thread
+
+    Returns:
+        str: token of the export, to be passed to export_path()
+    """
+    config = get_export_config()
+    config['DIR'].mkdir(parents=True, exist_ok=True)
+    purge_old_exports(config['DIR'], config['MAX_AGE'])
+
+    token = uuid.uuid4().hex
+    path = config['DIR'] / f"{token}.csv"
+    thread = threading.Thread(target=_run_export, args=(queryset, path), daemon=True)
+    thread.start()
+    logger.info('[Export] %s export started in %s', queryset.model.__name__, path)
+    return token
+
+
+def _run_export(queryset, path):
+    try:
+        write_csv(queryset, path)
+        logger.info('[Export] %s written', path)
+    except Exception as e:
+        logger.error('[Export] %s failed: %s', path, e)
+        path.with_suffix('.part').unlink(missing_ok=True)
+        path.with_suffix('.failed').touch()
+    finally:
+        connection.close()
+
+
+def purge_old_exports(directory, max_age):
+    limit = time.time() - max_age
+    for path in Path(directory).glob('*.*'):
+        if path.stat().st_mtime < limit:
+            path.unlink(missing_ok=True)
@@ -0,0 +1,126 @@
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.exceptions import ImproperlyConfigured
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageOps
+from shop.images.placeholders import make_placeholder
+from pathlib import Path
+import threading
+import hashlib
+import io
+import logging
+
+logger = logging.getLogger(__name__)
+
+# name -> square width in pixels of the derivatives built for every product image
+DEFAULT_VARIANTS = {'thumbnail': 300, 'medium': 600, 'large': 1200}
+FORMATS = {'webp': 'WEBP', 'jpeg': 'JPEG'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_config():
+    config = getattr(settings, 'IMAGE_DERIVATIVES', {})
+    return {
+        'VARIANTS': config.get('VARIANTS', DEFAULT_VARIANTS),
+        'WORKERS': config.get('WORKERS', 2),
+        'QUALITY': config.get('QUALITY', 80),
+    }
+
+
+def get_storage():
+    """Storage the derivatives are written to: STORAGES['derivatives'] or MEDIA_ROOT/derivatives"""
+    try:
+        return storages['derivatives']
+    except (KeyError, ImproperlyConfigured):
+        return FileSystemStorage(
+            location=Path(settings.MEDIA_ROOT) / 'derivatives',
+            base_url=f"{settings.MEDIA_URL.rstrip('/')}/derivatives/",
+        )
+
+
+def render_variant(source, width, image_format, quality=80):
+    """Resize the source image to a width x width square, cropped around its center
+
+    Runs in the worker processes, so it only takes and returns bytes.
+
+    Returns:
+        bytes: encoded variant
+    """
+    with Image.open(io.BytesIO(source)) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        # never upscale: a small source gives a smaller square
+        side = min(width, image.width, image.height)
+        image = ImageOps.fit(image, (side, side), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        if image_format == 'WEBP':
+            image.save(output, 'WEBP', quality=quality, method=4)
+        else:
+            image.save(output, 'JPEG', quality=quality, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+def build_derivatives(source):
+    """Build every variant of an image and write them under content-hash names
+
+    Args:
+        source (bytes): original image
+
+    Returns:
+        dict: variant name -> {'width': int, 'webp': storage name, 'jpeg': storage name}
+    """
+    config = get_config()
+    jobs = [
+        (name, width, extension, image_format)
+        for name, width in config['VARIANTS'].items()
+        for extension, image_format in FORMATS.items()
+    ]
+    results = _run(jobs, source, config)
+
+    storage = get_storage()
+    variants = {}
+    for (name, width, extension, _), content in zip(jobs, results):
+        # same bytes, same name: an unchanged image is never rewritten and can be cached forever
+        file_name = f"{hashlib.sha256(content).hexdigest()[:20]}.{extension}"
+        if not storage.exists(file_name):
+            storage.save(file_name, ContentFile(content))
+        variants.setdefault(name, {'width': width})[extension] = file_name
+    return variants
+
+
+def generate_for_product(product, source):
+    """Build the derivatives and the placeholder of a product image and store them on the product"""
+    product.image_variants = build_derivatives(source)
+    product.image_placeholder = make_placeholder(source)
+    product.save(update_fields=['image_variants', 'image_placeholder'])
+    logger.info('[Images] Derivatives built for product %s', product.pk)
+    return product.image_variants
+
+
+def derivative_url(file_name):
+    return get_storage().url(file_name)
+
+
+def _run(jobs, source, config):
+    executor = _get_executor(config['WORKERS'])
+    if executor is None:
+        return [render_variant(source, width, image_format, config['QUALITY']) for _, width, _, image_format in jobs]
+    futures = [
+        executor.submit(render_variant, source, width, image_format, config['QUALITY'])
+        for _, width, _, image_format in jobs
+    ]
+    return [future.result() for future in futures]
+
+
+def _get_executor(workers):
+    global _executor
+    if not workers:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=workers)
+        return _executor
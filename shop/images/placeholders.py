@@ -0,0 +1,35 @@
+from PIL import Image, ImageFilter, ImageOps
+import base64
+import io
+
+# Side, in pixels, of the micro-thumbnail inlined in the product cards
+PLACEHOLDER_SIZE = 16
+
+
+def make_placeholder(source, size=PLACEHOLDER_SIZE):
+    """Return a base64 data URI of a tiny, blurred, square JPEG of the image
+
+    A 16px JPEG weighs a few hundred bytes: small enough to inline in the
+    HTML, so the card shows the colors of the biscuit at first paint.
+
+    Args:
+        source (bytes): image in any format Pillow reads
+        size (int, optional): side of the thumbnail
+
+    Returns:
+        str: data:image/jpeg;base64,... URI
+    """
+    with Image.open(io.BytesIO(source)) as image:
+        image = ImageOps.exif_transpose(image).convert('RGB')
+        image = ImageOps.fit(image, (size, size), Image.Resampling.BILINEAR)
+        image = image.filter(ImageFilter.GaussianBlur(1))
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=40, optimize=True)
+    return "data:image/jpeg;base64," + base64.b64encode(output.getvalue()).decode('ascii')
+
+
+def placeholder_source_url(url):
+    """Cloudinary URL of a small copy of the image, cheaper to download than the original"""
+    if not url or "/upload/" not in url:
+        return url
+    return url.replace("/upload/", "/upload/w_64,h_64,c_fill,g_auto,f_jpg,q_auto:low/", 1)
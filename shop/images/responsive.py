@@ -0,0 +1,77 @@
+from django.conf import settings
+from functools import lru_cache
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Widths, in pixels, of the square variants offered in srcset
+DEFAULT_WIDTHS = (240, 360, 480, 720, 960, 1200)
+
+
+def get_widths():
+    return tuple(getattr(settings, 'RESPONSIVE_IMAGE_WIDTHS', DEFAULT_WIDTHS))
+
+
+def transformation(width):
+    """Cloudinary transformation of a square, cropped around the subject, auto format/quality variant"""
+    return f"w_{width},h_{width},c_fill,g_auto,f_auto,q_auto"
+
+
+@lru_cache(maxsize=4096)
+def variant_urls(url, widths):
+    """Return ((width, url), ...) for every width, or () when url is not a Cloudinary upload URL
+
+    Memoized per image URL: a product grid asks for the same images on every render.
+    """
+    if not url or "/upload/" not in url:
+        return ()
+    return tuple((width, url.replace("/upload/", f"/upload/{transformation(width)}/", 1)) for width in widths)
+
+
+def image_url(image):
+    """URL of a CloudinaryField value, '' when it is empty"""
+    if not image:
+        return ""
+    try:
+        return image.url
+    except Exception as e:
+        logger.warning('[Images] No URL for image %s: %s', image, e)
+        return ""
+
+
+def cloudinary_configured():
+    """False when the shop runs without Cloudinary credentials (offline, tests, local demo)"""
+    return bool(getattr(settings, 'CLOUDINARY_STORAGE', {}).get('CLOUD_NAME'))
+
+
+def image_changed(instance, field_name='image'):
+    """True when the image of a saved model instance differs from the one it was loaded with"""
+    if field_name not in instance.__dict__:
+        return False
+    current = str(instance.__dict__[field_name] or '')
+    return current != getattr(instance, f'_original_{field_name}', '')
+
+
+def remember_image(instance, field_name='image'):
+    """Store the loaded image, for image_changed(); deferred fields are left alone"""
+    if field_name in instance.__dict__:
+        setattr(instance, f'_original_{field_name}', str(instance.__dict__[field_name] or ''))
+
+
+def request_eager_variants(public_id):
+    """Ask Cloudinary to generate every srcset variant of an image now, rather than on first view"""
+    import cloudinary.uploader
+    eager = [
+        {'width': width, 'height': width, 'crop': 'fill', 'gravity': 'auto', 'fetch_format': 'auto', 'quality': 'auto'}
+        for width in get_widths()
+    ]
+    try:
+        cloudinary.uploader.explicit(public_id, type='upload', eager=eager, eager_async=True)
+        logger.info('[Images] Eager variants requested for %s', public_id)
+    except Exception as e:
+        logger.error('[Images] Error requesting eager variants for %s: %s', public_id, e)
+
+
+def request_eager_variants_in_background(public_id):
+    threading.Thread(target=request_eager_variants, args=(public_id,), daemon=True).start()
@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from shop.catalog.invalidation import invalidation_bus
+from shop.images.derivatives import get_storage
+from shop.images.placeholders import make_placeholder, placeholder_source_url
+from shop.images.responsive import image_url
+from shop.models import Product
+from urllib.request import urlopen
+
+
+class Command(BaseCommand):
+    help = "Compute the inline placeholder of the product images that do not have one yet"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help="Products updated per query")
+        parser.add_argument('--timeout', type=int, default=10, help="Seconds allowed to download one image")
+
+    def handle(self, *args, **options):
+        queryset = (
+            Product.objects.filter(image_placeholder='')
+            .filter((Q(image__isnull=False) & ~Q(image='')) | ~Q(image_variants={}))
+            .only('id', 'image', 'image_variants')
+            .order_by('pk')
+        )
+        batch, updated_ids, failed = [], [], 0
+        for product in queryset.iterator(chunk_size=options['batch_size']):
+            try:
+                product.image_placeholder = make_placeholder(self.read_source(product, options['timeout']))
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Product {product.pk}: {e}")
+                continue
+            batch.append(product)
+            if len(batch) >= options['batch_size']:
+                updated_ids += self.save_batch(batch)
+                batch = []
+        if batch:
+            updated_ids += self.save_batch(batch)
+
+        if updated_ids:
+            invalidation_bus.publish('product', updated_ids)
+        self.stdout.write(self.style.SUCCESS(f"{len(updated_ids)} placeholders computed, {failed} failed"))
+
+    def read_source(self, product, timeout):
+        """Smallest available copy of the image: local thumbnail, else a small Cloudinary variant"""
+        thumbnail = product.image_variants.get('thumbnail')
+        if thumbnail:
+            with get_storage().open(thumbnail['jpeg']) as source:
+                return source.read()
+        with urlopen(placeholder_source_url(image_url(product.image)), timeout=timeout) as response:
+            return response.read()
+
+    def save_batch(self, batch):
+        Product.objects.bulk_update(batch, ['image_placeholder'])
+        self.stdout.write(f"{len(batch)} products updated, up to #{batch[-1].pk}")
+        return [product.pk for product in batch]
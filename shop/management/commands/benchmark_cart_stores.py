@@ -0,0 +1,64 @@
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory, override_settings
+from shop.cart.cart import get_cart_store
+from shop.models import Product
+from importlib import import_module
+import time
+
+STORES = ('session', 'db', 'redis')
+
+
+class Command(BaseCommand):
+    help = "Measure the cart requests per second each cart store sustains"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stores', nargs='+', choices=STORES, default=list(STORES))
+        parser.add_argument('--requests', type=int, default=500, help="Simulated cart requests per store")
+        parser.add_argument('--products', type=int, default=10, help="Distinct products in the cart")
+
+    def handle(self, *args, **options):
+        products = list(Product.objects.values_list('pk', 'price')[:options['products']])
+        if not products:
+            raise CommandError("The benchmark needs at least one product")
+
+        for name in options['stores']:
+            if name == 'redis' and not getattr(settings, 'CART_REDIS_URL', None):
+                self.stdout.write(f"{name:<10}skipped, CART_REDIS_URL is not set")
+                continue
+            with override_settings(CART_STORE=name):
+                elapsed = self._run(products, options['requests'])
+            self.stdout.write(
+                f"{name:<10}{options['requests'] / elapsed:>10.0f} requests/s"
+                f"{elapsed / options['requests'] * 1000:>10.3f} ms/request"
+            )
+
+    def _run(self, products, requests):
+        """Time requests reading the cart and changing one line, as the cart views do"""
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        session = session_store()
+        session.create()
+        session_key = session.session_key
+        factory = RequestFactory()
+
+        started = time.perf_counter()
+        for i in range(requests):
+            request = factory.post('/cart/')
+            request.user = AnonymousUser()
+            request.session = session_store(session_key)
+            store = get_cart_store(request)
+            store.items()
+            product_id, price = products[i % len(products)]
+            if i % 3 == 2:
+                store.add(product_id, -1)
+            else:
+                store.add(product_id, 1, price)
+            # what SessionMiddleware does at the end of the request
+            if request.session.modified:
+                request.session.save()
+        elapsed = time.perf_counter() - started
+
+        get_cart_store(request).clear()
+        session_store(session_key).delete()
+        return elapsed
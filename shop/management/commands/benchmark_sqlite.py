@@ -0,0 +1,85 @@
+from django.core.management.base import BaseCommand
+from django.conf import settings
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import tempfile
+import sqlite3
+import random
+import time
+
+MODES = ('default', 'production')
+
+
+def run_writer(path, mode, pragmas, duration, seed):
+    """Write cart-like rows for duration seconds, as one gunicorn worker would
+
+    Each transaction reads a row and then writes it back, the pattern that
+    makes deferred transactions fail on the read to write lock upgrade.
+
+    Returns:
+        tuple: (committed transactions, 'database is locked' errors)
+    """
+    connection = sqlite3.connect(path, timeout=5, isolation_level=None)
+    begin = 'BEGIN'
+    if mode == 'production':
+        for name, value in pragmas.items():
+            connection.execute(f'PRAGMA {name}={value}')
+        begin = 'BEGIN IMMEDIATE'
+
+    generator = random.Random(seed)
+    committed = errors = 0
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        item_id = generator.randrange(1000)
+        try:
+            connection.execute(begin)
+            row = connection.execute('SELECT quantity FROM cart_item WHERE id = ?', (item_id,)).fetchone()
+            connection.execute(
+                'INSERT INTO cart_item (id, quantity) VALUES (?, ?) '
+                'ON CONFLICT (id) DO UPDATE SET quantity = excluded.quantity',
+                (item_id, (row[0] if row else 0) + 1),
+            )
+            connection.execute('COMMIT')
+            committed += 1
+        except sqlite3.OperationalError:
+            errors += 1
+            if connection.in_transaction:
+                connection.execute('ROLLBACK')
+    connection.close()
+    return committed, errors
+
+
+class Command(BaseCommand):
+    help = "Compare the concurrent write throughput of the default and the production SQLite modes"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help="Concurrent writer processes")
+        parser.add_argument('--duration', type=float, default=5.0, help="Seconds each mode is measured")
+
+    def handle(self, *args, **options):
+        workers, duration = options['workers'], options['duration']
+        self.stdout.write(f"{workers} writer processes, {duration:g}s per mode")
+        with tempfile.TemporaryDirectory() as directory:
+            for mode in MODES:
+                path = Path(directory) / f'{mode}.sqlite3'
+                self._create_database(path, mode)
+                with ProcessPoolExecutor(max_workers=workers) as executor:
+                    futures = [
+                        executor.submit(run_writer, str(path), mode, settings.SQLITE_PRAGMAS, duration, seed)
+                        for seed in range(workers)
+                    ]
+                    results = [future.result() for future in futures]
+                committed = sum(result[0] for result in results)
+                errors = sum(result[1] for result in results)
+                self.stdout.write(
+                    f"{mode:<12}{committed / duration:>10.0f} writes/s{errors:>8} locked errors"
+                )
+
+    def _create_database(self, path, mode):
+        connection = sqlite3.connect(path)
+        if mode == 'production':
+            # the journal mode is stored in the file, the other pragmas are per connection
+            connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('CREATE TABLE cart_item (id INTEGER PRIMARY KEY, quantity INTEGER NOT NULL)')
+        connection.commit()
+        connection.close()
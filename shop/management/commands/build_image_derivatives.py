@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from shop.images import derivatives
+from shop.images.responsive import image_url
+from shop.models import Product
+from urllib.request import urlopen
+
+
+class Command(BaseCommand):
+    help = "Build the local resized copies of the product images (thumbnail, medium, large in WebP and JPEG)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Rebuild products that already have derivatives")
+        parser.add_argument('--batch-size', type=int, default=100, help="Products loaded per query")
+        parser.add_argument('--timeout', type=int, default=20, help="Seconds allowed to download one source image")
+
+    def handle(self, *args, **options):
+        queryset = Product.objects.exclude(image__isnull=True).exclude(image='').order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(image_variants={})
+
+        built = failed = 0
+        for product in queryset.only('id', 'image', 'image_variants').iterator(chunk_size=options['batch_size']):
+            url = image_url(product.image)
+            try:
+                with urlopen(url, timeout=options['timeout']) as response:
+                    source = response.read()
+                derivatives.generate_for_product(product, source)
+                built += 1
+            except Exception as e:
+                failed += 1
+                self.stderr.write(f"Product {product.pk}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Derivatives built for {built} products, {failed} failed"))
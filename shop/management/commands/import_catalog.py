@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from shop.catalog.importer import CatalogImporter, read_rows
+from pathlib import Path
+import sys
+
+
+class Command(BaseCommand):
+    help = "Create or update products from a CSV or JSON Lines price list, keyed on the product sku"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Input file, '-' for the standard input")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Input format, guessed from the file extension by default")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows validated and written per batch")
+        parser.add_argument('--dry-run', action='store_true', help="Print the changes without writing them")
+        parser.add_argument('--no-create-categories', action='store_true', help="Reject rows with an unknown category")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        file_format = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        importer = CatalogImporter(
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+            create_categories=not options['no_create_categories'],
+        )
+
+        if path == '-':
+            report = importer.run(read_rows(sys.stdin, file_format))
+        else:
+            if not Path(path).exists():
+                raise CommandError(f"File not found: {path}")
+            with open(path, newline='', encoding='utf-8-sig') as stream:
+                report = importer.run(read_rows(stream, file_format))
+
+        for change in report.changes:
+            self.stdout.write(change)
+        for line, message in report.errors:
+            self.stderr.write(f"Line {line}: {message}")
+        if report.new_categories:
+            self.stdout.write(f"New categories: {', '.join(sorted(report.new_categories))}")
+
+        summary = f"{report.created} created, {report.updated} updated, {report.unchanged} unchanged, {len(report.errors)} rejected"
+        if report.duplicates:
+            summary += f", {report.duplicates} duplicate skus replaced by a later row"
+        if options['dry_run']:
+            self.stdout.write(self.style.WARNING(f"Dry run, nothing written: {summary}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"Catalog imported: {summary}"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from shop.cart.purge import purge
+
+
+class Command(BaseCommand):
+    help = "Delete the expired sessions and the abandoned cart rows in small chunks, safe to run at peak hours"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Rows (or primary keys) covered per DELETE")
+        parser.add_argument('--sleep', type=float, default=0.1, help="Seconds paused after each DELETE")
+        parser.add_argument('--dry-run', action='store_true', help="Count the rows without deleting them")
+        parser.add_argument(
+            '--inactive-wishlists', action='store_true',
+            help="Also delete the wishlist rows of the deactivated accounts",
+        )
+
+    def handle(self, *args, **options):
+        counts = purge(
+            chunk_size=options['chunk_size'],
+            pause=options['sleep'],
+            dry_run=options['dry_run'],
+            inactive_wishlists=options['inactive_wishlists'],
+            stdout=self.stdout,
+        )
+        verb = "would be purged" if options['dry_run'] else "purged"
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['sessions']} sessions, {counts['cart_items']} cart items "
+            f"and {counts['wishlist_items']} wishlist items {verb}"
+        ))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from shop.sales.summary import rebuild_sales_summary
+
+
+class Command(BaseCommand):
+    help = "Recompute the sales summary of the admin dashboard from the order history"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Orders aggregated per query")
+
+    def handle(self, *args, **options):
+        count = rebuild_sales_summary(chunk_size=options['chunk_size'], stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f"Sales summary rebuilt ({count} rows)"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from shop.search.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the product full-text search index from the Product table"
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Search index rebuilt ({backend.__class__.__name__})"))
@@ -1,5 +1,7 @@
 from .cart.cart import Cart
 from .wishlist.wishlist import Wishlist
+from .catalog.invalidation import invalidation_bus
+from biscuitshop.routers import get_replica_config, has_written, start_context, end_context
 
 class CartMiddleware:
     """Automatically create a cart for all users (anonymous + authenticated)"""
@@ -8,10 +10,7 @@ class CartMiddleware:
         self.get_response = get_response
     
     def __call__(self, request):
-        # Initialize cart for every request if not exists
-        if 'cart' not in request.session:
-            request.session['cart'] = {}
-        
+        # the session is only written, and created, by the first cart change
         # Attach Cart instance to request for easy access
         request.cart = Cart(request)
         
@@ -25,12 +24,48 @@ class WishlistMiddleware:
         self.get_response = get_response
     
     def __call__(self, request):
-        # Initialize wishlist for ALL users (not just authenticated)
-        if 'wishlist' not in request.session:
-            request.session['wishlist'] = []
-            
+        # the session is only written, and created, by the first wishlist change
         # Attach Wishlist instance to request for easy access
         request.wishlist = Wishlist(request)
         
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        return response
+
+class CatalogInvalidationMiddleware:
+    """Apply the catalog changes published by the other nodes before serving the request"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # throttled to one poll per CATALOG_INVALIDATION['POLL_INTERVAL']
+        invalidation_bus.poll_if_due()
+        return self.get_response(request)
+
+class ReplicaPinningMiddleware:
+    """Keep a client on the primary database for a few seconds after it wrote
+
+    The request starts pinned when it carries the pin cookie, and a request
+    that wrote sets the cookie for DATABASE_REPLICA['STICKY_SECONDS'], so the
+    next pages never read catalog rows older than the client's own writes.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        config = get_replica_config()
+        if config['ALIAS'] is None:
+            return self.get_response(request)
+
+        tokens = start_context(pinned=config['COOKIE_NAME'] in request.COOKIES)
+        try:
+            response = self.get_response(request)
+            if has_written():
+                response.set_cookie(
+                    config['COOKIE_NAME'], '1',
+                    max_age=config['STICKY_SECONDS'], httponly=True, samesite='Lax',
+                )
+        finally:
+            end_context(tokens)
+        return response
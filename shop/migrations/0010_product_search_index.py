@@ -0,0 +1,58 @@
+from django.db import migrations
+
+from shop.search.search_backend import tokenize
+
+
+def create_search_index(apps, schema_editor):
+    """Create the full-text index matching the database vendor and fill it"""
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS shop_product_fts "
+            "USING fts5(name, description, tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            "INSERT INTO shop_product_fts (rowid, name, description) "
+            "SELECT id, name, description FROM shop_product"
+        )
+
+    elif vendor == 'postgresql':
+        schema_editor.execute("ALTER TABLE shop_product ADD COLUMN IF NOT EXISTS search_vector tsvector")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS shop_product_search_vector_idx "
+            "ON shop_product USING GIN (search_vector)"
+        )
+        Product = apps.get_model('shop', 'Product')
+        rows = [
+            (' '.join(tokenize(name)), ' '.join(tokenize(description)), pk)
+            for pk, name, description in Product.objects.values_list('id', 'name', 'description').iterator()
+        ]
+        with schema_editor.connection.cursor() as cursor:
+            cursor.executemany(
+                "UPDATE shop_product SET search_vector = "
+                "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B') "
+                "WHERE id = %s",
+                rows,
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+
+    if vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS shop_product_fts")
+    elif vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS shop_product_search_vector_idx")
+        schema_editor.execute("ALTER TABLE shop_product DROP COLUMN IF EXISTS search_vector")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_alter_product_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0010_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model', models.CharField(max_length=50)),
+                ('object_ids', models.JSONField(blank=True, default=list)),
+                ('origin', models.CharField(max_length=32)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+        migrations.AlterModelOptions(
+            name='product',
+            options={'ordering': ['-id']},
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:21
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+
+def backfill_sales_summary(apps, schema_editor):
+    Order = apps.get_model('shop', 'Order')
+    SalesSummary = apps.get_model('shop', 'SalesSummary')
+    rows = (
+        Order.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'status')
+        .annotate(order_count=Count('pk'), total_sales=Sum('total_price'))
+        .order_by()
+    )
+    SalesSummary.objects.bulk_create(
+        SalesSummary(day=row['day'], status=row['status'], order_count=row['order_count'],
+                     total_sales=row['total_sales'] or 0)
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_catalogchange'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('failed', 'Failed')], max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'status'), name='unique_sales_summary_day_status')],
+            },
+        ),
+        migrations.RunPython(backfill_sales_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='image_placeholder',
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0016_cartitem_session_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-19 13:25
+
+from django.db import migrations, models
+from django.db.models import Q, Sum
+
+
+def backfill_sales_totals(apps, schema_editor):
+    SalesSummary = apps.get_model('shop', 'SalesSummary')
+    SalesTotals = apps.get_model('shop', 'SalesTotals')
+    totals = SalesSummary.objects.aggregate(
+        order_count=Sum('order_count'),
+        total_sales=Sum('total_sales', filter=Q(status='completed')),
+    )
+    SalesTotals.objects.create(pk=1, order_count=totals['order_count'] or 0, total_sales=totals['total_sales'] or 0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0017_cartitem_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_sales', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+        migrations.RunPython(backfill_sales_totals, migrations.RunPython.noop),
+    ]
@@ -17,11 +17,17 @@ class Category(models.Model):
 #Product model to represent biscuits in the shop
 class Product(models.Model):
     name = models.CharField(max_length=200)
+    # supplier reference, the key of the catalog imports
+    sku = models.CharField(max_length=64, unique=True, null=True, blank=True)
     description = models.TextField()
     price = models.DecimalField(max_digits=6, decimal_places=2)
     category = models.ForeignKey(Category, related_name='products', on_delete=models.CASCADE)
     stock = models.PositiveIntegerField(default=0)
     image = CloudinaryField('image', blank=True, null=True)
+    # locally built resized copies of the image, see shop.images.derivatives
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    # blurred micro-thumbnail (data URI) shown while the image loads
+    image_placeholder = models.TextField(blank=True, editable=False)
     
     class Meta:
         ordering = ['-id']
@@ -45,9 +51,19 @@ class CartItem(models.Model):
     session_key = models.CharField(max_length=40, null=True, blank=True)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField(default=1)
+    # bumped by every change, for the compare-and-set updates of the cart store
+    version = models.PositiveIntegerField(default=0)
     
     class Meta:
         unique_together = ('user', 'product')
+        constraints = [
+            # one line per product in the cart of an anonymous session too
+            models.UniqueConstraint(
+                fields=['session_key', 'product'],
+                condition=models.Q(user__isnull=True),
+                name='unique_session_cart_product',
+            ),
+        ]
 
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
@@ -99,4 +115,40 @@ class OrderItem(models.Model):
     def save(self, *args, **kwargs):
         if not self.price:
             self.price = self.product.price
-        super().save(*args, **kwargs)
\ No newline at end of file
+        super().save(*args, **kwargs)
+
+class CatalogChange(models.Model):
+    """Catalog change log polled by the app nodes when Redis pub/sub is not available"""
+    model = models.CharField(max_length=50)
+    object_ids = models.JSONField(default=list, blank=True)
+    origin = models.CharField(max_length=32)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.model} change #{self.pk}"
+
+class SalesSummary(models.Model):
+    """Orders count and amount per day and status, kept up to date by the Order signals"""
+    day = models.DateField()
+    status = models.CharField(max_length=20, choices=Order.STATUS_CHOICES)
+    order_count = models.IntegerField(default=0)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'status'], name='unique_sales_summary_day_status'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.status}: {self.order_count} orders"
+
+
+class SalesTotals(models.Model):
+    """All-time orders count and completed sales amount, in a single row kept
+    up to date by the Order signals along with SalesSummary
+    """
+    order_count = models.IntegerField(default=0)
+    total_sales = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"{self.order_count} orders, {self.total_sales} sold"
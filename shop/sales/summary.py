@@ -0,0 +1,120 @@
+from django.db import transaction, IntegrityError
+from django.db.models import F, Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from decimal import Decimal
+from shop.models import Order, SalesSummary, SalesTotals
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Status of the orders counted in the sales amount of the admin header
+SALES_STATUS = 'completed'
+
+# Primary key of the single SalesTotals row
+TOTALS_PK = 1
+
+
+def order_day(created_at):
+    """Return the day an order is summarized under, in the current time zone"""
+    if timezone.is_aware(created_at):
+        created_at = timezone.localtime(created_at)
+    return created_at.date()
+
+
+def order_snapshot(order):
+    """Return the (day, status, total_price) an order contributes to the summary"""
+    return order_day(order.created_at), order.status, order.total_price
+
+
+def apply_order_change(previous, current):
+    """Move an order contribution from one summary row to another
+
+    Args:
+        previous (tuple, optional): (day, status, total_price) before the change, None on creation
+        current (tuple, optional): (day, status, total_price) after the change, None on deletion
+    """
+    if previous == current:
+        return
+    with transaction.atomic():
+        if previous is not None:
+            _add(SalesSummary, {'day': previous[0], 'status': previous[1]}, -1, -Decimal(previous[2] or 0))
+        if current is not None:
+            _add(SalesSummary, {'day': current[0], 'status': current[1]}, 1, Decimal(current[2] or 0))
+
+        count = (current is not None) - (previous is not None)
+        amount = _sales_amount(current) - _sales_amount(previous)
+        if count or amount:
+            _add(SalesTotals, {'pk': TOTALS_PK}, count, amount)
+
+
+def _sales_amount(snapshot):
+    if snapshot is None or snapshot[1] != SALES_STATUS:
+        return Decimal('0')
+    return Decimal(snapshot[2] or 0)
+
+
+def _add(model, lookup, count, amount):
+    changes = {'order_count': F('order_count') + count, 'total_sales': F('total_sales') + amount}
+    if model.objects.filter(**lookup).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**lookup, order_count=count, total_sales=amount)
+    except IntegrityError:
+        # another request created the row in the meantime
+        model.objects.filter(**lookup).update(**changes)
+
+
+def get_header_stats():
+    """Return the total sales amount and the number of orders, read from the SalesTotals row"""
+    try:
+        totals = SalesTotals.objects.get(pk=TOTALS_PK)
+    except SalesTotals.DoesNotExist:
+        return {'order_count': 0, 'total_sales': 0}
+    return {'order_count': totals.order_count, 'total_sales': totals.total_sales}
+
+
+def rebuild_sales_summary(chunk_size=5000, stdout=None):
+    """Recompute the whole summary and the all-time totals from the Order table
+
+    Orders are aggregated by the database one primary key range at a time, so
+    the history is never loaded in memory, and the summary is swapped in a
+    single transaction at the end.
+
+    Returns:
+        int: number of summary rows written
+    """
+    rows = {}
+    last_pk = 0
+    max_pk = Order.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+    while last_pk < max_pk:
+        chunk = (
+            Order.objects.filter(pk__gt=last_pk, pk__lte=last_pk + chunk_size)
+            .annotate(day=TruncDate('created_at'))
+            .values('day', 'status')
+            .annotate(order_count=Count('pk'), total_sales=Sum('total_price'))
+            .order_by()
+        )
+        for row in chunk:
+            key = (row['day'], row['status'])
+            count, amount = rows.get(key, (0, Decimal('0')))
+            rows[key] = (count + row['order_count'], amount + (row['total_sales'] or 0))
+        last_pk += chunk_size
+        if stdout is not None:
+            stdout.write(f"Orders up to #{min(last_pk, max_pk)} of {max_pk} summarized")
+
+    with transaction.atomic():
+        SalesSummary.objects.all().delete()
+        SalesSummary.objects.bulk_create(
+            SalesSummary(day=day, status=status, order_count=count, total_sales=amount)
+            for (day, status), (count, amount) in rows.items()
+        )
+        SalesTotals.objects.update_or_create(pk=TOTALS_PK, defaults={
+            'order_count': sum(count for count, _ in rows.values()),
+            'total_sales': sum(
+                (amount for (_, status), (_, amount) in rows.items() if status == SALES_STATUS), Decimal('0')
+            ),
+        })
+    logger.info('[Sales] Summary rebuilt with %s rows', len(rows))
+    return len(rows)
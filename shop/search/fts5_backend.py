@@ -0,0 +1,83 @@
+from shop.search.search_backend import SearchBackend, tokenize
+from django.db import connection
+from shop.models import Product
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Fts5SearchBackend(SearchBackend):
+    """SQLite FTS5 search backend ranked with bm25
+
+    The shop_product_fts virtual table is created by migration 0010 and keeps
+    the product id as its rowid, so a match maps straight back to a Product.
+    """
+
+    table = 'shop_product_fts'
+    # bm25 column weights: a hit in the name matters more than one in the description
+    name_weight = 10.0
+    description_weight = 1.0
+
+    def search(self, query, limit=None):
+        """Run a prefix-aware MATCH query ordered by bm25 rank
+
+        Args:
+            query (str): raw user query
+            limit (int, optional): maximum number of ids to return
+
+        Returns:
+            list: matching product ids, best match first
+        """
+        match = self._build_match(query)
+        if not match:
+            return []
+
+        sql = (
+            f"SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s "
+            f"ORDER BY bm25({self.table}, %s, %s)"
+        )
+        params = [match, self.name_weight, self.description_weight]
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_products(self, products):
+        rows = [(product.pk, product.name, product.description or '') for product in products]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(row[0],) for row in rows])
+            cursor.executemany(
+                f"INSERT INTO {self.table} (rowid, name, description) VALUES (%s, %s, %s)", rows
+            )
+
+    def remove_products(self, product_ids):
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"DELETE FROM {self.table} WHERE rowid = %s", [(pid,) for pid in product_ids])
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {self.table}")
+            cursor.execute(
+                f"INSERT INTO {self.table} (rowid, name, description) "
+                f"SELECT id, name, description FROM {Product._meta.db_table}"
+            )
+        logger.info('[Search] FTS5 index rebuilt')
+
+    def _build_match(self, query):
+        """Turn a user query into an FTS5 expression: every term must match,
+        the last one as a prefix so results show up while the user is typing.
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return ''
+        terms = [f'"{token}"' for token in tokens[:-1]]
+        terms.append(f'"{tokens[-1]}"*')
+        return ' '.join(terms)
@@ -0,0 +1,131 @@
+from shop.search.search_backend import SearchBackend, tokenize
+from collections import Counter, defaultdict
+from shop.models import Product
+import threading
+import bisect
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class InMemorySearchBackend(SearchBackend):
+    """Pure-Python inverted index used when the database has no full-text engine
+
+    The index is built lazily on the first search and then kept up to date by
+    the Product signals. Every query term must match; the last one is matched
+    as a prefix against a sorted vocabulary. Results are ranked with a tf-idf
+    score where name hits weigh more than description hits.
+    """
+
+    is_local = True
+    name_weight = 3.0
+    description_weight = 1.0
+    chunk_size = 2000
+
+    def __init__(self):
+        self._postings = defaultdict(dict)      # token -> {product_id: weight}
+        self._documents = {}                    # product_id -> tokens of the product
+        self._vocabulary = []                   # sorted tokens, for prefix lookups
+        self._lock = threading.RLock()
+        self._built = False
+
+    def search(self, query, limit=None):
+        """Return the ids of the products matching every term of the query
+
+        Args:
+            query (str): raw user query
+            limit (int, optional): maximum number of ids to return
+
+        Returns:
+            list: matching product ids, best match first
+        """
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        self._ensure_built()
+
+        with self._lock:
+            total = max(len(self._documents), 1)
+            scores = None
+            for position, token in enumerate(tokens):
+                is_last = position == len(tokens) - 1
+                term_scores = self._score_term(token, total, prefix=is_last)
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {pid: score + term_scores[pid] for pid, score in scores.items() if pid in term_scores}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))  #type: ignore
+        if limit:
+            ranked = ranked[:limit]
+        return [pid for pid, _ in ranked]
+
+    def index_products(self, products):
+        with self._lock:
+            for product in products:
+                self._remove(product.pk)
+                weights = Counter()
+                for token in tokenize(product.name):
+                    weights[token] += self.name_weight
+                for token in tokenize(product.description):
+                    weights[token] += self.description_weight
+                for token, weight in weights.items():
+                    if token not in self._postings:
+                        bisect.insort(self._vocabulary, token)
+                    self._postings[token][product.pk] = weight
+                self._documents[product.pk] = tuple(weights)
+
+    def remove_products(self, product_ids):
+        with self._lock:
+            for product_id in product_ids:
+                self._remove(product_id)
+
+    def rebuild(self):
+        with self._lock:
+            self._postings = defaultdict(dict)
+            self._documents = {}
+            self._vocabulary = []
+            queryset = Product.objects.only('id', 'name', 'description').order_by('pk')
+            self.index_products(queryset.iterator(chunk_size=self.chunk_size))
+            self._built = True
+        logger.info('[Search] In-memory index rebuilt with %s products', len(self._documents))
+
+    def _ensure_built(self):
+        if not self._built:
+            self.rebuild()
+
+    def _remove(self, product_id):
+        for token in self._documents.pop(product_id, ()):
+            postings = self._postings.get(token)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[token]
+                index = bisect.bisect_left(self._vocabulary, token)
+                if index < len(self._vocabulary) and self._vocabulary[index] == token:
+                    del self._vocabulary[index]
+
+    def _score_term(self, token, total, prefix=False):
+        if prefix:
+            start = bisect.bisect_left(self._vocabulary, token)
+            candidates = []
+            for candidate in self._vocabulary[start:]:
+                if not candidate.startswith(token):
+                    break
+                candidates.append(candidate)
+        else:
+            candidates = [token] if token in self._postings else []
+
+        scores = {}
+        for candidate in candidates:
+            postings = self._postings[candidate]
+            idf = math.log(1 + total / len(postings))
+            for pid, weight in postings.items():
+                score = weight * idf
+                if score > scores.get(pid, 0):
+                    scores[pid] = score
+        return scores
@@ -0,0 +1,79 @@
+from shop.search.search_backend import SearchBackend, tokenize
+from django.db import connection
+from shop.models import Product
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class PostgresSearchBackend(SearchBackend):
+    """PostgreSQL tsvector search backend ranked with ts_rank
+
+    Migration 0010 adds the shop_product.search_vector column and its GIN index.
+    The vector is fed with text normalized by tokenize() so that accents are
+    folded the same way for documents and queries, without the unaccent extension.
+    """
+
+    table = Product._meta.db_table
+    vector_sql = "setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B')"
+    chunk_size = 2000
+
+    def search(self, query, limit=None):
+        """Run a prefix-aware tsquery ordered by ts_rank
+
+        Args:
+            query (str): raw user query
+            limit (int, optional): maximum number of ids to return
+
+        Returns:
+            list: matching product ids, best match first
+        """
+        tsquery = self._build_tsquery(query)
+        if not tsquery:
+            return []
+
+        sql = (
+            f"SELECT id FROM {self.table} "
+            f"WHERE search_vector @@ to_tsquery('simple', %s) "
+            f"ORDER BY ts_rank(search_vector, to_tsquery('simple', %s)) DESC, id DESC"
+        )
+        params = [tsquery, tsquery]
+        if limit:
+            sql += " LIMIT %s"
+            params.append(limit)
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def index_products(self, products):
+        rows = [
+            (' '.join(tokenize(product.name)), ' '.join(tokenize(product.description)), product.pk)
+            for product in products
+        ]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f"UPDATE {self.table} SET search_vector = {self.vector_sql} WHERE id = %s", rows)
+
+    def remove_products(self, product_ids):
+        # The vector lives on the product row itself and goes away with it
+        return
+
+    def rebuild(self):
+        queryset = Product.objects.order_by('pk')
+        last_pk = 0
+        while True:
+            chunk = list(queryset.filter(pk__gt=last_pk).only('id', 'name', 'description')[:self.chunk_size])
+            if not chunk:
+                break
+            self.index_products(chunk)
+            last_pk = chunk[-1].pk
+        logger.info('[Search] PostgreSQL search vectors rebuilt')
+
+    def _build_tsquery(self, query):
+        tokens = tokenize(query)
+        if not tokens:
+            return ''
+        terms = tokens[:-1] + [f'{tokens[-1]}:*']
+        return ' & '.join(terms)
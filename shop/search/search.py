@@ -0,0 +1,77 @@
+from django.conf import settings
+from django.db import connection, transaction
+import logging
+
+logger = logging.getLogger(__name__)
+
+_backend = None
+
+
+def get_search_backend():
+    """Return the process-wide search backend selected by settings.SEARCH_BACKEND
+
+    'auto' picks SQLite FTS5 or PostgreSQL full-text search from the database
+    vendor and falls back to the pure-Python inverted index otherwise.
+    """
+    global _backend
+    if _backend is None:
+        _backend = _create_backend(getattr(settings, 'SEARCH_BACKEND', 'auto'))
+    return _backend
+
+
+def _create_backend(name):
+    if name == 'auto':
+        name = {'sqlite': 'fts5', 'postgresql': 'postgres'}.get(connection.vendor, 'memory')
+
+    if name == 'fts5':
+        from shop.search.fts5_backend import Fts5SearchBackend
+        return Fts5SearchBackend()
+    if name == 'postgres':
+        from shop.search.postgres_backend import PostgresSearchBackend
+        return PostgresSearchBackend()
+    if name == 'memory':
+        from shop.search.memory_backend import InMemorySearchBackend
+        return InMemorySearchBackend()
+    raise ValueError(f"Unknown search backend: {name}")
+
+
+def search_products(query, limit=None):
+    """Return the ids of the products matching the query, best match first"""
+    limit = limit or getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+    return get_search_backend().search(query, limit=limit)
+
+
+def index_products(products):
+    """Refresh the given products in the search index without failing the caller's save"""
+    try:
+        with transaction.atomic():
+            get_search_backend().index_products(products)
+    except Exception as e:
+        logger.error('[Search] Error indexing products: %s', e)
+
+
+def remove_products(product_ids):
+    """Drop the given product ids from the search index"""
+    try:
+        with transaction.atomic():
+            get_search_backend().remove_products(product_ids)
+    except Exception as e:
+        logger.error('[Search] Error removing products from the index: %s', e)
+
+
+def refresh_local_index(product_ids):
+    """Reload the given products into an in-process index after a change made on another node"""
+    backend = get_search_backend()
+    if not backend.is_local:
+        return
+    from shop.models import Product
+    products = list(Product.objects.filter(id__in=product_ids))
+    backend.index_products(products)
+    backend.remove_products(set(product_ids) - {product.pk for product in products})
+
+
+def reset_local_index():
+    """Forget an in-process index, it is rebuilt on the next search"""
+    global _backend
+    if _backend is not None and _backend.is_local:
+        _backend = None
@@ -0,0 +1,43 @@
+import re
+import unicodedata
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase, accent-free search tokens
+
+    Args:
+        text (str): raw text (product name, description or user query)
+
+    Returns:
+        list: tokens in their original order
+    """
+    if not text:
+        return []
+    normalized = unicodedata.normalize('NFKD', str(text).lower())
+    stripped = ''.join(char for char in normalized if not unicodedata.combining(char))
+    return TOKEN_RE.findall(stripped)
+
+
+class SearchBackend:
+    """Base class for the product full-text search backends"""
+
+    # True when the index lives in the worker memory and has to be refreshed on every node
+    is_local = False
+
+    def search(self, query, limit=None):
+        """Return the ids of the products matching the query, best match first"""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def index_products(self, products):
+        """Add or refresh the given products in the index"""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def remove_products(self, product_ids):
+        """Drop the given product ids from the index"""
+        raise NotImplementedError("Subclasses must implement this method.")
+
+    def rebuild(self):
+        """Recreate the whole index from the Product table"""
+        raise NotImplementedError("Subclasses must implement this method.")
@@ -1,7 +1,17 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import pre_save, post_save, post_delete, post_init
+from django.conf import settings
 from django.dispatch import receiver
+from django.db import transaction
 from django.contrib.auth.models import User
-from .models import CustomerProfile
+from django.contrib.auth.signals import user_logged_in
+from .models import CustomerProfile, Product, Category, Order
+from .search import search
+from .catalog.facets import facet_index
+from .catalog.cache import catalog_cache
+from .catalog.invalidation import invalidation_bus
+from .sales import summary
+from .images import responsive
+from .cart.cart import get_cart_store, TOTALS_KEY
 
 @receiver(post_save, sender=User)
 def create_customer_profile(sender, instance, created, **kwargs):
@@ -14,3 +24,118 @@ def save_customer_profile(sender, instance, **kwargs):
     """Save CustomerProfile when User is saved"""
     if hasattr(instance, 'customerprofile'):
         instance.customerprofile.save()
+
+@receiver(post_save, sender=Product)
+def index_product(sender, instance, **kwargs):
+    """Keep the full-text index in step with product edits and tell every node"""
+    search.index_products([instance])
+    product_id = instance.pk
+    transaction.on_commit(lambda: invalidation_bus.publish('product', [product_id]))
+
+@receiver(post_init, sender=Product)
+def remember_product_image(sender, instance, **kwargs):
+    responsive.remember_image(instance)
+
+@receiver(post_save, sender=Product)
+def request_image_variants(sender, instance, **kwargs):
+    """Have Cloudinary build the srcset variants of a new image before the first customer asks for them"""
+    if not getattr(settings, 'CLOUDINARY_EAGER_TRANSFORMATIONS', False):
+        return
+    if instance.image and responsive.image_changed(instance):
+        public_id = str(instance.image)
+        transaction.on_commit(lambda: responsive.request_eager_variants_in_background(public_id))
+    responsive.remember_image(instance)
+
+@receiver(post_delete, sender=Product)
+def unindex_product(sender, instance, **kwargs):
+    """Drop deleted products from the full-text index and tell every node"""
+    search.remove_products([instance.pk])
+    product_id = instance.pk
+    transaction.on_commit(lambda: invalidation_bus.publish('product', [product_id]))
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def publish_category_change(sender, instance, **kwargs):
+    """Tell every node that a category changed"""
+    category_id = instance.pk
+    transaction.on_commit(lambda: invalidation_bus.publish('category', [category_id]))
+
+# Above this many product ids, a change expires whole namespaces instead of single keys
+BULK_CHANGE_THRESHOLD = 200
+
+def apply_catalog_change(event, local):
+    """Evict or refresh what a catalog change made stale on this node
+
+    The publishing node (local=True) also clears the shared cache tier, the
+    other nodes only drop their in-process copies.
+    """
+    model, ids = event['model'], event['ids']
+
+    if model == 'product' and len(ids) > BULK_CHANGE_THRESHOLD:
+        # imports and bulk updates: cheaper to drop everything than to evict key by key
+        _expire_namespace('products', local)
+        _expire_namespace('listings', local)
+        facet_index.invalidate()
+        if not local:
+            search.reset_local_index()
+
+    elif model == 'product':
+        for product_id in ids:
+            if local:
+                catalog_cache.delete('products', f'detail:{product_id}')
+            else:
+                catalog_cache.local.delete(catalog_cache.make_key('products', f'detail:{product_id}'))
+        _expire_namespace('listings', local)
+        facet_index.refresh_products(ids)
+        if not local:
+            search.refresh_local_index(ids)
+
+    elif model == 'category':
+        _expire_namespace('categories', local)
+        _expire_namespace('listings', local)
+
+    else:
+        catalog_cache.clear_local()
+        facet_index.invalidate()
+        search.reset_local_index()
+
+def _expire_namespace(namespace, local):
+    if local:
+        catalog_cache.bump_version(namespace)
+    else:
+        catalog_cache.forget_version(namespace)
+
+invalidation_bus.subscribe(apply_catalog_change)
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_snapshot(sender, instance, **kwargs):
+    """Keep what the order contributed to the sales summary before the save"""
+    previous = None
+    if instance.pk:
+        row = Order.objects.filter(pk=instance.pk).values('created_at', 'status', 'total_price').first()
+        if row is not None:
+            previous = (summary.order_day(row['created_at']), row['status'], row['total_price'])
+    instance._sales_snapshot = previous
+
+@receiver(post_save, sender=Order)
+def update_sales_summary(sender, instance, **kwargs):
+    """Move the order to its new day/status row of the sales summary"""
+    summary.apply_order_change(getattr(instance, '_sales_snapshot', None), summary.order_snapshot(instance))
+    instance._sales_snapshot = summary.order_snapshot(instance)
+
+@receiver(post_delete, sender=Order)
+def remove_from_sales_summary(sender, instance, **kwargs):
+    summary.apply_order_change(summary.order_snapshot(instance), None)
+
+
+@receiver(user_logged_in)
+def merge_cart_on_login(sender, request, user, **kwargs):
+    """Fold the cart filled before logging in into the saved cart of the user"""
+    if request is None or not hasattr(request, 'session'):
+        return
+    # login() sets request.user only on requests that had one (not Client.login())
+    request.user = user
+    get_cart_store(request).merge_anonymous(getattr(settings, 'CART_MERGE_POLICY', 'sum'))
+    # the totals of the anonymous cart no longer hold
+    request.session.pop(TOTALS_KEY, None)
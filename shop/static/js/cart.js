@@ -1,63 +1,141 @@
 $(document).ready(function() {
-    const csrftoken = getCSRFToken();
+    // Clicks only update the page: the new quantities are sent in one batch
+    // to cart/apply once the customer stops clicking for FLUSH_DELAY ms.
+    const FLUSH_DELAY = 400;
+    const applyUrl = $('#cart').data('apply-url');
+    let pending = {};       // product id -> new quantity, not sent yet
+    let timer = null;
+    let inFlight = null;    // the batch on its way, one at a time
 
-    // Increase quantity
-    $(document).on('click', '.increase-cart-btn', function(e) {
-        e.preventDefault();
-        var url = $(this).data('url');
-        
-        makeAjaxRequest(url, 'POST',
-            function(response) {
+    function cartLines(productId) {
+        return $('.cart-line[data-product-id="' + productId + '"]');
+    }
+
+    function currentQuantity(button) {
+        return parseInt($(button).closest('.cart-line').attr('data-quantity'), 10);
+    }
+
+    function changeQuantity(button, quantity) {
+        const productId = $(button).closest('.cart-line').data('product-id');
+        quantity = Math.max(0, quantity);
+        cartLines(productId).attr('data-quantity', quantity).find('.cart-line-quantity').text(quantity);
+        pending[productId] = quantity;
+        clearTimeout(timer);
+        timer = setTimeout(flush, FLUSH_DELAY);
+    }
+
+    function lineVersion(productId) {
+        const version = cartLines(productId).first().attr('data-version');
+        return version === '' ? null : parseInt(version, 10);
+    }
+
+    function flush(keepalive) {
+        clearTimeout(timer);
+        // The next batch waits for the versions the previous one brings back,
+        // or it would conflict with our own write. Only a page going away
+        // cannot wait.
+        if (inFlight && keepalive !== true) {
+            return inFlight.then(function() { return flush(); });
+        }
+        // the last version this page knows: a line changed by another tab since is left alone
+        const operations = Object.keys(pending).map(function(productId) {
+            return {product_id: parseInt(productId, 10), quantity: pending[productId], version: lineVersion(productId)};
+        });
+        pending = {};
+        if (!operations.length) {
+            return Promise.resolve();
+        }
+        inFlight = fetch(applyUrl, {
+            method: 'POST',
+            // lets the last batch leave with the page
+            keepalive: keepalive === true,
+            headers: {
+                'Content-Type': 'application/json',
+                'X-CSRFToken': getCSRFToken(),
+                'X-Requested-With': 'XMLHttpRequest',
+            },
+            body: JSON.stringify({operations: operations}),
+        })
+            .then(function(response) { return response.json(); })
+            .then(function(response) {
                 if (response.success) {
-                    location.reload();
-                    displayMessage(response.message, 'success');
+                    render(response);
+                    if (response.conflicts.length) {
+                        displayMessage('Your cart was changed in another window, please check the quantities.', 'error');
+                    }
                 } else {
-                    displayMessage(response.message, 'error');
+                    displayMessage(response.error, 'error');
                 }
-            },
-            function() {
+            })
+            .catch(function() {
                 displayMessage('Error updating cart.', 'error');
+            })
+            .finally(function() {
+                inFlight = null;
+            });
+        return inFlight;
+    }
+
+    function render(response) {
+        response.conflicts.forEach(function(productId) {
+            // the customer has to see the other change before deciding again
+            delete pending[productId];
+        });
+        $('.cart-line').each(function() {
+            const productId = $(this).data('product-id');
+            const item = response.items[productId];
+            if (item) {
+                $(this).attr('data-version', item.version === null ? '' : item.version);
+            }
+            if (productId in pending) {
+                return;     // changed again while the batch was on its way
             }
-        );
+            if (!item) {
+                $(this).remove();
+                return;
+            }
+            $(this).attr('data-quantity', item.quantity);
+            $(this).find('.cart-line-quantity').text(item.quantity);
+            $(this).find('.cart-line-subtotal').text('Ar ' + item.subtotal);
+        });
+        if (!Object.keys(response.items).length) {
+            location.reload();      // shows the empty cart
+            return;
+        }
+        $('#cart-lines-count').text(Object.keys(response.items).length);
+        $('#cart-total-price').text('Ar ' + response.cart_total_price);
+        $('#cart-count').text(response.cart_count);
+    }
+
+    // Increase quantity
+    $(document).on('click', '.increase-cart-btn', function(e) {
+        e.preventDefault();
+        changeQuantity(this, currentQuantity(this) + 1);
     });
 
     // Decrease quantity
     $(document).on('click', '.decrease-cart-btn', function(e) {
         e.preventDefault();
-        var url = $(this).data('url');
-        
-        makeAjaxRequest(url, 'POST',
-            function(response) {
-                if (response.success) {
-                    location.reload();
-                    displayMessage(response.message, 'success');
-                } else {
-                    displayMessage(response.message, 'error');
-                }
-            },
-            function() {
-                displayMessage('Error updating cart.', 'error');
-            }
-        );
+        changeQuantity(this, currentQuantity(this) - 1);
     });
 
     // Remove from cart
     $(document).on('click', '.remove-cart-btn', function(e) {
         e.preventDefault();
-        var url = $(this).data('url');
-        
-        makeAjaxRequest(url, 'POST',
-            function(response) {
-                if (response.success) {
-                    location.reload();
-                    displayMessage(response.message, 'success');
-                } else {
-                    displayMessage(response.error, 'error')
-                }
-            },
-            function() {
-                displayMessage('Error updating cart.', 'error');
-            }
-        );
+        changeQuantity(this, 0);
+    });
+
+    // The checkout page has to see the last changes
+    $('#checkout-link').on('click', function(e) {
+        if (!Object.keys(pending).length) {
+            return;
+        }
+        e.preventDefault();
+        const href = this.href;
+        flush().then(function() { window.location.href = href; });
+    });
+
+    $(window).on('pagehide', function() {
+        flush(true);
     });
-});
\ No newline at end of file
+});
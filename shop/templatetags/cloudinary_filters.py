@@ -1,4 +1,8 @@
 from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html
+from shop.images.responsive import get_widths, image_url, variant_urls, cloudinary_configured
+from shop.images.derivatives import derivative_url
 
 register = template.Library()
 
@@ -18,4 +22,46 @@ def optimize_biscuits(url, size=None):
     if size is None:
         params = "w_300,h_300,c_fill,g_auto,f_auto,q_auto"
     
-    return url.replace("upload/", f"upload/{params}/")
\ No newline at end of file
+    return url.replace("upload/", f"upload/{params}/")
+
+@register.simple_tag
+def responsive_image(image, alt='', sizes='100vw', css_class='', fallback='images/biscuit2.jpg', loading='lazy', variants=None):
+    """Render an <img> with a srcset of Cloudinary width variants
+
+    The browser picks the smallest variant covering the slot described by
+    sizes, so phones no longer download the desktop image. Without Cloudinary
+    the locally built derivatives (Product.image_variants) are used instead.
+
+    Usage: {% responsive_image product.image product.name sizes="(min-width: 1024px) 25vw, 50vw" css_class="..." variants=product.image_variants %}
+    """
+    if variants and (not image or not cloudinary_configured()):
+        return _local_picture(variants, alt, sizes, css_class, loading)
+
+    variants = variant_urls(image_url(image), get_widths())
+    if not variants:
+        return format_html(
+            '<img src="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+            image_url(image) or static(fallback), alt, css_class, loading,
+        )
+
+    srcset = ", ".join(f"{url} {width}w" for width, url in variants)
+    # the src fallback is the middle breakpoint, for browsers ignoring srcset
+    src = variants[len(variants) // 2][1]
+    width = variants[-1][0]
+    return format_html(
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="{}" decoding="async">',
+        src, srcset, sizes, width, width, alt, css_class, loading,
+    )
+
+def _local_picture(variants, alt, sizes, css_class, loading):
+    """<picture> offering the WebP derivatives first and the JPEG ones to older browsers"""
+    ordered = sorted(variants.values(), key=lambda variant: variant['width'])
+    webp_srcset = ", ".join(f"{derivative_url(variant['webp'])} {variant['width']}w" for variant in ordered)
+    jpeg_srcset = ", ".join(f"{derivative_url(variant['jpeg'])} {variant['width']}w" for variant in ordered)
+    largest = ordered[-1]
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" alt="{}" class="{}" loading="{}" decoding="async"></picture>',
+        webp_srcset, sizes, derivative_url(ordered[len(ordered) // 2]['jpeg']), jpeg_srcset, sizes,
+        largest['width'], largest['width'], alt, css_class, loading,
+    )
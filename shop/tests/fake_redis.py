@@ -0,0 +1,153 @@
+"""Minimal in-process stand-in for the redis-py client used by the tests"""
+from redis.exceptions import WatchError
+import threading
+
+
+class FakePubSub:
+
+    def __init__(self, server, ignore_subscribe_messages=False):
+        self.server = server
+        self.ignore_subscribe_messages = ignore_subscribe_messages
+        self.messages = []
+
+    def subscribe(self, *channels):
+        for channel in channels:
+            self.server.subscribers.setdefault(channel, []).append(self)
+            if not self.ignore_subscribe_messages:
+                self.messages.append({'type': 'subscribe', 'channel': channel, 'data': 1})
+
+    def get_message(self, timeout=0):
+        return self.messages.pop(0) if self.messages else None
+
+
+class FakeRedis:
+    """Shares its data between every client created on the same server dict"""
+
+    def __init__(self, server=None):
+        self.server = server if server is not None else FakeRedisServer()
+
+    def publish(self, channel, message):
+        subscribers = self.server.subscribers.get(channel, [])
+        for pubsub in subscribers:
+            pubsub.messages.append({'type': 'message', 'channel': channel, 'data': message})
+        return len(subscribers)
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return FakePubSub(self.server, ignore_subscribe_messages)
+
+    # hashes, with the str replies of a decode_responses=True client
+
+    def hgetall(self, key):
+        with self.server.lock:
+            return dict(self.server.data.get(key, {}))
+
+    def hget(self, key, field):
+        with self.server.lock:
+            return self.server.data.get(key, {}).get(field)
+
+    def hset(self, key, field=None, value=None, mapping=None):
+        values = dict(mapping or {})
+        if field is not None:
+            values[field] = value
+        with self.server.lock:
+            fields = self.server.data.setdefault(key, {})
+            added = len(set(values) - set(fields))
+            fields.update({name: str(value) for name, value in values.items()})
+            self.server.touch(key)
+            return added
+
+    def hincrby(self, key, field, amount=1):
+        with self.server.lock:
+            fields = self.server.data.setdefault(key, {})
+            fields[field] = str(int(fields.get(field, 0)) + amount)
+            self.server.touch(key)
+            return int(fields[field])
+
+    def hdel(self, key, *fields):
+        with self.server.lock:
+            stored = self.server.data.get(key, {})
+            removed = [field for field in fields if stored.pop(field, None) is not None]
+            if key in self.server.data and not stored:
+                del self.server.data[key]
+            self.server.touch(key)
+            return len(removed)
+
+    def delete(self, *keys):
+        with self.server.lock:
+            for key in keys:
+                self.server.touch(key)
+            return sum(self.server.data.pop(key, None) is not None for key in keys)
+
+    def expire(self, key, seconds):
+        # keys never expire during a test
+        return key in self.server.data
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    """Queues the commands and runs them in order on execute(), all at once
+
+    After watch() the commands run immediately until multi(), and execute()
+    raises WatchError if a watched key changed since watch().
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.reset()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.reset()
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+        if not self.buffering:
+            return command
+
+        def queue(*args, **kwargs):
+            self.commands.append((command, args, kwargs))
+            return self
+        return queue
+
+    def watch(self, *keys):
+        server = self.client.server
+        with server.lock:
+            self.watched.update({key: server.versions.get(key, 0) for key in keys})
+        self.buffering = False
+
+    def unwatch(self):
+        self.watched = {}
+
+    def multi(self):
+        self.buffering = True
+
+    def reset(self):
+        self.commands = []
+        self.watched = {}
+        self.buffering = True
+
+    def execute(self):
+        server = self.client.server
+        commands, watched = self.commands, self.watched
+        self.reset()
+        with server.lock:
+            if any(server.versions.get(key, 0) != version for key, version in watched.items()):
+                raise WatchError('Watched variable changed.')
+            return [command(*args, **kwargs) for command, args, kwargs in commands]
+
+
+class FakeRedisServer:
+
+    def __init__(self):
+        self.subscribers = {}
+        self.data = {}
+        self.versions = {}      # key -> number of changes, for WATCH
+        # reentrant: a pipeline runs its commands holding it
+        self.lock = threading.RLock()
+
+    def touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
@@ -0,0 +1,150 @@
+from django.urls import reverse
+from decimal import Decimal
+
+from shop.tests.test_base_setup import ShopTestBase
+
+
+class OrderAdminTotalTest(ShopTestBase):
+
+    def setUp(self):
+        super().setUp()
+        from shop.models import Order, OrderItem
+        from django.contrib.auth.models import User
+        self.small = Order.objects.create(user=self.user, total_price=Decimal('2000.00'))
+        OrderItem.objects.create(order=self.small, product=self.product, quantity=2, price=Decimal('1000.00'))
+        self.large = Order.objects.create(user=self.user, total_price=Decimal('60000.00'))
+        for _ in range(3):
+            OrderItem.objects.create(order=self.large, product=self.product, quantity=20, price=Decimal('1000.00'))
+        self.empty = Order.objects.create(user=self.user, total_price=Decimal('0'))
+        User.objects.create_superuser(username='boss', password=self.raw_pasword)
+        self.client.login(username='boss', password=self.raw_pasword)
+
+    def changelist(self, **params):
+        return self.client.get(reverse('admin:shop_order_changelist'), params)
+
+    def test_totals_are_computed_by_the_database(self):
+        orders = list(self.changelist().context['cl'].result_list)
+        totals = {order.pk: order.items_total for order in orders}
+        self.assertEqual(totals, {self.small.pk: Decimal('2000'), self.large.pk: Decimal('60000'), self.empty.pk: 0})
+
+    def test_totals_are_sortable(self):
+        # 'get_total' is the 5th column of list_display
+        orders = list(self.changelist(o='-5').context['cl'].result_list)
+        self.assertEqual([order.pk for order in orders], [self.large.pk, self.small.pk, self.empty.pk])
+
+    def test_totals_are_range_filterable(self):
+        orders = list(self.changelist(total_range='high').context['cl'].result_list)
+        self.assertEqual([order.pk for order in orders], [self.large.pk])
+        orders = list(self.changelist(total_range='low').context['cl'].result_list)
+        self.assertEqual({order.pk for order in orders}, {self.small.pk, self.empty.pk})
+
+
+class ChangelistQueryCountTest(ShopTestBase):
+    """Every changelist must cost the same number of queries whatever the number of rows"""
+
+    changelists = [
+        'admin:shop_category_changelist',
+        'admin:shop_product_changelist',
+        'admin:shop_customerprofile_changelist',
+        'admin:shop_order_changelist',
+        'admin:shop_orderitem_changelist',
+        'admin:shop_cartitem_changelist',
+        'admin:shop_wishlistitem_changelist',
+    ]
+
+    def setUp(self):
+        super().setUp()
+        from django.contrib.auth.models import User
+        User.objects.create_superuser(username='boss', password=self.raw_pasword)
+        self.client.login(username='boss', password=self.raw_pasword)
+        self.seeded = 0
+
+    def seed(self, count):
+        """Add count users, each with a category, a product, an order with two lines, a cart line and a wishlist line"""
+        from django.contrib.auth.models import User
+        from shop.models import Category, Product, Order, OrderItem, CartItem, WishlistItem
+        for index in range(self.seeded, self.seeded + count):
+            user = User.objects.create_user(username=f'customer{index}', password='x')
+            category = Category.objects.create(name=f'Category {index}')
+            product = Product.objects.create(name=f'Cookie {index}', price=Decimal('100.00'), stock=index, category=category)
+            order = Order.objects.create(user=user, total_price=Decimal('300.00'))
+            OrderItem.objects.create(order=order, product=product, quantity=1, price=Decimal('100.00'))
+            OrderItem.objects.create(order=order, product=self.product, quantity=2, price=Decimal('100.00'))
+            CartItem.objects.create(user=user, product=product, quantity=1)
+            WishlistItem.objects.create(user=user, product=product)
+        self.seeded += count
+
+    def count_queries(self, url_name):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name))
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.seed(5)
+        small = {url_name: self.count_queries(url_name) for url_name in self.changelists}
+        self.seed(40)
+        large = {url_name: self.count_queries(url_name) for url_name in self.changelists}
+        self.assertEqual(large, small)
+
+
+class BulkProductActionTest(ShopTestBase):
+
+    def setUp(self):
+        super().setUp()
+        from shop.models import Category, Product
+        from django.contrib.auth.models import User
+        self.other_category = Category.objects.create(name='Cookies')
+        self.cookie = Product.objects.create(name='Cookie', price=Decimal('333.33'), stock=5, category=self.other_category)
+        User.objects.create_superuser(username='boss', password=self.raw_pasword)
+        self.client.login(username='boss', password=self.raw_pasword)
+
+    def test_prices_of_a_category_change_in_one_update(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from shop.catalog.bulk import adjust_prices
+        from shop.models import Product
+        with CaptureQueriesContext(connection) as queries:
+            updated = adjust_prices(Product.objects.filter(category=self.other_category), percent=10)
+        self.assertEqual(updated, 1)
+        self.assertEqual(len([query for query in queries if query['sql'].startswith('UPDATE')]), 1)
+        self.cookie.refresh_from_db()
+        self.product.refresh_from_db()
+        self.assertEqual(self.cookie.price, Decimal('366.66'))
+        self.assertEqual(self.product.price, Decimal('1000.00'))
+
+    def test_price_overflow_is_refused(self):
+        from shop.catalog.bulk import adjust_prices
+        from shop.models import Product
+        with self.assertRaises(ValueError):
+            adjust_prices(Product.objects.all(), percent=1000)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('1000.00'))
+
+    def test_admin_actions_use_the_action_form(self):
+        from shop.models import Product
+        url = reverse('admin:shop_product_changelist')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(url, {
+                'action': 'adjust_prices_action', 'percent': '-50',
+                '_selected_action': [self.product.pk, self.cookie.pk],
+            })
+        self.client.post(url, {'action': 'set_stock_action', 'stock': '0', '_selected_action': [self.cookie.pk]})
+
+        self.assertEqual(
+            dict(Product.objects.values_list('name', 'price')),
+            {'Petit Beurre': Decimal('500.00'), 'Cookie': Decimal('166.67')},
+        )
+        self.assertEqual(Product.objects.get(pk=self.cookie.pk).stock, 0)
+
+    def test_catalog_caches_are_invalidated_once(self):
+        from unittest.mock import patch
+        from shop.catalog.bulk import set_stock
+        from shop.models import Product
+        with patch('shop.catalog.bulk.invalidation_bus.publish') as publish, \
+                self.captureOnCommitCallbacks(execute=True):
+            set_stock(Product.objects.all(), 12)
+        publish.assert_called_once()
+        self.assertEqual(sorted(publish.call_args.args[1]), sorted([self.product.pk, self.cookie.pk]))
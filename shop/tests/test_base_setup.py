@@ -6,7 +6,14 @@ from decimal import Decimal
 class ShopTestBase(TestCase):
     def setUp(self):
         from shop.models import Category, Product
+        from shop.catalog.facets import facet_index
         from django.contrib.auth.models import User
+        from shop.catalog.cache import catalog_cache
+        from django.core.cache import caches
+        # in-process indexes and caches outlive the rolled back test transactions
+        facet_index.invalidate()
+        catalog_cache.clear_local()
+        caches[catalog_cache.alias].clear()
         self.raw_pasword = 'Activation6421'
         self.username = 'tester'
         self.user = User.objects.create_user(username='tester', password=self.raw_pasword)
@@ -0,0 +1,121 @@
+from django.db import connection
+from django.test import SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from decimal import Decimal
+from unittest.mock import patch
+
+from shop.tests.test_base_setup import ShopTestBase
+from shop.tests.fake_redis import FakeRedis
+
+
+class MergeQuantitiesTest(SimpleTestCase):
+
+    def test_policies(self):
+        from shop.cart.cart_store import merge_quantities
+        saved, anonymous = {'1': 2, '2': 5}, {'1': 3, '3': 1}
+        self.assertEqual(merge_quantities(saved, anonymous, 'sum'), {'1': 5, '3': 1})
+        self.assertEqual(merge_quantities(saved, anonymous, 'max'), {'1': 3, '3': 1})
+        with self.assertRaises(ValueError):
+            merge_quantities(saved, anonymous, 'min')
+
+
+class CartMergeOnLoginTest(ShopTestBase):
+    """The cart filled before logging in joins the saved cart of the user"""
+
+    def setUp(self):
+        super().setUp()
+        from shop.models import Product
+        self.others = [
+            Product.objects.create(name=f'Galette {i}', price=Decimal('250.00'), stock=10, category=self.category)
+            for i in range(3)
+        ]
+
+    def fill_anonymous_cart(self, products, times=1):
+        for product in products:
+            for _ in range(times):
+                self.client.post(reverse('add-to-cart', args=[product.id]))
+
+    def log_in(self):
+        return self.client.post(reverse('login'), {'username': self.username, 'password': self.raw_pasword})
+
+    def cart_quantities(self):
+        response = self.client.get(reverse('cart'))
+        return {item['product'].id: item['quantity'] for item in response.context['cart_items']}
+
+    @override_settings(CART_STORE='db')
+    def test_db_merge_sums_quantities(self):
+        from shop.models import CartItem
+        CartItem.objects.create(user=self.user, product=self.product, quantity=2)
+        self.fill_anonymous_cart([self.product, self.others[0]], times=3)
+
+        self.log_in()
+        self.assertEqual(self.cart_quantities(), {self.product.id: 5, self.others[0].id: 3})     #type: ignore
+        self.assertFalse(CartItem.objects.filter(user__isnull=True).exists())
+
+    @override_settings(CART_STORE='db', CART_MERGE_POLICY='max')
+    def test_db_merge_max_policy(self):
+        from shop.models import CartItem
+        CartItem.objects.create(user=self.user, product=self.product, quantity=2)
+        self.fill_anonymous_cart([self.product], times=3)
+
+        self.log_in()
+        self.assertEqual(self.cart_quantities(), {self.product.id: 3})  #type: ignore
+
+    @override_settings(CART_STORE='db')
+    def test_db_merge_query_count_does_not_grow_with_cart(self):
+        from django.contrib.auth.models import User
+        from shop.cart.cart import get_cart_store
+        from django.test import RequestFactory
+        from django.contrib.sessions.backends.db import SessionStore
+
+        def merge(products):
+            self.client.logout()
+            self.fill_anonymous_cart(products)
+            request = RequestFactory().get('/')
+            request.session = SessionStore(self.client.session.session_key)
+            request.user = User.objects.get(pk=self.user.pk)
+            store = get_cart_store(request)
+            with CaptureQueriesContext(connection) as queries:
+                store.merge_anonymous('sum')
+            return len(queries)
+
+        self.assertEqual(merge([self.product]), merge(self.others + [self.product]))
+
+    @override_settings(CART_STORE='session')
+    def test_session_merge_refreshes_prices(self):
+        self.fill_anonymous_cart([self.product], times=2)
+        self.product.price = Decimal('1200.00')
+        self.product.save()
+
+        self.log_in()
+        self.assertEqual(self.client.session['cart'], {str(self.product.id): [2, 120000]})  #type: ignore
+
+    def test_auto_store_saves_the_session_cart_at_login(self):
+        from shop.models import CartItem
+        CartItem.objects.create(user=self.user, product=self.product, quantity=2)
+        self.fill_anonymous_cart([self.product, self.others[0]], times=3)
+        # the anonymous cart is in the session
+        self.assertFalse(CartItem.objects.filter(user__isnull=True).exists())
+
+        self.log_in()
+        self.assertNotIn('cart', self.client.session)
+        self.assertEqual(
+            dict(CartItem.objects.filter(user=self.user).values_list('product_id', 'quantity')),
+            {self.product.id: 5, self.others[0].id: 3},     #type: ignore
+        )
+        # found again from another browser
+        self.client.logout()
+        self.log_in()
+        self.assertEqual(self.cart_quantities(), {self.product.id: 5, self.others[0].id: 3})     #type: ignore
+
+    @override_settings(CART_STORE='redis')
+    def test_redis_merge(self):
+        redis = FakeRedis()
+        with patch('shop.cart.redis_store.get_client', return_value=redis):
+            redis.hset(f'cart:user:{self.user.pk}', mapping={str(self.product.id): 1, f'price:{self.product.id}': '900.00'})     #type: ignore
+            self.fill_anonymous_cart([self.product, self.others[1]])
+            self.log_in()
+            self.assertEqual(self.cart_quantities(), {self.product.id: 2, self.others[1].id: 1})     #type: ignore
+        self.assertEqual(list(redis.server.data), [f'cart:user:{self.user.pk}'])   #type: ignore
+        self.assertEqual(redis.hget(f'cart:user:{self.user.pk}', f'price:{self.product.id}'), '1000.00')  #type: ignore
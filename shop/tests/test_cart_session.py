@@ -0,0 +1,72 @@
+from django.core.serializers.json import DjangoJSONEncoder
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+import json
+
+from shop.tests.test_base_setup import ShopTestBase
+
+
+class CartEncodingTest(SimpleTestCase):
+    """The session holds {product_id: [quantity, price in cents]}"""
+
+    def test_round_trip(self):
+        from shop.cart.session_store import encode_cart, decode_cart
+        items = {'7': {'product_id': '7', 'quantity': 3, 'price': '1250.50'}}
+        self.assertEqual(encode_cart(items), {'7': [3, 125050]})
+        self.assertEqual(decode_cart(encode_cart(items)), items)
+
+    def test_reads_former_format(self):
+        from shop.cart.session_store import decode_cart
+        stored = {'7': {'product_id': 7, 'name': 'Petit Beurre', 'price': '1000.00', 'quantity': 5}}
+        self.assertEqual(decode_cart(stored), {'7': {'product_id': '7', 'quantity': 5, 'price': '1000.00'}})
+
+    def test_compact_payload_is_several_times_smaller(self):
+        from shop.cart.session_store import encode_cart, decode_cart
+        former = {
+            str(pid): {'product_id': str(pid), 'name': f'Biscuit {pid}', 'price': '12500.00', 'quantity': 2}
+            for pid in range(100, 130)
+        }
+        compact = encode_cart(decode_cart(former))
+        former_size = len(json.dumps(former, separators=(',', ':'), cls=DjangoJSONEncoder))
+        compact_size = len(json.dumps(compact, separators=(',', ':')))
+        self.assertGreater(former_size, 3 * compact_size)
+
+
+class CartSessionTest(ShopTestBase):
+    """The Cart writes the compact form back to the session"""
+
+    def test_add_stores_compact_form(self):
+        self.client.post(reverse('add-to-cart', args=[self.product.id]))  #type: ignore
+        self.client.post(reverse('add-to-cart', args=[self.product.id]))  #type: ignore
+        self.assertEqual(self.client.session['cart'], {str(self.product.id): [2, 100000]})    #type: ignore
+
+    def test_browsing_creates_no_session(self):
+        from django.conf import settings
+        from django.contrib.sessions.models import Session
+        response = self.client.get(reverse('cart'))
+        self.assertNotIn(settings.SESSION_COOKIE_NAME, response.cookies)
+        self.assertFalse(Session.objects.exists())
+
+        self.client.post(reverse('add-to-cart', args=[self.product.id]))  #type: ignore
+        self.assertTrue(Session.objects.exists())
+
+    def test_former_session_is_migrated_on_write(self):
+        session = self.client.session
+        session['cart'] = self.cart_data
+        session.save()
+
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['cart_count'], 5)
+        self.client.post(reverse('add-to-cart', args=[self.product.id]))  #type: ignore
+        self.assertEqual(self.client.session['cart'], {str(self.product.id): [6, 100000]})    #type: ignore
+
+    @override_settings(
+        SESSION_ENGINE='django.contrib.sessions.backends.cached_db',
+        SESSION_CACHE_ALIAS='sessions',
+    )
+    def test_cart_on_cached_db_sessions(self):
+        from django.contrib.sessions.models import Session
+        self.client.post(reverse('add-to-cart', args=[self.product.id]))  #type: ignore
+        response = self.client.get(reverse('cart'))
+        self.assertEqual(response.context['cart_count'], 1)
+        self.assertTrue(Session.objects.filter(session_key=self.client.session.session_key).exists())
@@ -0,0 +1,224 @@
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management import call_command
+from django.test import RequestFactory, override_settings
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from shop.tests.test_base_setup import ShopTestBase
+from shop.tests.fake_redis import FakeRedis
+
+
+class CartStoreConformance:
+    """Behaviour every cart store has to share, run once per backend"""
+
+    store_name = None
+
+    def setUp(self):
+        super().setUp()     #type: ignore
+        from shop.models import Product
+        self.other = Product.objects.create(name='Galette', price=Decimal('250.50'), stock=10, category=self.category)  #type: ignore
+        self.session_key = None
+
+    def make_store(self, user=None):
+        from shop.cart.cart import get_cart_store
+        request = RequestFactory().get('/')
+        request.user = user or AnonymousUser()
+        request.session = SessionStore(self.session_key)
+        with override_settings(CART_STORE=self.store_name):
+            store = get_cart_store(request)
+        # the next requests of the same visitor
+        store.session_key()
+        self.session_key = request.session.session_key
+        return store
+
+    def save_session(self, store):
+        if store.request.session.modified:
+            store.request.session.save()
+
+    def test_add_creates_and_increments(self):
+        store = self.make_store()
+        store.add(self.product.id, 2, self.product.price)   #type: ignore
+        store.add(self.product.id, 3, self.product.price)   #type: ignore
+        store.add(self.other.id, 1, self.other.price)       #type: ignore
+        self.save_session(store)
+
+        items = self.make_store().items()
+        self.assertEqual(items[str(self.product.id)]['quantity'], 5)    #type: ignore
+        self.assertEqual(Decimal(items[str(self.other.id)]['price']), Decimal('250.50'))    #type: ignore
+        self.assertEqual(items[str(self.other.id)]['product_id'], str(self.other.id))   #type: ignore
+
+    def test_substract_removes_line_at_zero(self):
+        store = self.make_store()
+        store.add(self.product.id, 2, self.product.price)   #type: ignore
+        store.add(self.product.id, -1)                      #type: ignore
+        self.assertEqual(store.items()[str(self.product.id)]['quantity'], 1)    #type: ignore
+        store.add(self.product.id, -3)                      #type: ignore
+        self.assertEqual(store.items(), {})
+
+    def test_substract_missing_line_is_ignored(self):
+        store = self.make_store()
+        store.add(self.product.id, -1)                      #type: ignore
+        self.assertEqual(store.items(), {})
+
+    def test_set_remove_and_clear(self):
+        store = self.make_store()
+        store.set(self.product.id, 4, self.product.price)   #type: ignore
+        store.set(self.other.id, 2, self.other.price)       #type: ignore
+        self.assertEqual(store.items()[str(self.product.id)]['quantity'], 4)    #type: ignore
+
+        store.set(self.product.id, 0, self.product.price)   #type: ignore
+        self.assertEqual(list(store.items()), [str(self.other.id)])     #type: ignore
+        store.remove(self.other.id)                         #type: ignore
+        self.assertEqual(store.items(), {})
+
+        store.add(self.product.id, 1, self.product.price)   #type: ignore
+        store.clear()
+        self.assertEqual(store.items(), {})
+
+    def test_carts_are_separate(self):
+        store = self.make_store()
+        store.add(self.product.id, 1, self.product.price)   #type: ignore
+        self.save_session(store)
+        first_visitor = self.session_key
+
+        self.session_key = None
+        self.assertEqual(self.make_store().items(), {})
+        self.session_key = first_visitor
+        self.assertEqual(len(self.make_store().items()), 1)
+
+    def test_cart_views(self):
+        from django.urls import reverse
+        with override_settings(CART_STORE=self.store_name):
+            self.client.post(reverse('add-to-cart', args=[self.product.id]))     #type: ignore
+            self.client.post(reverse('add-to-cart', args=[self.product.id]))     #type: ignore
+            self.client.post(reverse('substract-from-cart', args=[self.product.id]))     #type: ignore
+            self.client.post(reverse('add-to-cart', args=[self.other.id]))       #type: ignore
+            self.client.post(reverse('remove-from-cart', args=[self.other.id]))  #type: ignore
+            response = self.client.get(reverse('cart'))     #type: ignore
+        self.assertEqual(response.context['cart_count'], 1)
+        self.assertEqual(response.context['cart_total_price'], 1000)
+
+
+class SessionCartStoreTest(CartStoreConformance, ShopTestBase):
+    store_name = 'session'
+
+
+class DatabaseCartStoreTest(CartStoreConformance, ShopTestBase):
+    store_name = 'db'
+
+    def test_anonymous_lines_are_keyed_on_session(self):
+        from shop.models import CartItem
+        store = self.make_store()
+        store.add(self.product.id, 1, self.product.price)   #type: ignore
+        store.add(self.product.id, 1, self.product.price)   #type: ignore
+        item = CartItem.objects.get()
+        self.assertEqual((item.user, item.session_key, item.quantity), (None, self.session_key, 2))
+
+    def test_concurrent_add_during_substract_is_kept(self):
+        from django.db.models import F, QuerySet
+        from shop.models import CartItem
+        store = self.make_store(user=self.user)     #type: ignore
+        store.add(self.product.id, 1, self.product.price)   #type: ignore
+        update = QuerySet.update
+        calls = []
+
+        def update_then_other_request_adds(queryset, **changes):
+            updated = update(queryset, **changes)
+            if not calls:
+                # another request adds 2 after the decrement found too few
+                update(CartItem.objects.filter(user=self.user), quantity=F('quantity') + 2)     #type: ignore
+            calls.append(updated)
+            return updated
+
+        with patch.object(QuerySet, 'update', autospec=True, side_effect=update_then_other_request_adds):
+            store.add(self.product.id, -1)      #type: ignore
+        self.assertEqual(calls, [0, 1])
+        self.assertEqual(store.items()[str(self.product.id)]['quantity'], 2)   #type: ignore
+
+    def test_every_change_bumps_version(self):
+        store = self.make_store(user=self.user)     #type: ignore
+        store.add(self.product.id, 2, self.product.price)   #type: ignore
+        store.add(self.product.id, -1)                      #type: ignore
+        store.set(self.product.id, 5, self.product.price)   #type: ignore
+        self.assertEqual(store.items()[str(self.product.id)]['version'], 2)    #type: ignore
+
+    def test_set_with_version_is_compare_and_set(self):
+        store = self.make_store(user=self.user)     #type: ignore
+        store.add(self.product.id, 1, self.product.price)   #type: ignore
+        seen = store.items()[str(self.product.id)]['version']  #type: ignore
+        # another tab adds one meanwhile
+        store.add(self.product.id, 1, self.product.price)   #type: ignore
+
+        self.assertFalse(store.set(self.product.id, 4, self.product.price, version=seen))    #type: ignore
+        self.assertEqual(store.items()[str(self.product.id)]['quantity'], 2)   #type: ignore
+        fresh = store.items()[str(self.product.id)]['version']     #type: ignore
+        self.assertTrue(store.set(self.product.id, 4, self.product.price, version=fresh))    #type: ignore
+        self.assertEqual(store.items()[str(self.product.id)]['quantity'], 4)   #type: ignore
+
+    def test_removing_a_line_removed_elsewhere_is_no_conflict(self):
+        store = self.make_store(user=self.user)     #type: ignore
+        store.add(self.product.id, 1, self.product.price)   #type: ignore
+        store.add(self.other.id, 1, self.other.price)       #type: ignore
+        versions = {product_id: line['version'] for product_id, line in store.items().items()}
+        store.remove(self.product.id)       #type: ignore
+        store.add(self.other.id, 1)         #type: ignore
+
+        conflicts = store.set_many(
+            {str(self.product.id): (0, self.product.price), str(self.other.id): (0, self.other.price)},    #type: ignore
+            versions,
+        )
+        self.assertEqual(conflicts, [str(self.other.id)])   #type: ignore
+        self.assertEqual(list(store.items()), [str(self.other.id)])     #type: ignore
+
+
+class RedisCartStoreTest(CartStoreConformance, ShopTestBase):
+    store_name = 'redis'
+
+    def setUp(self):
+        super().setUp()
+        self.redis = FakeRedis()
+        patcher = patch('shop.cart.redis_store.get_client', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_one_hash_per_cart(self):
+        store = self.make_store(user=self.user)             #type: ignore
+        store.add(self.product.id, 2, self.product.price)   #type: ignore
+        self.assertEqual(
+            self.redis.hgetall(f'cart:user:{self.user.pk}'),    #type: ignore
+            {str(self.product.id): '2', f'price:{self.product.id}': '1000.00'},     #type: ignore
+        )
+
+    def test_concurrent_add_during_substract_is_kept(self):
+        store = self.make_store(user=self.user)             #type: ignore
+        store.add(self.product.id, 1, self.product.price)   #type: ignore
+        key, hget = f'cart:user:{self.user.pk}', self.redis.hget  #type: ignore
+        reads = []
+
+        def hget_then_other_request_adds(*args):
+            value = hget(*args)
+            if not reads:
+                # another request adds 2 between the read and the write
+                FakeRedis(self.redis.server).hincrby(key, str(self.product.id), 2)     #type: ignore
+            reads.append(value)
+            return value
+
+        with patch.object(self.redis, 'hget', side_effect=hget_then_other_request_adds):
+            store.add(self.product.id, -1)      #type: ignore
+        self.assertEqual(reads, ['1', '3'])
+        self.assertEqual(self.redis.hget(key, str(self.product.id)), '2')    #type: ignore
+
+
+class CartStoreBenchmarkTest(ShopTestBase):
+    """benchmark_cart_stores runs against every store"""
+
+    def test_reports_every_store(self):
+        stdout = StringIO()
+        with patch('shop.cart.redis_store.get_client', return_value=FakeRedis()), \
+                override_settings(CART_REDIS_URL='redis://stand-in'):
+            call_command('benchmark_cart_stores', requests=20, stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual([line.split()[0] for line in lines], ['session', 'db', 'redis'])
+        self.assertTrue(all('requests/s' in line for line in lines))
@@ -0,0 +1,123 @@
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import RequestFactory, override_settings
+from decimal import Decimal
+from unittest.mock import patch
+import random
+
+from shop.tests.test_base_setup import ShopTestBase
+from shop.tests.fake_redis import FakeRedis
+
+
+class CartTotalsTest(ShopTestBase):
+    """len() and get_total_price() come from the stored totals, which have to
+    match a full recomputation after any sequence of changes
+    """
+
+    PRICES = ['0.10', '0.20', '0.30', '19.99', '250.50', '1234.55']
+
+    def setUp(self):
+        super().setUp()
+        from shop.models import Product
+        self.products = [
+            Product.objects.create(name=f'Biscuit {price}', price=Decimal(price), stock=100, category=self.category)
+            for price in self.PRICES
+        ]
+        self.session_key = None
+
+    def make_cart(self, user=None):
+        from shop.cart.cart import Cart
+        request = RequestFactory().get('/')
+        request.user = user or AnonymousUser()
+        request.session = SessionStore(self.session_key)
+        cart = Cart(request)
+        cart.store.session_key()
+        self.session_key = request.session.session_key
+        return cart
+
+    def end_request(self, cart):
+        if cart.session.modified:
+            cart.session.save()
+
+    def assert_totals_match(self, cart):
+        from shop.cart.cart import compute_totals
+        expected = compute_totals(cart.store.items().values())
+        self.assertEqual((len(cart), cart.get_total_price()), expected)
+        self.assertIsInstance(cart.get_total_price(), Decimal)
+
+    def run_random_changes(self, seed, user=None):
+        rng = random.Random(seed)
+        cart = self.make_cart(user)
+        for step in range(60):
+            product = rng.choice(self.products)
+            operation = rng.choice(['add', 'add', 'substract', 'remove', 'set', 'clear', 'new request', 'new price'])
+            if operation == 'add':
+                cart.add_item(product, rng.randint(1, 5))
+            elif operation == 'substract':
+                cart.substract_number_of_item(product, rng.randint(1, 5))
+            elif operation == 'remove':
+                cart.remove_item(product.id)
+            elif operation == 'set':
+                cart.set_quantities({p: rng.randint(0, 4) for p in rng.sample(self.products, 2)})
+            elif operation == 'clear' and rng.random() < 0.3:
+                cart.clear()
+            elif operation in ('new request', 'new price'):
+                self.end_request(cart)
+                if operation == 'new price':
+                    product.price = Decimal(rng.choice(self.PRICES)) + Decimal(rng.randint(0, 99)) / 100
+                    product.save()
+                cart = self.make_cart(user)
+            with self.subTest(seed=seed, step=step, operation=operation):
+                self.assert_totals_match(cart)
+
+    def test_session_cart(self):
+        for seed in range(5):
+            self.session_key = None
+            self.run_random_changes(seed)
+
+    @override_settings(CART_STORE='db')
+    def test_db_cart(self):
+        for seed in range(3):
+            self.session_key = None
+            self.run_random_changes(seed)
+        self.run_random_changes(3, user=self.user)
+
+    @override_settings(CART_STORE='redis')
+    def test_redis_cart(self):
+        with patch('shop.cart.redis_store.get_client', return_value=FakeRedis()):
+            self.run_random_changes(0)
+            self.run_random_changes(1, user=self.user)
+
+    def test_totals_are_decimal_exact(self):
+        cart = self.make_cart()
+        cart.add_item(self.products[0], 1)
+        cart.add_item(self.products[1], 1)
+        self.assertEqual(cart.get_total_price(), Decimal('0.30'))
+        self.assertEqual(cart.session['cart_totals'], {'store': 'session', 'count': 2, 'subtotal': '0.30'})
+
+    @override_settings(CART_STORE='db')
+    def test_db_cart_follows_price_changes(self):
+        cart = self.make_cart()
+        cart.add_item(self.products[3], 2)
+        self.end_request(cart)
+        self.products[3].price = Decimal('25.00')
+        self.products[3].save()
+
+        cart = self.make_cart()
+        self.assertEqual(cart.get_total_price(), Decimal('50.00'))
+
+    @override_settings(CART_STORE='db')
+    def test_user_cart_changed_from_another_session(self):
+        cart = self.make_cart(self.user)
+        cart.add_item(self.products[3], 2)
+        self.end_request(cart)
+
+        # another device of the same user
+        other_key, self.session_key = self.session_key, None
+        other = self.make_cart(self.user)
+        other.add_item(self.products[3], 1)
+        self.end_request(other)
+
+        self.session_key = other_key
+        cart = self.make_cart(self.user)
+        self.assertEqual((len(cart), cart.get_total_price()), (3, Decimal('59.97')))
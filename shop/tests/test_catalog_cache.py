@@ -0,0 +1,209 @@
+from django.test import SimpleTestCase
+from django.core.cache import caches
+from django.db import connection, OperationalError
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from unittest.mock import patch, MagicMock, PropertyMock
+import threading
+import time
+
+from shop.tests.test_base_setup import ShopTestBase
+
+
+class LocalLRUCacheTest(SimpleTestCase):
+
+    def test_least_recently_used_entry_is_evicted(self):
+        from shop.catalog.cache import LocalLRUCache
+        cache = LocalLRUCache(max_entries=2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+        cache.set('c', 3, 60)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_expired_entry_is_dropped(self):
+        from shop.catalog.cache import LocalLRUCache
+        cache = LocalLRUCache()
+        with patch('shop.catalog.cache.time.monotonic', return_value=100):
+            cache.set('a', 1, 10)
+        with patch('shop.catalog.cache.time.monotonic', return_value=111):
+            self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+
+class TieredCacheTest(SimpleTestCase):
+    """The 'catalog' LocMem cache stands in for the shared Redis tier"""
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def make_node(self, **kwargs):
+        from shop.catalog.cache import TieredCache
+        return TieredCache(alias='catalog', **kwargs)
+
+    def test_reads_go_local_then_shared(self):
+        node = self.make_node()
+        self.assertIsNone(node.get('products', 'p1'))
+        node.set('products', 'p1', 'Petit Beurre')
+        self.assertEqual(node.get('products', 'p1'), 'Petit Beurre')
+
+        other_node = self.make_node()
+        self.assertEqual(other_node.get('products', 'p1'), 'Petit Beurre')
+        self.assertEqual(other_node.get('products', 'p1'), 'Petit Beurre')
+
+        self.assertEqual(node.stats()['local_hits'], 1)
+        self.assertEqual(node.stats()['misses'], 1)
+        self.assertEqual(other_node.stats()['shared_hits'], 1)
+        self.assertEqual(other_node.stats()['local_hits'], 1)
+
+    def test_version_bump_reaches_other_nodes(self):
+        node = self.make_node(version_check_interval=0)
+        other_node = self.make_node(version_check_interval=0)
+        node.set('products', 'p1', 'old price')
+        self.assertEqual(other_node.get('products', 'p1'), 'old price')
+
+        node.bump_version('products')
+        self.assertIsNone(node.get('products', 'p1'))
+        self.assertIsNone(other_node.get('products', 'p1'))
+
+    def test_version_is_not_reread_on_every_hit(self):
+        node = self.make_node(version_check_interval=60)
+        node.set('categories', 'all', ['Biscuits'])
+        with patch.object(caches['catalog'], 'get', wraps=caches['catalog'].get) as shared_get:
+            for _ in range(10):
+                node.get('categories', 'all')
+        shared_get.assert_not_called()
+
+    def test_get_or_set_computes_once(self):
+        node = self.make_node()
+        calls = []
+        compute = lambda: calls.append(1) or 'value'
+        self.assertEqual(node.get_or_set('fragments', 'card', compute), 'value')
+        self.assertEqual(node.get_or_set('fragments', 'card', compute), 'value')
+        self.assertEqual(len(calls), 1)
+
+
+class StaleWhileRevalidateTest(SimpleTestCase):
+
+    def setUp(self):
+        caches['catalog'].clear()
+
+    def make_node(self):
+        from shop.catalog.cache import TieredCache
+        return TieredCache(alias='catalog', local_timeout=0)
+
+    def test_stale_value_is_served_while_lock_is_held(self):
+        node = self.make_node()
+        node.get_or_compute('products', 'p1', lambda: 'old', soft_timeout=10, hard_timeout=60)
+        node.shared.add(node._lock_key('products', 'p1'), 'other-node', 30)
+        calls = []
+        with patch('shop.catalog.cache.time.time', return_value=time.time() + 20):
+            value = node.get_or_compute('products', 'p1', lambda: calls.append(1) or 'new')
+        self.assertEqual(value, 'old')
+        self.assertEqual(calls, [])
+        self.assertEqual(node.stats()['stale_hits'], 1)
+
+    def test_stale_value_is_recomputed_by_lock_owner(self):
+        node = self.make_node()
+        node.get_or_compute('products', 'p1', lambda: 'old', soft_timeout=10, hard_timeout=60)
+        with patch('shop.catalog.cache.time.time', return_value=time.time() + 20):
+            self.assertEqual(node.get_or_compute('products', 'p1', lambda: 'new'), 'new')
+        self.assertEqual(node.get_or_compute('products', 'p1', lambda: 'newer'), 'new')
+        self.assertIsNone(node.shared.get(node._lock_key('products', 'p1')))
+
+    def test_timed_out_wait_leaves_the_lock_of_its_owner(self):
+        node = self.make_node()
+        node.wait_timeout = 0.1
+        node.shared.add(node._lock_key('products', 'p1'), 'other-worker', 30)
+        self.assertEqual(node.get_or_compute('products', 'p1', lambda: 'computed'), 'computed')
+        self.assertEqual(node.shared.get(node._lock_key('products', 'p1')), 'other-worker')
+
+    def test_expired_lock_taken_over_is_not_released(self):
+        node = self.make_node()
+
+        def compute():
+            # the lock expired during a slow compute and another worker took it
+            node.shared.set(node._lock_key('products', 'p1'), 'other-worker', 30)
+            return 'slow'
+
+        self.assertEqual(node.get_or_compute('products', 'p1', compute), 'slow')
+        self.assertEqual(node.shared.get(node._lock_key('products', 'p1')), 'other-worker')
+
+    def test_lock_outlives_a_version_bump(self):
+        node = self.make_node()
+        token = node._acquire_recompute_lock('products', 'p1')
+        node.bump_version('products')
+        self.assertIsNone(node._acquire_recompute_lock('products', 'p1'))
+        node._release_recompute_lock('products', 'p1', token)
+        self.assertIsNotNone(node._acquire_recompute_lock('products', 'p1'))
+
+    def test_redis_lock_is_released_by_a_script(self):
+        from django.core.cache.backends.redis import RedisCache
+        from shop.catalog.cache import TieredCache, RELEASE_LOCK_SCRIPT
+        node = self.make_node()
+        shared = RedisCache('redis://localhost:6379/0', {'KEY_PREFIX': 'biscuitshop'})
+        client = MagicMock()
+        with patch.object(TieredCache, 'shared', new_callable=PropertyMock, return_value=shared), \
+                patch.object(shared._cache, 'get_client', return_value=client):
+            node._release_recompute_lock('products', 'p1', 'token')
+        client.eval.assert_called_once_with(
+            RELEASE_LOCK_SCRIPT, 1, 'biscuitshop:1:catalog:products:lock:p1', shared._cache._serializer.dumps('token'),
+        )
+        client.get.assert_not_called()
+        client.delete.assert_not_called()
+
+    def test_stale_value_is_served_when_database_fails(self):
+        node = self.make_node()
+        node.get_or_compute('products', 'p1', lambda: 'old', soft_timeout=10, hard_timeout=60)
+
+        def compute():
+            raise OperationalError('database is locked')
+
+        with patch('shop.catalog.cache.time.time', return_value=time.time() + 20):
+            self.assertEqual(node.get_or_compute('products', 'p1', compute), 'old')
+
+    def test_concurrent_cold_misses_compute_once(self):
+        node = self.make_node()
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            time.sleep(0.2)
+            return 'value'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(node.get_or_compute('listings', 'page:1', compute)))
+                   for _ in range(5)]
+        threads[0].start()
+        started.wait(1)
+        for thread in threads[1:]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ['value'] * 5)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(node.stats()['coalesced'], 4)
+
+
+class CatalogCacheViewTest(ShopTestBase):
+
+    def test_product_detail_is_served_from_cache(self):
+        url = reverse('product-detail', args=[self.product.id])     #type: ignore
+        self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse([query for query in queries.captured_queries if 'shop_product' in query['sql']])
+
+    def test_product_change_invalidates_cached_detail(self):
+        url = reverse('product-detail', args=[self.product.id])     #type: ignore
+        self.client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.name = 'Grand Beurre'
+            self.product.save()
+        self.assertIn('Grand Beurre', self.client.get(url).json()['html'])
@@ -0,0 +1,85 @@
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from decimal import Decimal
+from pathlib import Path
+from unittest.mock import patch
+import tempfile
+import csv
+import io
+
+from shop.tests.test_base_setup import ShopTestBase
+
+
+class CsvExportTest(ShopTestBase):
+
+    def setUp(self):
+        super().setUp()
+        from shop.models import Product
+        from django.contrib.auth.models import User
+        for index in range(5):
+            Product.objects.create(name=f'Cookie {index}', price=Decimal('500.00'), stock=10, category=self.category)
+        self.staff_user = User.objects.create_superuser(username='boss', password=self.raw_pasword)
+        self.client.login(username='boss', password=self.raw_pasword)
+
+    def export(self, **data):
+        from shop.models import Product
+        return self.client.post(reverse('admin:shop_product_changelist'), {
+            'action': 'export_as_csv',
+            '_selected_action': list(Product.objects.values_list('pk', flat=True)),
+            **data,
+        })
+
+    def test_export_is_streamed(self):
+        response = self.export()
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(io.StringIO(b''.join(response.streaming_content).decode())))     #type: ignore
+        self.assertEqual(rows[0][:3], ['id', 'name', 'sku'])
+        self.assertEqual(len(rows), 7)
+        self.assertIn('Biscuits', rows[1])
+
+    def test_foreign_keys_are_resolved_in_batches(self):
+        from shop.exports.csv_export import iter_rows
+        from shop.models import Product
+        with CaptureQueriesContext(connection) as queries:
+            rows = list(iter_rows(Product.objects.all(), chunk_size=2))
+        self.assertEqual(len(rows), 7)
+        # one query for the rows and one per chunk of 2 rows for the categories
+        self.assertEqual(len(queries), 1 + 3)
+
+    def test_related_objects_are_printed_without_extra_queries(self):
+        from shop.exports.csv_export import iter_rows
+        from shop.models import Order, OrderItem, Product
+        for product in Product.objects.all():
+            order = Order.objects.create(user=self.user, total_price=Decimal('1000.00'))
+            OrderItem.objects.create(order=order, product=product, quantity=2, price=Decimal('500.00'))
+
+        with CaptureQueriesContext(connection) as queries:
+            # the CSV writer prints every value
+            rows = [[str(value) for value in row] for row in iter_rows(OrderItem.objects.all())]
+        self.assertEqual(len(rows), 7)
+        self.assertIn(f'Order of {self.user.username}', rows[1])
+        # the rows, then the orders with their users and the products with their categories
+        self.assertEqual(len(queries), 3)
+
+    def test_large_export_runs_in_background(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CSV_EXPORT={'BACKGROUND_THRESHOLD': 3, 'DIR': Path(directory)}), \
+                patch('shop.exports.csv_export.threading.Thread') as thread:
+            response = self.export()
+            self.assertEqual(response.status_code, 302)
+            # run the export in the test thread, which sees the test transaction
+            queryset, path = thread.call_args.kwargs['args']
+            from shop.exports.csv_export import write_csv
+            write_csv(queryset, path)
+
+            download = self.client.get(reverse('admin:csv_export_download', args=[path.stem]))
+            self.assertEqual(download.status_code, 200)
+            self.assertIn(b'Cookie 4', b''.join(download.streaming_content))     #type: ignore
+
+    def test_unfinished_export_redirects(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(CSV_EXPORT={'DIR': Path(directory)}):
+            response = self.client.get(reverse('admin:csv_export_download', args=['0' * 32]))
+        self.assertEqual(response.status_code, 302)
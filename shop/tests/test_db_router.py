@@ -0,0 +1,135 @@
+from django.http import HttpResponse
+from django.test import SimpleTestCase, RequestFactory, override_settings
+
+from shop.tests.test_base_setup import ShopTestBase
+
+REPLICA = {
+    'ALIAS': 'replica',
+    'MODELS': ['shop.product', 'shop.category'],
+    'STICKY_SECONDS': 5,
+    'COOKIE_NAME': 'db_pin',
+}
+
+
+@override_settings(DATABASE_REPLICA=REPLICA)
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    """Catalog reads go to the replica until the context writes"""
+
+    def setUp(self):
+        from biscuitshop.routers import PrimaryReplicaRouter, start_context, end_context
+        self.router = PrimaryReplicaRouter()
+        tokens = start_context()
+        self.addCleanup(end_context, tokens)
+
+    def test_catalog_reads_go_to_replica(self):
+        from shop.models import Product, Category
+        self.assertEqual(self.router.db_for_read(Product), 'replica')
+        self.assertEqual(self.router.db_for_read(Category), 'replica')
+
+    def test_other_reads_and_writes_go_to_primary(self):
+        from shop.models import Product, CartItem, Order
+        from django.contrib.sessions.models import Session
+        self.assertEqual(self.router.db_for_read(CartItem), 'default')
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+        self.assertEqual(self.router.db_for_read(Session), 'default')
+        self.assertEqual(self.router.db_for_write(Product), 'default')
+
+    def test_write_pins_reads_to_primary(self):
+        from shop.models import Product, Order
+        self.router.db_for_write(Order)
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_new_context_starts_unpinned(self):
+        from biscuitshop.routers import start_context, end_context
+        from shop.models import Product, Order
+        self.router.db_for_write(Order)
+        tokens = start_context()
+        try:
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+        finally:
+            end_context(tokens)
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_replica_is_never_migrated(self):
+        self.assertFalse(self.router.allow_migrate('replica', 'shop'))
+        self.assertTrue(self.router.allow_migrate('default', 'shop'))
+
+    @override_settings(DATABASE_REPLICA={**REPLICA, 'ALIAS': None})
+    def test_without_replica_everything_goes_to_primary(self):
+        from biscuitshop.routers import has_written
+        from shop.models import Product
+        self.assertEqual(self.router.db_for_read(Product), 'default')
+        self.router.db_for_write(Product)
+        self.assertFalse(has_written())
+
+
+@override_settings(DATABASE_REPLICA=REPLICA)
+class ReplicaPinningMiddlewareTest(SimpleTestCase):
+    """The pin cookie carries the read-your-writes guarantee to the next requests"""
+
+    def run_request(self, view, cookies=None):
+        from shop.middleware import ReplicaPinningMiddleware
+        request = RequestFactory().get('/')
+        request.COOKIES.update(cookies or {})
+        return ReplicaPinningMiddleware(view)(request)
+
+    def test_write_sets_pin_cookie(self):
+        from biscuitshop.routers import PrimaryReplicaRouter
+        from shop.models import Order
+
+        def view(request):
+            PrimaryReplicaRouter().db_for_write(Order)
+            return HttpResponse()
+
+        response = self.run_request(view)
+        self.assertEqual(response.cookies['db_pin']['max-age'], 5)
+
+    def test_pinned_request_reads_primary_without_extending_the_pin(self):
+        from biscuitshop.routers import PrimaryReplicaRouter
+        from shop.models import Product
+        databases = []
+
+        def view(request):
+            databases.append(PrimaryReplicaRouter().db_for_read(Product))
+            return HttpResponse()
+
+        response = self.run_request(view, cookies={'db_pin': '1'})
+        self.assertEqual(databases, ['default'])
+        self.assertNotIn('db_pin', response.cookies)
+
+        self.run_request(view)
+        self.assertEqual(databases, ['default', 'replica'])
+
+
+class RouterWriteTest(ShopTestBase):
+    """ORM writes go through db_for_write and pin the context"""
+
+    @override_settings(DATABASE_REPLICA=REPLICA)
+    def test_save_pins_following_catalog_reads(self):
+        from biscuitshop.routers import start_context, end_context, has_written
+        from shop.models import Category
+        tokens = start_context()
+        try:
+            Category.objects.create(name='Sablés')
+            self.assertTrue(has_written())
+            # read from the primary, the replica alias is not even configured here
+            self.assertTrue(Category.objects.filter(name='Sablés').exists())
+        finally:
+            end_context(tokens)
+
+    @override_settings(DATABASE_REPLICA=REPLICA)
+    def test_bulk_price_change_reads_the_primary(self):
+        from biscuitshop.routers import start_context, end_context
+        from shop.catalog.bulk import adjust_prices, set_stock
+        from shop.models import Product
+        tokens = start_context()
+        try:
+            # a read on the replica would fail, the alias is not configured here
+            self.assertEqual(adjust_prices(Product.objects.filter(pk=self.product.pk), percent=10), 1)
+        finally:
+            end_context(tokens)
+        tokens = start_context()
+        try:
+            self.assertEqual(set_stock(Product.objects.filter(pk=self.product.pk), 5), 1)
+        finally:
+            end_context(tokens)
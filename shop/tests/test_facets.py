@@ -0,0 +1,71 @@
+from django.urls import reverse
+from decimal import Decimal
+
+from shop.tests.test_base_setup import ShopTestBase
+
+
+class FacetIndexTest(ShopTestBase):
+    """Test cases for the in-memory facet index"""
+
+    def setUp(self):
+        super().setUp()
+        from shop.models import Category, Product
+        from shop.catalog.facets import facet_index
+        self.index = facet_index
+        self.cookies = Category.objects.create(name='Cookies')
+        self.cheap = Product.objects.create(name='Mini', price=Decimal('500.00'), stock=0, category=self.category)
+        self.cookie = Product.objects.create(name='Cookie', price=Decimal('2500.00'), stock=3, category=self.cookies)
+        self.luxury = Product.objects.create(name='Luxe', price=Decimal('9000.00'), stock=1, category=self.cookies)
+
+    def test_no_filter_returns_everything_newest_first(self):
+        selection = self.index.query()
+        self.assertEqual(selection.ids(), [self.luxury.id, self.cookie.id, self.cheap.id, self.product.id])     #type: ignore
+        self.assertEqual(selection.counts['availability'], {'in_stock': 3, 'out_of_stock': 1})
+
+    def test_combined_filters(self):
+        selection = self.index.query({'category': [self.cookies.id], 'availability': ['in_stock'], 'price': ['over-5000']})     #type: ignore
+        self.assertEqual(selection.ids(), [self.luxury.id])     #type: ignore
+
+    def test_values_of_one_facet_are_or_ed(self):
+        selection = self.index.query({'price': ['under-1000', 'over-5000']})
+        self.assertEqual(selection.ids(), [self.luxury.id, self.cheap.id])     #type: ignore
+
+    def test_counts_ignore_the_facet_own_selection(self):
+        selection = self.index.query({'category': [self.cookies.id]})     #type: ignore
+        # the category counts still show the alternatives...
+        self.assertEqual(selection.counts['category'], {self.category.id: 2, self.cookies.id: 2})     #type: ignore
+        # ...while the other facets are narrowed to the selected category
+        self.assertEqual(selection.counts['price'], {'under-1000': 0, '1000-5000': 1, 'over-5000': 1})
+
+    def test_index_is_patched_on_product_change(self):
+        self.index.query()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cheap.stock = 10
+            self.cheap.save()
+        self.assertIn(self.cheap.id, self.index.query({'availability': ['in_stock']}).ids())     #type: ignore
+
+        cheap_id = self.cheap.id     #type: ignore
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cheap.delete()
+        self.assertNotIn(cheap_id, self.index.query().ids())
+
+
+class FacetedProductListViewTest(ShopTestBase):
+
+    def test_filters_and_counts_in_context(self):
+        from shop.models import Product
+        Product.objects.create(name='Out', price=Decimal('200.00'), stock=0, category=self.category)
+
+        response = self.client.get(reverse('product-list'), {'availability': 'in_stock'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['products']), [self.product])
+        availability = {facet['value']: facet for facet in response.context['facets']['availability']}
+        self.assertEqual(availability['in_stock']['count'], 1)
+        self.assertEqual(availability['out_of_stock']['count'], 1)
+        self.assertTrue(availability['in_stock']['selected'])
+        self.assertEqual(response.context['filter_query'], 'availability=in_stock')
+
+    def test_category_filter_still_works(self):
+        response = self.client.get(reverse('product-list'), {'category': self.category.id})     #type: ignore
+        self.assertEqual(response.context['current_category'], self.category.id)     #type: ignore
+        self.assertEqual(list(response.context['products']), [self.product])
@@ -0,0 +1,155 @@
+from django.template import Context, Template
+from django.test import SimpleTestCase, override_settings
+from unittest.mock import patch
+
+from shop.tests.test_base_setup import ShopTestBase
+
+
+class FakeImage:
+    url = 'https://res.cloudinary.com/demo/image/upload/v1/biscuits/petit_beurre.jpg'
+
+    def __str__(self):
+        return 'biscuits/petit_beurre'
+
+
+class ResponsiveImageTagTest(SimpleTestCase):
+
+    def render(self, image):
+        template = Template('{% load cloudinary_filters %}{% responsive_image image "Petit Beurre" sizes="50vw" %}')
+        return template.render(Context({'image': image}))
+
+    @override_settings(RESPONSIVE_IMAGE_WIDTHS=[240, 480])
+    def test_srcset_lists_every_width(self):
+        html = self.render(FakeImage())
+        self.assertIn('upload/w_240,h_240,c_fill,g_auto,f_auto,q_auto/v1/biscuits/petit_beurre.jpg 240w', html)
+        self.assertIn('upload/w_480,h_480,c_fill,g_auto,f_auto,q_auto/v1/biscuits/petit_beurre.jpg 480w', html)
+        self.assertIn('sizes="50vw"', html)
+        self.assertIn('loading="lazy"', html)
+
+    def test_missing_image_falls_back_to_static_picture(self):
+        html = self.render(None)
+        self.assertIn('src="/static/images/biscuit2.jpg"', html)
+        self.assertNotIn('srcset', html)
+
+    def test_variant_urls_are_memoized(self):
+        from shop.images.responsive import variant_urls
+        variant_urls.cache_clear()
+        self.render(FakeImage())
+        self.render(FakeImage())
+        self.assertEqual(variant_urls.cache_info().hits, 1)
+
+
+class EagerTransformationTest(ShopTestBase):
+
+    @override_settings(CLOUDINARY_EAGER_TRANSFORMATIONS=True)
+    def test_new_image_requests_variants_once(self):
+        from shop.models import Product
+        with patch('shop.images.responsive.request_eager_variants_in_background') as request_variants:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.image = 'biscuits/petit_beurre'
+                self.product.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product.stock = 3
+                self.product.save()
+            with self.captureOnCommitCallbacks(execute=True):
+                Product.objects.get(pk=self.product.pk).save()
+        request_variants.assert_called_once_with('biscuits/petit_beurre')
+
+
+class DerivativePipelineTest(ShopTestBase):
+
+    def setUp(self):
+        super().setUp()
+        import tempfile
+        self.media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media_root.cleanup)
+        settings_override = override_settings(
+            MEDIA_ROOT=self.media_root.name,
+            IMAGE_DERIVATIVES={'VARIANTS': {'thumbnail': 64, 'large': 256}, 'WORKERS': 0},
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def make_image(self, color='orange', size=(400, 300)):
+        from PIL import Image
+        import io
+        output = io.BytesIO()
+        Image.new('RGB', size, color).save(output, 'PNG')
+        return output.getvalue()
+
+    def test_variants_are_written_under_content_hash_names(self):
+        from shop.images.derivatives import build_derivatives, get_storage
+        from PIL import Image
+        variants = build_derivatives(self.make_image())
+
+        self.assertEqual(set(variants), {'thumbnail', 'large'})
+        storage = get_storage()
+        with storage.open(variants['thumbnail']['webp']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (64, 64))
+        # the 300px high source is never upscaled
+        with storage.open(variants['large']['jpeg']) as large:
+            self.assertEqual(Image.open(large).size, (256, 256))
+        self.assertEqual(build_derivatives(self.make_image()), variants)
+
+    @override_settings(CLOUDINARY_STORAGE={'CLOUD_NAME': ''})
+    def test_offline_cards_use_local_variants(self):
+        from shop.images.derivatives import generate_for_product
+        from django.urls import reverse
+        variants = generate_for_product(self.product, self.make_image())
+
+        html = self.client.get(reverse('product-list')).content.decode()
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f"/media/derivatives/{variants['thumbnail']['webp']} 64w", html)
+
+    def save_in_admin(self):
+        from django.contrib import admin
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from django.test import RequestFactory
+        from shop.admin import ProductAdmin
+        from shop.models import Product
+        from types import SimpleNamespace
+        upload = SimpleUploadedFile('new.png', self.make_image(), content_type='image/png')
+        form = SimpleNamespace(
+            cleaned_data={'image': upload}, changed_data=['image'], initial={'image': 'biscuits/petit_beurre'},
+        )
+        # as the ModelForm does before save_model()
+        self.product.image = upload
+        saved = []
+        with patch.object(admin.ModelAdmin, 'save_model', lambda *args: saved.append(args[2].image)), \
+                patch('shop.admin.derivatives.generate_for_product') as generate:
+            ProductAdmin(Product, admin.site).save_model(RequestFactory().post('/'), self.product, form, True)
+        generate.assert_called_once_with(self.product, self.make_image())
+        return saved[0], upload
+
+    @override_settings(CLOUDINARY_STORAGE={'CLOUD_NAME': ''})
+    def test_offline_admin_upload_keeps_previous_image(self):
+        image, _ = self.save_in_admin()
+        self.assertEqual(image, 'biscuits/petit_beurre')
+
+    @override_settings(CLOUDINARY_STORAGE={'CLOUD_NAME': 'demo'})
+    def test_admin_upload_goes_to_cloudinary_when_configured(self):
+        image, upload = self.save_in_admin()
+        self.assertIs(image, upload)
+
+    def test_placeholder_is_inlined_in_cards(self):
+        from shop.images.derivatives import generate_for_product
+        from django.urls import reverse
+        generate_for_product(self.product, self.make_image())
+
+        self.assertTrue(self.product.image_placeholder.startswith('data:image/jpeg;base64,'))
+        self.assertLess(len(self.product.image_placeholder), 1500)
+        html = self.client.get(reverse('product-list')).content.decode()
+        self.assertIn(f"url('{self.product.image_placeholder}')", html)
+
+    def test_backfill_command_fills_missing_placeholders(self):
+        from django.core.management import call_command
+        from shop.images.derivatives import generate_for_product
+        from shop.models import Product
+        from io import StringIO
+        generate_for_product(self.product, self.make_image())
+        Product.objects.update(image_placeholder='')
+
+        call_command('backfill_image_placeholders', stdout=StringIO(), stderr=StringIO())
+
+        self.product.refresh_from_db()
+        self.assertTrue(self.product.image_placeholder.startswith('data:image/jpeg;base64,'))
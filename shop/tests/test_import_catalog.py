@@ -0,0 +1,126 @@
+from django.core.management import call_command
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+import tempfile
+import os
+
+from shop.tests.test_base_setup import ShopTestBase
+
+
+CSV_INPUT = """sku,name,description,price,stock,category
+PB-01,Petit Beurre,Butter biscuit,1100.00,80,Biscuits
+CK-01,Cookie,Chocolate chips,800,40,Cookies
+BAD-01,Broken,,not a price,-3,Biscuits
+"""
+
+
+class ImportCatalogTest(ShopTestBase):
+
+    def setUp(self):
+        super().setUp()
+        self.product.sku = 'PB-01'
+        self.product.save()
+
+    def run_import(self, content, suffix='.csv', **options):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False, encoding='utf-8') as stream:
+            stream.write(content)
+        self.addCleanup(os.unlink, stream.name)
+        stdout, stderr = StringIO(), StringIO()
+        call_command('import_catalog', stream.name, stdout=stdout, stderr=stderr, **options)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_rows_are_upserted_on_sku(self):
+        from shop.models import Product, Category
+        stdout, stderr = self.run_import(CSV_INPUT)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('1100.00'))
+        self.assertEqual(self.product.stock, 80)
+        cookie = Product.objects.get(sku='CK-01')
+        self.assertEqual(cookie.category, Category.objects.get(name='Cookies'))
+        self.assertFalse(Product.objects.filter(sku='BAD-01').exists())
+        self.assertIn('Line 3: description: This field cannot be blank.; price:', stderr)
+        self.assertIn('1 created, 1 updated, 0 unchanged, 1 rejected', stdout)
+
+    def test_dry_run_prints_diff_without_writing(self):
+        from shop.models import Product
+        stdout, _ = self.run_import(CSV_INPUT, dry_run=True)
+
+        self.assertIn('~ PB-01: description  -> Butter biscuit, price 1000.00 -> 1100.00, stock 100 -> 80', stdout)
+        self.assertIn('+ CK-01: Cookie (800)', stdout)
+        self.assertIn('New categories: Cookies', stdout)
+        self.assertFalse(Product.objects.filter(sku='CK-01').exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.price, Decimal('1000.00'))
+
+    def test_jsonl_input_in_chunks_invalidates_once(self):
+        from shop.models import Product
+        lines = '\n'.join(
+            f'{{"sku": "SKU-{index}", "name": "Biscuit {index}", "description": "Batch {index}", "price": "{index}.50", "stock": {index}, "category": "biscuits"}}'
+            for index in range(7)
+        )
+        with patch('shop.catalog.importer.invalidation_bus.publish') as publish:
+            self.run_import(lines, suffix='.jsonl', chunk_size=3)
+
+        self.assertEqual(Product.objects.filter(sku__startswith='SKU-', category=self.category).count(), 7)
+        publish.assert_called_once()
+        self.assertEqual(len(publish.call_args.args[1]), 7)
+
+    def test_bad_jsonl_lines_are_reported_and_skipped(self):
+        from shop.catalog.importer import CatalogImporter, read_rows
+        from shop.models import Product
+        row = '{"sku": "%s", "name": "Biscuit", "description": "Batch", "price": "%s", "stock": 1, "category": "Biscuits"}'
+        lines = StringIO('\n'.join([
+            row % ('SKU-1', '10.00'),
+            '{"sku": "SKU-2", "name": ',
+            '["SKU-3", "Biscuit"]',
+            row % ('SKU-1', '12.00'),
+            row % ('SKU-4', '10.00'),
+        ]))
+        report = CatalogImporter().run(read_rows(lines, 'jsonl'))
+
+        self.assertEqual([line for line, _ in report.errors], [2, 3])
+        self.assertIn('invalid JSON', report.errors[0][1])
+        self.assertEqual(report.errors[1][1], 'expected an object, got list.')
+        self.assertEqual((report.created, report.duplicates, report.total), (2, 1, 5))
+        self.assertEqual(Product.objects.get(sku='SKU-1').price, Decimal('12.00'))
+
+    def test_failed_chunk_still_invalidates_written_chunks(self):
+        from django.db import DatabaseError
+        from shop.catalog.importer import CatalogImporter
+        from shop.models import Product
+        rows = [
+            {'sku': f'SKU-{index}', 'name': f'Biscuit {index}', 'description': 'Batch',
+             'price': '10.00', 'stock': 1, 'category': 'Biscuits'}
+            for index in range(4)
+        ]
+        bulk_create = Product.objects.bulk_create
+        calls = []
+
+        def fail_second_chunk(*args, **kwargs):
+            calls.append(1)
+            if len(calls) == 2:
+                raise DatabaseError('connection lost')
+            return bulk_create(*args, **kwargs)
+
+        with patch('shop.catalog.importer.invalidation_bus.publish') as publish, \
+                patch.object(Product.objects, 'bulk_create', side_effect=fail_second_chunk):
+            with self.assertRaises(DatabaseError):
+                CatalogImporter(chunk_size=2).run(rows)
+
+        written = list(Product.objects.filter(sku__in=['SKU-0', 'SKU-1']).values_list('pk', flat=True))
+        publish.assert_called_once_with('product', written)
+
+    def test_unchanged_rows_are_not_written(self):
+        self.run_import(CSV_INPUT)
+        with patch('shop.catalog.importer.Product.objects.bulk_create') as bulk_create:
+            stdout, _ = self.run_import(CSV_INPUT)
+        bulk_create.assert_not_called()
+        self.assertIn('0 created, 0 updated, 2 unchanged', stdout)
+
+    def test_imported_products_are_searchable(self):
+        from shop.search.search import search_products
+        from shop.models import Product
+        self.run_import(CSV_INPUT)
+        self.assertEqual(search_products('chocolate'), [Product.objects.get(sku='CK-01').pk])
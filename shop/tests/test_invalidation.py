@@ -0,0 +1,79 @@
+from django.test import SimpleTestCase
+from decimal import Decimal
+from unittest.mock import patch
+
+from shop.tests.test_base_setup import ShopTestBase
+from shop.tests.fake_redis import FakeRedis, FakeRedisServer
+
+
+class PolledInvalidationBusTest(ShopTestBase):
+    """The CatalogChange table carries the events between the nodes"""
+
+    def make_node(self):
+        from shop.catalog.invalidation import PolledInvalidationBus
+        bus = PolledInvalidationBus(poll_interval=0)
+        received = []
+        bus.subscribe(lambda event, local: received.append((event['model'], event['ids'], local)))
+        bus.poll()      # a node starts from the current position of the log
+        return bus, received
+
+    def test_product_save_reaches_other_nodes(self):
+        from shop.catalog.invalidation import invalidation_bus
+        from shop.models import CatalogChange
+        other_bus, received = self.make_node()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.product.price = Decimal('1200.00')
+            self.product.save()
+
+        self.assertTrue(CatalogChange.objects.filter(model='product', object_ids=[self.product.id]).exists())     #type: ignore
+        # the event is delivered with another node id than the one of the publisher
+        with patch('shop.catalog.invalidation.NODE_ID', 'other-node'):
+            other_bus.poll()
+        self.assertEqual(received, [('product', [self.product.id], False)])     #type: ignore
+
+        # the publishing node skips its own events
+        invalidation_bus.poll()
+
+    def test_new_node_does_not_replay_history(self):
+        from shop.catalog.invalidation import NODE_ID
+        from shop.models import CatalogChange
+        CatalogChange.objects.create(model='product', object_ids=[1], origin=NODE_ID)
+        _, received = self.make_node()
+        self.assertEqual(received, [])
+
+    def test_remote_product_change_evicts_local_copy(self):
+        from shop.catalog.cache import catalog_cache
+        from shop.signals import apply_catalog_change
+        catalog_cache.local.set(catalog_cache.make_key('products', f'detail:{self.product.id}'), 'stale', 60)     #type: ignore
+
+        apply_catalog_change({'model': 'product', 'ids': [self.product.id]}, local=False)     #type: ignore
+
+        self.assertIsNone(catalog_cache.get('products', f'detail:{self.product.id}'))     #type: ignore
+
+
+class RedisInvalidationBusTest(SimpleTestCase):
+
+    def test_events_cross_nodes_over_pubsub(self):
+        from shop.catalog.invalidation import RedisInvalidationBus
+        server = FakeRedisServer()
+        publisher = RedisInvalidationBus(FakeRedis(server), poll_interval=0)
+        subscriber = RedisInvalidationBus(FakeRedis(server), poll_interval=0)
+        received = []
+        subscriber.subscribe(lambda event, local: received.append((event['model'], event['ids'], local)))
+        subscriber.poll()
+
+        with patch('shop.catalog.invalidation.NODE_ID', 'publisher-node'):
+            publisher.publish('category', [3])
+        subscriber.poll()
+
+        self.assertEqual(received, [('category', [3], False)])
+
+    def test_receive_error_resets_the_node(self):
+        from shop.catalog.invalidation import RedisInvalidationBus
+        bus = RedisInvalidationBus(FakeRedis(), poll_interval=0)
+        received = []
+        bus.subscribe(lambda event, local: received.append(event['model']))
+        with patch.object(FakeRedis, 'pubsub', side_effect=ConnectionError('redis is down')):
+            bus.poll()
+        self.assertEqual(received, ['*'])
@@ -0,0 +1,77 @@
+from django.test import SimpleTestCase
+from pathlib import Path
+import tempfile
+import gzip
+
+
+class MediaFilesTest(SimpleTestCase):
+    """biscuitshop.media.MediaFiles answers /media/ before the Django application"""
+
+    def setUp(self):
+        from biscuitshop.media import MediaFiles
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.root = Path(directory.name)
+        (self.root / 'derivatives').mkdir()
+        (self.root / 'derivatives' / '0123456789abcdef0123.jpeg').write_bytes(b'0123456789')
+        (self.root / 'notes.txt').write_text('plain text ' * 20)
+        (self.root / 'notes.txt.gz').write_bytes(gzip.compress(b'plain text ' * 20))
+        self.django_calls = []
+        self.app = MediaFiles(self.django_app, root=self.root, prefix='/media/', max_age=60)
+
+    def django_app(self, environ, start_response):
+        self.django_calls.append(environ['PATH_INFO'])
+        start_response('200 OK', [])
+        return [b'django']
+
+    def get(self, path, app=None, **headers):
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path}
+        environ.update({f'HTTP_{name.upper()}': value for name, value in headers.items()})
+        response = {}
+
+        def start_response(status, response_headers):
+            response['status'] = int(status.split()[0])
+            response['headers'] = dict(response_headers)
+
+        body = b''.join(chunk for chunk in (app or self.app)(environ, start_response))
+        return response['status'], response['headers'], body
+
+    def test_hashed_names_are_cached_forever(self):
+        status, headers, body = self.get('/media/derivatives/0123456789abcdef0123.jpeg')
+        self.assertEqual((status, body), (200, b'0123456789'))
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=31536000, immutable')
+        self.assertEqual(headers['Content-Type'], 'image/jpeg')
+        self.assertEqual(self.django_calls, [])
+
+    def test_etag_revalidation(self):
+        _, headers, _ = self.get('/media/derivatives/0123456789abcdef0123.jpeg')
+        status, _, body = self.get('/media/derivatives/0123456789abcdef0123.jpeg', if_none_match=headers['ETag'])
+        self.assertEqual((status, body), (304, b''))
+
+    def test_range_requests(self):
+        status, headers, body = self.get('/media/derivatives/0123456789abcdef0123.jpeg', range='bytes=2-5')
+        self.assertEqual((status, body), (206, b'2345'))
+        self.assertEqual(headers['Content-Range'], 'bytes 2-5/10')
+        status, _, body = self.get('/media/derivatives/0123456789abcdef0123.jpeg', range='bytes=-3')
+        self.assertEqual((status, body), (206, b'789'))
+        status, _, _ = self.get('/media/derivatives/0123456789abcdef0123.jpeg', range='bytes=20-')
+        self.assertEqual(status, 416)
+
+    def test_precompressed_sibling_and_plain_cache(self):
+        status, headers, body = self.get('/media/notes.txt', accept_encoding='gzip, deflate')
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), b'plain text ' * 20)
+        self.assertEqual(headers['Cache-Control'], 'public, max-age=60')
+
+    def test_missing_and_escaping_paths(self):
+        self.assertEqual(self.get('/media/missing.jpeg')[0], 404)
+        self.assertEqual(self.get('/media/../etc/passwd')[0], 404)
+        self.assertEqual(self.get('/products/')[2], b'django')
+
+    def test_x_accel_redirect_offload(self):
+        from biscuitshop.media import MediaFiles
+        app = MediaFiles(self.django_app, root=self.root, prefix='/media/', offload='x-accel-redirect')
+        status, headers, body = self.get('/media/derivatives/0123456789abcdef0123.jpeg', app=app)
+        self.assertEqual((status, body), (200, b''))
+        self.assertEqual(headers['X-Accel-Redirect'], '/protected-media/derivatives/0123456789abcdef0123.jpeg')
@@ -9,11 +9,11 @@ from shop.tests.test_base_setup import ShopTestBase
 class CheckoutViewTests(ShopTestBase):
     def setUp(self):
         super().setUp()
-        self.client.login(username=self.user.username, password=self.raw_pasword)
-        
+        # filled before logging in, the cart joins the saved cart of the user
         session = self.client.session
         session['cart'] = self.cart_data
         session.save()
+        self.client.login(username=self.user.username, password=self.raw_pasword)
         
 
 
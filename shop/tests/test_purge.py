@@ -0,0 +1,68 @@
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.utils import timezone
+from datetime import timedelta
+from io import StringIO
+
+from shop.tests.test_base_setup import ShopTestBase
+
+
+class PurgeCommandTest(ShopTestBase):
+    """purge_sessions deletes what no visitor can come back to"""
+
+    def setUp(self):
+        super().setUp()
+        from shop.models import CartItem, WishlistItem, Product
+        from django.contrib.auth.models import User
+        self.live = self.make_session(timedelta(days=1))
+        self.expired = [self.make_session(timedelta(days=-1)) for _ in range(5)]
+        other = Product.objects.create(name='Galette', price=500, stock=3, category=self.category)
+
+        self.kept = [
+            CartItem.objects.create(session_key=self.live, product=self.product),
+            # a logged-in user's cart survives its sessions
+            CartItem.objects.create(user=self.user, session_key=self.expired[0], product=self.product),
+        ]
+        self.orphans = [
+            CartItem.objects.create(session_key=self.expired[1], product=self.product),
+            CartItem.objects.create(session_key='gone', product=other),
+            CartItem.objects.create(session_key=None, product=other),
+        ]
+        inactive = User.objects.create_user(username='gone', password='x', is_active=False)
+        WishlistItem.objects.create(user=self.user, product=self.product)
+        WishlistItem.objects.create(user=inactive, product=self.product)
+
+    def make_session(self, expires_in):
+        store = SessionStore()
+        store.create()
+        Session.objects.filter(session_key=store.session_key).update(expire_date=timezone.now() + expires_in)
+        return store.session_key
+
+    def run_purge(self, *args):
+        stdout = StringIO()
+        call_command('purge_sessions', '--chunk-size', '2', '--sleep', '0', *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_purges_expired_sessions_and_orphan_cart_items(self):
+        from shop.models import CartItem, WishlistItem
+        output = self.run_purge()
+
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [self.live])
+        self.assertCountEqual(CartItem.objects.all(), self.kept)
+        self.assertEqual(WishlistItem.objects.count(), 2)
+        self.assertIn("5 sessions, 3 cart items and 0 wishlist items purged", output)
+        # one progress line per chunk
+        self.assertIn("Sessions: 2 expired sessions purged", output)
+
+    def test_inactive_wishlists_are_opt_in(self):
+        from shop.models import WishlistItem
+        self.run_purge('--inactive-wishlists')
+        self.assertEqual(list(WishlistItem.objects.values_list('user', flat=True)), [self.user.pk])
+
+    def test_dry_run_deletes_nothing(self):
+        from shop.models import CartItem
+        output = self.run_purge('--dry-run')
+        self.assertEqual(Session.objects.count(), 6)
+        self.assertEqual(CartItem.objects.count(), 5)
+        self.assertIn("5 sessions, 3 cart items and 0 wishlist items would be purged", output)
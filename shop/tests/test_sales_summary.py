@@ -0,0 +1,73 @@
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from decimal import Decimal
+from io import StringIO
+
+from shop.tests.test_base_setup import ShopTestBase
+
+
+class SalesSummaryTest(ShopTestBase):
+
+    def create_order(self, total, status='pending'):
+        from shop.models import Order
+        return Order.objects.create(user=self.user, total_price=Decimal(total), status=status)
+
+    def summary_rows(self):
+        from shop.models import SalesSummary
+        return {
+            row.status: (row.order_count, row.total_sales)
+            for row in SalesSummary.objects.all()
+            if row.order_count
+        }
+
+    def test_status_transitions_move_the_order(self):
+        order = self.create_order('1500.00')
+        self.create_order('500.00', status='completed')
+        self.assertEqual(self.summary_rows(), {'pending': (1, Decimal('1500.00')), 'completed': (1, Decimal('500.00'))})
+
+        order.status = 'completed'
+        order.save()
+        self.assertEqual(self.summary_rows(), {'completed': (2, Decimal('2000.00'))})
+
+        order.delete()
+        self.assertEqual(self.summary_rows(), {'completed': (1, Decimal('500.00'))})
+
+    def test_header_stats_count_completed_sales(self):
+        from shop.sales.summary import get_header_stats
+        self.create_order('1500.00', status='completed')
+        self.create_order('700.00', status='failed')
+        self.assertEqual(get_header_stats(), {'order_count': 2, 'total_sales': Decimal('1500.00')})
+
+    def test_header_stats_follow_transitions(self):
+        from shop.sales.summary import get_header_stats
+        order = self.create_order('1500.00')
+        self.create_order('500.00', status='completed')
+        order.status = 'completed'
+        order.save()
+        self.assertEqual(get_header_stats(), {'order_count': 2, 'total_sales': Decimal('2000.00')})
+        order.delete()
+        self.assertEqual(get_header_stats(), {'order_count': 1, 'total_sales': Decimal('500.00')})
+
+    def test_header_stats_read_one_row(self):
+        from shop.sales.summary import get_header_stats
+        self.create_order('1500.00', status='completed')
+        with CaptureQueriesContext(connection) as queries:
+            get_header_stats()
+        self.assertEqual(len(queries), 1)
+        sql = queries.captured_queries[0]['sql']
+        self.assertIn('shop_salestotals', sql)
+        self.assertNotIn('SUM(', sql.upper())
+
+    def test_rebuild_command_matches_incremental_summary(self):
+        from shop.models import SalesSummary, SalesTotals
+        from shop.sales.summary import get_header_stats
+        for total, status in [('100.00', 'pending'), ('200.00', 'completed'), ('300.00', 'completed')]:
+            self.create_order(total, status)
+        expected, expected_stats = self.summary_rows(), get_header_stats()
+        SalesSummary.objects.all().delete()
+        SalesTotals.objects.all().delete()
+        call_command('rebuild_sales_summary', chunk_size=2, stdout=StringIO())
+
+        self.assertEqual(self.summary_rows(), expected)
+        self.assertEqual(get_header_stats(), expected_stats)
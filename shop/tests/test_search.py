@@ -0,0 +1,109 @@
+from django.db import connection
+from django.urls import reverse
+from decimal import Decimal
+from unittest import skipUnless
+
+from shop.tests.test_base_setup import ShopTestBase
+
+
+class SearchBackendTestMixin:
+    """Behaviour shared by every search backend"""
+
+    def get_backend(self):
+        raise NotImplementedError
+
+    def setUp(self):
+        super().setUp()     #type: ignore
+        from shop.models import Product
+        self.chocolate = Product.objects.create(
+            name='Cookie Chocolat', description='Pépites de chocolat noir',
+            price=Decimal('1500.00'), stock=10, category=self.category     #type: ignore
+        )
+        self.vanilla = Product.objects.create(
+            name='Sablé Vanille', description='Un sablé qui sent bon le chocolat chaud',
+            price=Decimal('1200.00'), stock=10, category=self.category     #type: ignore
+        )
+        self.backend = self.get_backend()
+
+    def test_every_term_must_match(self):
+        self.assertEqual(self.backend.search('chocolat noir'), [self.chocolate.id])     #type: ignore
+
+    def test_last_term_is_a_prefix(self):
+        self.assertEqual(self.backend.search('vani'), [self.vanilla.id])     #type: ignore
+
+    def test_accents_are_folded(self):
+        self.assertEqual(self.backend.search('sable'), [self.vanilla.id])     #type: ignore
+        self.assertIn(self.chocolate.id, self.backend.search('pepites'))     #type: ignore
+
+    def test_name_hits_rank_first(self):
+        results = self.backend.search('chocolat')
+        self.assertEqual(results, [self.chocolate.id, self.vanilla.id])     #type: ignore
+
+    def test_index_follows_product_changes(self):
+        self.vanilla.name = 'Sablé Citron'
+        self.vanilla.save()
+        self.assertEqual(self.backend.search('citron'), [self.vanilla.id])     #type: ignore
+        self.assertEqual(self.backend.search('vanille'), [])
+
+        chocolate_id = self.chocolate.id     #type: ignore
+        self.chocolate.delete()
+        self.assertNotIn(chocolate_id, self.backend.search('chocolat'))
+
+    def test_empty_query(self):
+        self.assertEqual(self.backend.search('  '), [])
+
+
+@skipUnless(connection.vendor == 'sqlite', 'FTS5 needs SQLite')
+class Fts5SearchBackendTest(SearchBackendTestMixin, ShopTestBase):
+
+    def get_backend(self):
+        from shop.search.fts5_backend import Fts5SearchBackend
+        return Fts5SearchBackend()
+
+
+@skipUnless(connection.vendor == 'postgresql', 'tsvector search needs PostgreSQL')
+class PostgresSearchBackendTest(SearchBackendTestMixin, ShopTestBase):
+
+    def get_backend(self):
+        from shop.search.postgres_backend import PostgresSearchBackend
+        from shop.search import search
+        backend = PostgresSearchBackend()
+        # route the Product signals to this instance for the duration of the test
+        previous, search._backend = search._backend, backend
+        self.addCleanup(setattr, search, '_backend', previous)
+        return backend
+
+
+class InMemorySearchBackendTest(SearchBackendTestMixin, ShopTestBase):
+
+    def get_backend(self):
+        from shop.search.memory_backend import InMemorySearchBackend
+        from shop.search import search
+        backend = InMemorySearchBackend()
+        backend.rebuild()
+        # route the Product signals to this instance for the duration of the test
+        previous, search._backend = search._backend, backend
+        self.addCleanup(setattr, search, '_backend', previous)
+        return backend
+
+
+class SearchViewTest(ShopTestBase):
+
+    def test_search_renders_ranked_results(self):
+        response = self.client.get(reverse('search'), {'q': 'beurre'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTemplateUsed(response, 'shop/products.html')
+        self.assertEqual(list(response.context['products']), [self.product])
+        self.assertEqual(response.context['query'], 'beurre')
+
+    def test_search_json_for_ajax(self):
+        response = self.client.get(reverse('search'), {'q': 'petit'}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        data = response.json()
+        self.assertTrue(data['success'])
+        self.assertEqual(data['count'], 1)
+        self.assertEqual(data['results'][0]['id'], self.product.id)     #type: ignore
+
+    def test_search_without_query(self):
+        response = self.client.get(reverse('search'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['products']), 0)
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.test import SimpleTestCase
+from io import StringIO
+from pathlib import Path
+import tempfile
+
+
+class SqliteProductionModeTest(SimpleTestCase):
+    """The production SQLite options are accepted by the Django backend"""
+
+    def test_connection_applies_pragmas(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        wrapper = DatabaseWrapper({
+            **settings.DATABASES['default'],
+            'NAME': str(Path(directory.name) / 'shop.sqlite3'),
+            'OPTIONS': {
+                'init_command': ''.join(f'PRAGMA {name}={value};' for name, value in settings.SQLITE_PRAGMAS.items()),
+                'transaction_mode': 'IMMEDIATE',
+            },
+        }, alias='sqlite_production')
+        self.addCleanup(wrapper.close)
+
+        with wrapper.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(wrapper.transaction_mode, 'IMMEDIATE')
+
+    def test_benchmark_reports_both_modes(self):
+        stdout = StringIO()
+        call_command('benchmark_sqlite', workers=2, duration=0.2, stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertTrue(lines[1].startswith('default'))
+        self.assertTrue(lines[2].startswith('production'))
+        self.assertTrue(lines[2].endswith(' 0 locked errors'))
@@ -1,4 +1,5 @@
 from django.urls import reverse
+from django.test import override_settings
 from shop.tests.test_base_setup import ShopTestBase
 
 class GlobalContextTestCase(ShopTestBase):
@@ -28,6 +29,14 @@ class ProductViewTest(GlobalContextTestCase):
         self.assertTemplateUsed(response, 'shop/home.html')
         self.assertGlobalContextPresent(response)
         
+    def test_pages_preload_critical_assets(self):
+        """The Tailwind CSS and the page scripts are announced in the <head>"""
+        html = self.client.get(reverse('product-list')).content.decode()      #type: ignore
+        head = html[:html.index('</head>')]
+        self.assertIn('as="style"', head)
+        self.assertIn('js/utils.js" as="script"', head)
+        self.assertIn('js/products.js" as="script"', head)
+        
     def test_toggle_wishlist_updates_context(self):
         """Test that toggling the wishlist updates global context variables
         """
@@ -130,10 +139,11 @@ class PaymentViewsTest(GlobalContextTestCase):
     """
     def setUp(self):
         super().setUp()
-        self.client.login(username=self.user.username, password=self.raw_pasword)
+        # filled before logging in, the cart joins the saved cart of the user
         session = self.client.session
         session['cart'] = self.cart_data
         session.save()
+        self.client.login(username=self.user.username, password=self.raw_pasword)
         
     
     def test_checkout_view_context(self):
@@ -155,3 +165,84 @@ class PaymentViewsTest(GlobalContextTestCase):
 
 
 
+
+
+class CartApplyViewTest(ShopTestBase):
+    """cart/apply takes the debounced batches of cart.js"""
+
+    def apply(self, operations):
+        import json
+        return self.client.post(
+            reverse('cart-apply'), json.dumps({'operations': operations}),
+            content_type='application/json', HTTP_X_REQUESTED_WITH='XMLHttpRequest',
+        )
+
+    def test_applies_absolute_quantities(self):
+        from shop.models import Product
+        from decimal import Decimal
+        other = Product.objects.create(name='Galette', price=Decimal('250.00'), stock=10, category=self.category)
+        self.client.post(reverse('add-to-cart', args=[self.product.id]))  #type: ignore
+
+        response = self.apply([
+            {'product_id': self.product.id, 'quantity': 0},     #type: ignore
+            {'product_id': other.id, 'quantity': 4},            #type: ignore
+        ])
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['cart_count'], 4)
+        self.assertEqual(data['cart_total_price'], '1000.00')
+        self.assertEqual(data['items'], {str(other.id): {'quantity': 4, 'subtotal': '1000.00', 'version': None}})  #type: ignore
+        self.assertEqual(data['conflicts'], [])
+        self.assertEqual(self.client.session['cart'], {str(other.id): [4, 25000]})  #type: ignore
+
+    @override_settings(CART_STORE='db')
+    def test_stale_version_is_left_alone(self):
+        self.client.post(reverse('add-to-cart', args=[self.product.id]))  #type: ignore
+        response = self.client.get(reverse('cart'))
+        version = response.context['cart_items'][0]['version']
+        self.assertContains(response, f'data-version="{version}"', count=2)
+        # another tab adds one
+        self.client.post(reverse('add-to-cart', args=[self.product.id]))  #type: ignore
+
+        data = self.apply([{'product_id': self.product.id, 'quantity': 5, 'version': version}]).json()     #type: ignore
+        self.assertEqual(data['conflicts'], [str(self.product.id)])    #type: ignore
+        self.assertEqual(data['items'][str(self.product.id)]['quantity'], 2)    #type: ignore
+
+        version = data['items'][str(self.product.id)]['version']   #type: ignore
+        data = self.apply([{'product_id': self.product.id, 'quantity': 5, 'version': version}]).json()     #type: ignore
+        self.assertEqual(data['conflicts'], [])
+        self.assertEqual(data['cart_count'], 5)
+
+    def test_amounts_are_exact_decimals(self):
+        from shop.models import Product
+        from decimal import Decimal
+        dime = Product.objects.create(name='Miette', price=Decimal('0.10'), stock=10, category=self.category)
+        data = self.apply([{'product_id': dime.id, 'quantity': 3}]).json()     #type: ignore
+        self.assertEqual(data['cart_total_price'], '0.30')
+        self.assertEqual(data['items'][str(dime.id)]['subtotal'], '0.30')  #type: ignore
+
+    def test_ajax_cart_changes_send_exact_decimals(self):
+        from shop.models import Product
+        from decimal import Decimal
+        dime = Product.objects.create(name='Miette', price=Decimal('0.10'), stock=10, category=self.category)
+        ajax = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+        for _ in range(3):
+            data = self.client.post(reverse('add-to-cart', args=[dime.id]), **ajax).json()  #type: ignore
+        self.assertEqual(data['cart_total_price'], '0.30')
+        data = self.client.post(reverse('substract-from-cart', args=[dime.id]), **ajax).json()  #type: ignore
+        self.assertEqual(data['cart_total_price'], '0.20')
+        data = self.client.post(reverse('remove-from-cart', args=[dime.id]), **ajax).json()  #type: ignore
+        self.assertEqual(data['cart_total_price'], '0.00')
+
+    def test_rejects_invalid_batches(self):
+        self.assertEqual(self.apply([{'product_id': self.product.id}]).status_code, 400)   #type: ignore
+        self.assertEqual(self.apply([{'product_id': self.product.id, 'quantity': -1}]).status_code, 400)   #type: ignore
+        self.assertEqual(self.apply([]).status_code, 400)
+        self.assertEqual(self.apply([{'product_id': 999999, 'quantity': 1}]).status_code, 404)
+        self.assertEqual(self.client.get(reverse('cart-apply')).status_code, 405)
+
+    def test_cart_page_renders_batch_hooks(self):
+        self.client.post(reverse('add-to-cart', args=[self.product.id]))  #type: ignore
+        response = self.client.get(reverse('cart'))
+        self.assertContains(response, f'data-apply-url="{reverse("cart-apply")}"')
+        self.assertContains(response, f'data-product-id="{self.product.id}" data-quantity="1"', count=2)  #type: ignore
@@ -10,6 +10,7 @@ urlpatterns = [
     path('contact_us', views.contact_us, name='contact-us'),
     path('products/', views.products_list_view, name='product-list'),
     path('product/<int:product_id>/detail/', views.product_detail_view, name='product-detail'),
+    path('search/', views.search_view, name='search'),
     
     
     #Authentication
@@ -23,6 +24,7 @@ urlpatterns = [
     path('cart/add/<int:product_id>/', views.add_to_cart, name='add-to-cart'),
     path('cart/remove/<int:product_id>/', views.remove_from_cart, name='remove-from-cart'),
     path('cart/substract/<int:product_id>/', views.substract_item_qty_from_cart, name='substract-from-cart'),
+    path('cart/apply/', views.apply_cart_changes, name='cart-apply'),
     
     path('wishlist/', views.wishlist_view, name='wishlist'),
     path('toggle-favorite/<int:product_id>/', views.toggle_favorite, name='toggle-favorite'),
@@ -38,4 +40,8 @@ urlpatterns = [
     path('mvola/callback/', views.mvola_callback, name='mvola_callback')
     
     
-]+static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+]
+
+# local development without the WSGI media wrapper; static() is a no-op when DEBUG is off
+if settings.DEBUG and not settings.MEDIA_SERVING['ENABLED']:
+    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
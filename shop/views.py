@@ -11,12 +11,18 @@ from .forms import CustomerRegistrationForm, CheckoutForm
 from django.contrib.auth.forms import AuthenticationForm
 from shop.payment.mvola_service import MvolaPaymentService
 from shop.payment.paypal_service import PaypalPaymentService
+from shop.search.search import search_products
+from shop.catalog.facets import facet_index, AVAILABILITY_LABELS
+from shop.catalog.cache import catalog_cache
 from django.core.paginator import Paginator
 from django.contrib import messages
 from django.http import JsonResponse
+from django.db import transaction
+from django.utils.http import urlencode
 from decimal import Decimal
 import logging
 import json
+import copy
 
 logger = logging.getLogger(__name__)
 
@@ -108,22 +114,55 @@ def logout_view(request):
     return redirect('home')
 
 def products_list_view(request):
-    """Display products with category filtering"""
-    products = Product.objects.all()
-    categories = Category.objects.all()
+    """Display products with faceted filtering on category, price band and availability"""
     current_category = 0
-    
-    if request.method == 'GET':
-        category_id = request.GET.get('category')
-        if category_id and category_id != '0':
-            products = products.filter(category__id=category_id)
-            current_category = int(category_id)
-    products_page = Paginator(products, 8)  # Show 10 products per page
-    page_number = request.GET.get('page')
+    filters = {
+        'price': request.GET.getlist('price'),
+        'availability': request.GET.getlist('availability'),
+    }
+    category_id = request.GET.get('category')
+    if category_id and category_id.isdigit() and category_id != '0':
+        current_category = int(category_id)
+        filters['category'] = [current_category]
+
+    selection = facet_index.query(filters)
+    products_page = _paginate_product_ids(selection.ids(), request.GET.get('page'))
+
+    categories = [copy.copy(category) for category in _get_categories()]
+    for category in categories:
+        category.facet_count = selection.counts['category'].get(category.id, 0)     #type: ignore
+
+    facets = {
+        'price': [
+            {
+                'value': key,
+                'label': label,
+                'count': selection.counts['price'].get(key, 0),
+                'selected': key in filters['price'],
+            }
+            for key, label, _, _ in facet_index.price_bands
+        ],
+        'availability': [
+            {
+                'value': key,
+                'label': label,
+                'count': selection.counts['availability'].get(key, 0),
+                'selected': key in filters['availability'],
+            }
+            for key, label in AVAILABILITY_LABELS.items()
+        ],
+    }
+
+    filter_params = [(name, value) for name in ('price', 'availability') for value in filters[name]]
+    if current_category:
+        filter_params.append(('category', current_category))
+
     context = {
-        'products': products_page.get_page(page_number),
+        'products': products_page,
         'categories': categories,
         'current_category': current_category,
+        'facets': facets,
+        'filter_query': urlencode(filter_params),
         'page': 'shop'
     }
     return render(request, 'shop/products.html', context)
@@ -131,7 +170,10 @@ def products_list_view(request):
 def product_detail_view(request, product_id):
     """Return product detail as JSON (for modal display)"""
     try:
-        product = Product.objects.get(id=product_id)
+        product = catalog_cache.get_or_compute(
+            'products', f'detail:{product_id}',
+            lambda: Product.objects.select_related('category').get(id=product_id)
+        )
         # Get wishlist from session
         wishlist = request.session.get('wishlist', [])
         context = {
@@ -143,6 +185,55 @@ def product_detail_view(request, product_id):
     except Product.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Product not found'}, status=404)
 
+def search_view(request):
+    """Full-text product search, ranked by relevance"""
+    query = request.GET.get('q', '').strip()
+    product_ids = search_products(query) if query else []
+
+    products_page = _paginate_product_ids(product_ids, request.GET.get('page'))
+
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({
+            'success': True,
+            'query': query,
+            'count': products_page.paginator.count,
+            'results': [
+                {
+                    'id': product.id,     #type: ignore
+                    'name': product.name,
+                    'price': str(product.price),
+                    'detail_url': product.get_absolute_url(),
+                }
+                for product in products_page.object_list
+            ]
+        })
+
+    context = {
+        'products': products_page,
+        'categories': _get_categories(),
+        'current_category': 0,
+        'query': query,
+        'filter_query': urlencode({'q': query}),
+        'page': 'shop'
+    }
+    return render(request, 'shop/products.html', context)
+
+def _paginate_product_ids(product_ids, page_number, per_page=8):
+    """Paginate an ordered list of product ids and load only the products of the requested page"""
+    products_page = Paginator(product_ids, per_page).get_page(page_number)
+    page_ids = list(products_page.object_list)
+    products_page.object_list = catalog_cache.get_or_compute(
+        'listings', 'page:' + ','.join(map(str, page_ids)),
+        lambda: _load_products(page_ids)
+    )
+    return products_page
+
+def _load_products(product_ids):
+    products_by_id = Product.objects.in_bulk(product_ids)
+    return [products_by_id[pid] for pid in product_ids if pid in products_by_id]
+
+def _get_categories():
+    return catalog_cache.get_or_compute('categories', 'all', lambda: list(Category.objects.all()))
 
 
 # Cart management views
@@ -168,7 +259,8 @@ def cart_view(request):
             cart_items.append({
                 'product': product,
                 'quantity': item_data['quantity'],
-                'subtotal': float(item_data['price']) * item_data['quantity']
+                'subtotal': Decimal(item_data['price']) * item_data['quantity'],
+                'version': item_data.get('version'),
             })
     
     context = {
@@ -190,7 +282,7 @@ def add_to_cart(request, product_id):
                 'success': True,
                 'message': f'{product.name} added to cart!',
                 'cart_count': cart.__len__(),
-                'cart_total_price': float(cart.get_total_price())
+                'cart_total_price': str(cart.get_total_price())
             })
             
         return redirect('cart')
@@ -217,7 +309,7 @@ def remove_from_cart(request, product_id):
                 'success': True,
                 'message': 'Product removed from cart.',
                 'cart_count': cart.__len__(),
-                'cart_total_price': float(cart.get_total_price())
+                'cart_total_price': str(cart.get_total_price())
             })
             
     except Exception as e:
@@ -236,13 +328,63 @@ def substract_item_qty_from_cart(request, product_id):
                 'success': True,
                 'message': 'Product quantity decreased.',
                 'cart_count': cart.__len__(),
-                'cart_total_price': float(cart.get_total_price())
+                'cart_total_price': str(cart.get_total_price())
             })
             
     except Exception as e:
         pass
     return redirect('cart')
 
+# a debounced batch from cart.js carries one operation per product changed
+CART_APPLY_MAX_OPERATIONS = 50
+MAX_CART_QUANTITY = 999
+
+@require_http_methods(["POST"])
+def apply_cart_changes(request):
+    """Apply a batch of absolute quantities to the cart (AJAX)
+
+    Body: {"operations": [{"product_id": 3, "quantity": 2, "version": 4}, ...]},
+    quantity 0 removes the product. The whole batch is applied in one
+    transaction. With a version, the line is only changed if nobody changed it
+    since: the others come back in "conflicts", with their current quantity.
+    """
+    try:
+        operations = json.loads(request.body)['operations']
+        quantities = {int(op['product_id']): int(op['quantity']) for op in operations}
+        versions = {int(op['product_id']): int(op['version']) for op in operations if op.get('version') is not None}
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'success': False, 'error': 'Invalid cart operations'}, status=400)
+    if not quantities or len(quantities) > CART_APPLY_MAX_OPERATIONS:
+        return JsonResponse({'success': False, 'error': 'Invalid cart operations'}, status=400)
+    if any(quantity < 0 or quantity > MAX_CART_QUANTITY for quantity in quantities.values()):
+        return JsonResponse({'success': False, 'error': f'Quantities go from 0 to {MAX_CART_QUANTITY}'}, status=400)
+
+    products = Product.objects.in_bulk(list(quantities))
+    if len(products) != len(quantities):
+        return JsonResponse({'success': False, 'error': 'Product not found'}, status=404)
+
+    cart = request.cart
+    with transaction.atomic():
+        conflicts = cart.set_quantities(
+            {products[product_id]: quantity for product_id, quantity in quantities.items()}, versions
+        )
+
+    return JsonResponse({
+        'success': True,
+        'conflicts': conflicts,
+        'cart_count': len(cart),
+        # Decimal amounts as strings, exact to the cent
+        'cart_total_price': str(cart.get_total_price()),
+        'items': {
+            product_id: {
+                'quantity': item['quantity'],
+                'subtotal': str(Decimal(item['price']) * item['quantity']),
+                'version': item.get('version'),
+            }
+            for product_id, item in cart.cart.items()
+        },
+    })
+
 #wishlist management views 
 def wishlist_view(request):
     """Display wishlist"""
@@ -9,10 +9,8 @@ class Wishlist:
         self.session = request.session
         self.request = request
         self.is_authenticated = request.user.is_authenticated
-        wishlist = self.session.get('wishlist')
-        if not wishlist:
-            wishlist = self.session['wishlist'] = []
-        self.wishlist = wishlist
+        # written to the session by save() only
+        self.wishlist = self.session.get('wishlist') or []
         self._sync_wishlist_session_and_db()
         
     def add(self, product_id):